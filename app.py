@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, session, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, session, send_from_directory, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf import FlaskForm
 from flask_wtf.csrf import CSRFProtect, generate_csrf
@@ -8,13 +8,31 @@ from wtforms.validators import DataRequired, NumberRange, Email, Length, EqualTo
 from wtforms import ValidationError
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-from datetime import datetime, time, timedelta
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from docx import Document
+from datetime import datetime, time, timedelta, timezone
+from time import perf_counter, sleep
 import io
 import re
 from collections import namedtuple
+import click
+import contextvars
+import functools
+import hashlib
+import json
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import with_loader_criteria
+from sqlalchemy.pool import Pool, QueuePool
+from werkzeug.datastructures import MultiDict
+from werkzeug.utils import safe_join
+try:
+    import fcntl
+except ImportError:  # Windows: snapshot writers are not serialized
+    fcntl = None
 
 
 
@@ -30,16 +48,301 @@ if DATABASE_URL:
         DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://", 1)
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL or 'sqlite:///timetable.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Profiles of generation runs (see profile_generation); only the newest PROFILE_KEEP runs are kept
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+app.config['PROFILE_KEEP'] = int(os.environ.get('PROFILE_KEEP', 10))
+# iCalendar feeds: first teaching day (YYYY-MM-DD), optional last day and time zone, feeds cached per process
+app.config['TERM_START'] = os.environ.get('TERM_START')
+app.config['TERM_END'] = os.environ.get('TERM_END')
+app.config['CALENDAR_TZID'] = os.environ.get('CALENDAR_TZID')
+app.config['ICS_CACHE_SIZE'] = int(os.environ.get('ICS_CACHE_SIZE', 2048))
+# Name of the ScoringPolicy row the scheduler uses
+app.config['SCORING_POLICY'] = os.environ.get('SCORING_POLICY', 'default')
+# How the scheduler picks rooms: 'greedy' takes the first free room per course, 'matching' first
+# places courses in time slots and then matches rooms per slot by capacity and type fit
+app.config['ROOM_ASSIGNMENT'] = os.environ.get('ROOM_ASSIGNMENT', 'greedy')
+# Number of past generations kept besides the active and pinned ones
+app.config['GENERATION_KEEP'] = int(os.environ.get('GENERATION_KEEP', 20))
+# Rows validated and inserted per transaction by the bulk importer
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+# What-if sandboxes are solved in a pool of SANDBOX_WORKERS processes (0 solves them inline,
+# the default on Vercel where functions cannot keep worker processes around)
+app.config['SANDBOX_WORKERS'] = int(os.environ.get('SANDBOX_WORKERS', 0 if os.environ.get('VERCEL') else min(4, os.cpu_count() or 1)))
+app.config['SANDBOX_TIMEOUT'] = int(os.environ.get('SANDBOX_TIMEOUT', 60))
+# Generation runs are serialized: requests wait up to GENERATION_LOCK_TIMEOUT seconds for the lock,
+# and a lock row older than GENERATION_LOCK_TTL seconds is taken to belong to a crashed run
+app.config['GENERATION_LOCK_TIMEOUT'] = int(os.environ.get('GENERATION_LOCK_TIMEOUT', 300))
+app.config['GENERATION_LOCK_TTL'] = int(os.environ.get('GENERATION_LOCK_TTL', 1800))
+# Optional path of a compact copy of the active timetable that workers memory-map and serve
+# reads from (see write_timetable_snapshot); only for workers sharing one filesystem
+app.config['TIMETABLE_SNAPSHOT'] = os.environ.get('TIMETABLE_SNAPSHOT') or None
+# Server-sent timetable change events on /events/timetable (off on Vercel, whose functions can't
+# hold streams open): streams last SSE_STREAM_SECONDS before the browser reconnects, and
+# without PostgreSQL LISTEN/NOTIFY each process polls for changes every SSE_POLL_INTERVAL seconds
+app.config['SSE_ENABLED'] = os.environ.get('SSE_ENABLED', '0' if os.environ.get('VERCEL') else '1') == '1'
+app.config['SSE_STREAM_SECONDS'] = int(os.environ.get('SSE_STREAM_SECONDS', 300))
+app.config['SSE_POLL_INTERVAL'] = float(os.environ.get('SSE_POLL_INTERVAL', 2))
+# Each open stream holds a server thread, so a process serves at most SSE_MAX_STREAMS of them and
+# answers further ones with 503; keep it well below the threads per worker (gunicorn --threads)
+app.config['SSE_MAX_STREAMS'] = int(os.environ.get('SSE_MAX_STREAMS', 8))
+# Catalog, timetable and history rows belong to one (term, campus) partition; users work in the
+# one picked in the navbar, or this default, which rows from before partitioning are assigned to
+app.config['DEFAULT_TERM'] = os.environ.get('DEFAULT_TERM', 'default')
+app.config['DEFAULT_CAMPUS'] = os.environ.get('DEFAULT_CAMPUS', 'main')
+# Text responses of at least COMPRESS_MIN_SIZE bytes are brotli-encoded (if the brotli package is
+# installed) or gzip-encoded for clients that accept it, at COMPRESS_LEVEL (gzip 1-9, brotli 0-11)
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+# Static URLs carry a content hash (?v=...); requests for the current hash are cached as immutable
+app.config['STATIC_MAX_AGE'] = int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600))
+
+# Schema setup never runs at import time (it costs every serverless cold start); use
+# `flask init-db`, or let the first request create missing tables when AUTO_CREATE_TABLES=1
+_local_dev = os.environ.get('FLASK_ENV') == 'development' or os.environ.get('LOCAL_DEV') == '1'
+app.config['AUTO_CREATE_TABLES'] = os.environ.get('AUTO_CREATE_TABLES', '1' if _local_dev else '0') == '1'
+
+# --- Database engine ---
+class PoolStats:
+    """Process-wide connection pool counters, exposed on /admin/db_pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidated = 0
+            self.waits = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def add(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidated': self.invalidated,
+                'wait_avg_ms': round(self.wait_total / self.waits * 1000, 3) if self.waits else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+
+pool_stats = PoolStats()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits (including opening overflow connections)"""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_stats.record_wait(perf_counter() - start)
+
+event.listen(Pool, 'connect', lambda *args: pool_stats.add('connects'))
+event.listen(Pool, 'checkout', lambda *args: pool_stats.add('checkouts'))
+event.listen(Pool, 'checkin', lambda *args: pool_stats.add('checkins'))
+event.listen(Pool, 'invalidate', lambda *args: pool_stats.add('invalidated'))
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+def db_pool_mode():
+    return os.environ.get('DB_POOL_MODE') or ('external' if os.environ.get('VERCEL') else 'queue')
+
+def engine_options(url):
+    """SQLAlchemy engine options for `url`, configured through environment variables.
+
+    DB_POOL_MODE      'queue' keeps a pool per process (default); 'external' uses NullPool for
+                      when PgBouncer/Supavisor pools connections (default on Vercel)
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (s), DB_POOL_RECYCLE (s), DB_POOL_PRE_PING (0/1)
+    DB_STATEMENT_TIMEOUT_MS, DB_CONNECT_TIMEOUT (s)
+    """
+    if url.startswith('sqlite'):
+        return {}  # Flask-SQLAlchemy picks suitable SQLite pools itself
+    mode = db_pool_mode()
+    options = {'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1'}
+    connect_args = {}
+    statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', None)
+    if url.startswith('postgresql'):
+        connect_args['connect_timeout'] = _env_int('DB_CONNECT_TIMEOUT', 10)
+        if '+psycopg2' in url:
+            # Keepalives stop idle pooled connections being dropped (and re-handshaked) by NATs
+            connect_args.update(keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+    if mode == 'external':
+        from sqlalchemy.pool import NullPool
+        options['poolclass'] = NullPool
+        if '+psycopg' in url and '+psycopg2' not in url:
+            connect_args['prepare_threshold'] = None  # transaction poolers can't keep prepared statements
+    else:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=_env_int('DB_POOL_SIZE', 5),
+            max_overflow=_env_int('DB_MAX_OVERFLOW', 10),
+            pool_timeout=_env_int('DB_POOL_TIMEOUT', 30),
+            pool_recycle=_env_int('DB_POOL_RECYCLE', 300),
+        )
+        if statement_timeout and url.startswith('postgresql'):
+            connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
 db = SQLAlchemy(app)
 
-# Initialize DB
-if os.environ.get('FLASK_ENV') == 'development' or os.environ.get('LOCAL_DEV') == '1':
+# Startup parameters don't pass through external poolers, so there the timeout is set per connection
+if (db_pool_mode() == 'external' and app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql')
+        and _env_int('DB_STATEMENT_TIMEOUT_MS', None)):
+    @event.listens_for(Pool, 'connect')
+    def _set_statement_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {_env_int('DB_STATEMENT_TIMEOUT_MS', None)}")
+        cursor.close()
+
+def _dispose_engines_after_fork():
+    """Forked children (pre-forking servers, worker pools) must not share the parent's connections"""
     with app.app_context():
-        db.create_all()
-        print("✅ Database tables created or verified.")
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+def upgrade_schema():
+    """Create missing tables, then add the columns and indexes declared since existing tables
+    were created (create_all() leaves existing tables alone). New columns must be nullable or
+    have a server default, which existing rows take."""
+    db.create_all()
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        ddl = conn.dialect.ddl_compiler(conn.dialect, None)
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    app.logger.warning("Cannot add NOT NULL column %s.%s automatically", table.name, column.name)
+                    continue
+                conn.execute(db.text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {ddl.get_column_specification(column)}"))
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+@app.before_request
+def ensure_schema():
+    """Create missing tables once per process, on the first request, if enabled"""
+    global _schema_checked
+    if _schema_checked or not app.config['AUTO_CREATE_TABLES']:
+        return
+    with _schema_lock:
+        if not _schema_checked:
+            upgrade_schema()
+            _schema_checked = True
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing database tables, columns and indexes."""
+    upgrade_schema()
+    click.echo("✅ Database tables created or verified.")
+
 csrf = CSRFProtect(app)
 
+# --- Response compression and static assets ---
+COMPRESSIBLE_TYPES = {'text/html', 'text/plain', 'text/css', 'text/csv', 'text/calendar', 'text/javascript',
+                      'application/javascript', 'application/json', 'image/svg+xml'}
+
+@functools.lru_cache(maxsize=None)
+def _brotli():
+    """The optional brotli module, imported on the first compressible response"""
+    try:
+        import brotli
+    except ImportError:  # responses are only gzip-encoded
+        return None
+    return brotli
+
+def _encode(data, encoding):
+    if encoding == 'br':
+        return _brotli().compress(data, quality=app.config['COMPRESS_LEVEL'])
+    import gzip
+    return gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL'], mtime=0)
+
+@app.after_request
+def compress_response(response):
+    """Content-encode text responses the client accepts compressed. Streams and files pass through."""
+    if (response.mimetype not in COMPRESSIBLE_TYPES or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200:
+        return response
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if _brotli() else ['gzip'])
+    data = response.get_data()
+    if not encoding or len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    response.set_data(_encode(data, encoding))
+    response.content_encoding = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)  # the bytes differ from the unencoded representation
+    return response
+
+_static_digests = {}  # filename -> (mtime_ns, size, digest)
+
+def static_digest(filename):
+    """Short content hash of a file under static/, or None if there is no such file"""
+    path = safe_join(app.static_folder, filename)
+    try:
+        stat = os.stat(path) if path else None
+    except OSError:
+        stat = None
+    if stat is None:
+        return None
+    cached = _static_digests.get(filename)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    _static_digests[filename] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and 'v' not in values:
+        digest = static_digest(values.get('filename', ''))
+        if digest:
+            values['v'] = digest
+
+@app.after_request
+def cache_static(response):
+    """Fingerprinted static URLs never change content, so browsers may keep them without revalidating"""
+    if (request.endpoint == 'static' and response.status_code in (200, 304) and request.args.get('v')
+            and request.args['v'] == static_digest(request.view_args.get('filename', ''))):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['STATIC_MAX_AGE']
+        response.cache_control.immutable = True
+    return response
+
 # Routes
 @app.route("/")
 def home():
@@ -67,8 +370,62 @@ def handle_error(e):
 # Now, your routes start below this, e.g.:
 # @app.route('/') 
 # ...
+# --- Partitions ---
+# Catalog, timetable and history rows carry the (term, campus) they belong to. Every ORM query
+# is scoped to the current partition (see _partition_criteria) and new rows default to it, so
+# generation, validation, exports and dashboards each see one partition at a time.
+Partition = namedtuple('Partition', 'term campus')
+PARTITION_NAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+_partition_scope = contextvars.ContextVar('partition_scope', default=None)
+
+def default_partition():
+    return Partition(app.config['DEFAULT_TERM'], app.config['DEFAULT_CAMPUS'])
+
+def current_partition():
+    """Partition of the enclosing partition_scope(), else the one picked in the session, else the default"""
+    scoped = _partition_scope.get()
+    if scoped is not None:
+        return scoped
+    if has_request_context() and session.get('partition'):
+        return Partition(*session['partition'])
+    return default_partition()
+
+@contextmanager
+def partition_scope(partition):
+    """Scope queries and new rows to `partition` (for CLI commands, workers and watcher threads)"""
+    token = _partition_scope.set(Partition(*partition))
+    try:
+        yield
+    finally:
+        _partition_scope.reset(token)
+
+def valid_partition(term, campus):
+    return bool(term and campus and len(term) <= 20 and len(campus) <= 50
+                and PARTITION_NAME.match(term) and PARTITION_NAME.match(campus))
+
+def partition_key(key, partition=None):
+    """AppState key scoped to a partition; the default partition keeps the bare key, so pointers
+    written before partitioning stay valid"""
+    partition = partition or current_partition()
+    if partition == default_partition():
+        return key
+    return f"{key}:{partition.term}:{partition.campus}"
+
+def partition_digest(partition=None):
+    """Short stable id of a partition for lock names and file names"""
+    term, campus = partition or current_partition()
+    return hashlib.sha1(f"{term}\0{campus}".encode()).hexdigest()[:8]
+
+class PartitionMixin:
+    """Partition key columns; each model indexes them together with its usual filter columns"""
+    term = db.Column(db.String(20), nullable=False, default=lambda: current_partition().term,
+                     server_default=app.config['DEFAULT_TERM'])
+    campus = db.Column(db.String(50), nullable=False, default=lambda: current_partition().campus,
+                       server_default=app.config['DEFAULT_CAMPUS'])
+
 # Models
-class Course(db.Model):
+class Course(PartitionMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'))
@@ -83,7 +440,10 @@ class Course(db.Model):
     faculty = db.relationship('Faculty', backref='course_list')
     classroom = db.relationship('Classroom', backref='course_list')
 
-class Faculty(db.Model):
+    # Students see the courses of their own department/year/semester
+    __table_args__ = (db.Index('ix_course_partition_group', 'term', 'campus', 'department', 'year', 'semester'),)
+
+class Faculty(PartitionMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     availability = db.Column(db.String(200))  # JSON or simple string
@@ -94,7 +454,9 @@ class Faculty(db.Model):
 
     timetables = db.relationship('Timetable', backref='faculty_obj')
 
-class Classroom(db.Model):
+    __table_args__ = (db.Index('ix_faculty_partition', 'term', 'campus'),)
+
+class Classroom(PartitionMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     capacity = db.Column(db.Integer, nullable=False)
@@ -102,7 +464,9 @@ class Classroom(db.Model):
 
     timetables = db.relationship('Timetable', backref='classroom_obj')
 
-class Timetable(db.Model):
+    __table_args__ = (db.Index('ix_classroom_partition', 'term', 'campus'),)
+
+class Timetable(PartitionMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'))
     faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'))
@@ -112,11 +476,43 @@ class Timetable(db.Model):
     end_time = db.Column(db.Time)
     department = db.Column(db.String(50))
     semester = db.Column(db.Integer)
-    generation = db.Column(db.Integer, default=1)
+    generation = db.Column(db.Integer, default=1, index=True)
 
     course = db.relationship('Course', backref='timetables')
 
-# Association table for User-Course enrollments
+    __table_args__ = (db.Index('ix_timetable_partition', 'term', 'campus', 'generation'),)
+
+class TimetableGeneration(PartitionMixin, db.Model):
+    """One generation run; its entries are the Timetable rows with the same generation number.
+    Numbers are unique across partitions (see next_generation_number)."""
+    generation = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    entry_count = db.Column(db.Integer, default=0)
+    revision = db.Column(db.Integer, default=0)  # bumped when entries are edited in place
+    pinned = db.Column(db.Boolean, default=False)  # pinned generations survive retention
+    scoring = db.Column(db.Text)  # JSON of the scoring weights the run used
+    input_fingerprint = db.Column(db.String(64), index=True)  # ConflictFreeScheduler.input_fingerprint()
+
+    __table_args__ = (db.Index('ix_timetable_generation_partition', 'term', 'campus'),)
+
+class AppState(db.Model):
+    """Small key/value store for global pointers such as the active generation"""
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.String(200))
+
+class ScoringPolicy(db.Model):
+    """An institute's scheduler scoring weights as JSON (see SCORING_TERMS)"""
+    name = db.Column(db.String(50), primary_key=True)
+    weights = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class JobLock(db.Model):
+    """Named lock row for databases without advisory locks; an expired holder is presumed dead"""
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(32))
+    expires_at = db.Column(db.DateTime)
+
+# Association table for User-Course enrollments; an enrollment belongs to its course's partition
 enrollments = db.Table('enrollments',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
     db.Column('course_id', db.Integer, db.ForeignKey('course.id'), primary_key=True)
@@ -140,6 +536,263 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+@event.listens_for(db.session, 'do_orm_execute')
+def _partition_criteria(orm_execute_state):
+    """Confine ORM selects, updates and deletes to the current partition.
+
+    Relationship and column loads inherit the criteria of the query that loaded their parent.
+    Queries that must span partitions pass execution_options(all_partitions=True).
+    """
+    if orm_execute_state.is_column_load or orm_execute_state.is_relationship_load:
+        return
+    if orm_execute_state.execution_options.get('all_partitions'):
+        return
+    if orm_execute_state.is_select or orm_execute_state.is_update or orm_execute_state.is_delete:
+        term, campus = current_partition()
+        orm_execute_state.statement = orm_execute_state.statement.options(with_loader_criteria(
+            PartitionMixin, lambda cls: (cls.term == term) & (cls.campus == campus), include_aliases=True))
+
+_partitions_cache = (None, [])  # (catalog versions of all partitions, partitions)
+
+def known_partitions():
+    """Partitions with any courses, faculty or classrooms, plus the default, cached until any
+    partition's catalog version changes"""
+    global _partitions_cache
+    version = catalog_versions()
+    cached_version, partitions = _partitions_cache
+    if cached_version == version:
+        return partitions
+    found = {default_partition()}
+    for model in (Course, Faculty, Classroom):
+        found.update(Partition(*row) for row in db.session.query(model.term, model.campus).distinct()
+                     .execution_options(all_partitions=True))
+    partitions = sorted(found)
+    _partitions_cache = (version, partitions)
+    return partitions
+
+app.jinja_env.globals.update(current_partition=current_partition, known_partitions=known_partitions)
+
+# Generation history
+ACTIVE_GENERATION_KEY = 'active_generation'
+GENERATION_SEQUENCE_KEY = 'generation_sequence'
+
+def active_generation():
+    """Generation currently served to users, or None when there is none.
+
+    Generations are kept after newer runs, so readers must filter on this instead of reading
+    every Timetable row. Databases from before history tracking fall back to the newest one.
+    """
+    state = db.session.get(AppState, partition_key(ACTIVE_GENERATION_KEY))
+    if state is None:
+        return db.session.query(db.func.max(Timetable.generation)).scalar()
+    return int(state.value) or None
+
+def set_active_generation(generation):
+    """Repoint the served timetable; rows are never rewritten, so this is O(1). Caller commits."""
+    key = partition_key(ACTIVE_GENERATION_KEY)
+    state = db.session.get(AppState, key)
+    if state is None:
+        state = AppState(key=key)
+        db.session.add(state)
+    state.value = str(generation or 0)
+
+def next_generation_number():
+    """Claim the next generation number, unique across partitions generating in parallel.
+
+    The counter row is bumped in its own short transaction, so concurrent runs serialize only
+    on that row; it is seeded from the highest generation on record.
+    """
+    table = AppState.__table__
+    # Only the counter's value is numeric; the CASE keeps the cast off every other row whatever the plan
+    counter = db.case((table.c.key == GENERATION_SEQUENCE_KEY, table.c.value))
+    with db.engine.begin() as conn:
+        if conn.execute(table.update().where(table.c.key == GENERATION_SEQUENCE_KEY).values(
+                value=db.cast(db.cast(counter, db.Integer) + 1, db.String))).rowcount:
+            return int(conn.execute(db.select(table.c.value).where(table.c.key == GENERATION_SEQUENCE_KEY)).scalar())
+        highest = max(conn.execute(db.select(db.func.max(Timetable.generation))).scalar() or 0,
+                      conn.execute(db.select(db.func.max(TimetableGeneration.generation))).scalar() or 0)
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.insert().values(key=GENERATION_SEQUENCE_KEY, value=str(highest + 1)))
+        return highest + 1
+    except IntegrityError:
+        return next_generation_number()  # another run seeded the counter first
+
+def touch_generation(generation):
+    """Record an in-place edit of a generation's entries so cached views of it go stale"""
+    if generation:
+        TimetableGeneration.query.filter_by(generation=generation).update(
+            {'revision': TimetableGeneration.revision + 1}, synchronize_session=False)
+
+def active_timetables():
+    """Query of the active generation's entries"""
+    return Timetable.query.filter(Timetable.generation == (active_generation() or -1))
+
+def timetable_version():
+    """Cheap version token of the served timetable for ETags: active generation and its revision"""
+    # The pointer is read in its own subquery so the integer cast only ever sees that one value
+    pointer = db.select(AppState.value).where(AppState.key == partition_key(ACTIVE_GENERATION_KEY)).scalar_subquery()
+    revision = db.select(TimetableGeneration.revision).where(
+        TimetableGeneration.generation == db.cast(pointer, db.Integer)).scalar_subquery()
+    row = db.session.execute(db.select(pointer, revision)).one()
+    if row[0] is None:
+        # No pointer yet: the newest generation is served, fold in count and max id to catch edits
+        generation, count, max_id = db.session.query(
+            db.func.max(Timetable.generation), db.func.count(Timetable.id), db.func.max(Timetable.id)).one()
+        return f"{generation or 0}.{count}.{max_id or 0}"
+    return f"{row[0]}.{row[1] or 0}"
+
+def apply_generation_retention(keep=None):
+    """Compact history down to the newest `keep` generations plus the active and pinned ones.
+
+    Expired rows are removed with one set-based DELETE per table. Caller commits.
+    """
+    keep = app.config['GENERATION_KEEP'] if keep is None else keep
+    active = active_generation()
+    generations = [g for (g,) in db.session.query(Timetable.generation).distinct()
+                   .order_by(Timetable.generation.desc()).all()]
+    pinned = {g for (g,) in db.session.query(TimetableGeneration.generation).filter_by(pinned=True).all()}
+    expired = [g for g in generations[keep:] if g != active and g not in pinned]
+    if expired:
+        Timetable.query.filter(Timetable.generation.in_(expired)).delete(synchronize_session=False)
+        TimetableGeneration.query.filter(TimetableGeneration.generation.in_(expired)).delete(synchronize_session=False)
+    return expired
+
+def diff_generations(old, new):
+    """Per-course changes between two generations, computed in one grouped query.
+
+    Returns dicts with status 'added', 'removed' or 'moved' (day, time, room or faculty changed).
+    """
+    def pick(generation, column):
+        return db.func.max(db.case((Timetable.generation == generation, column)))
+
+    in_old = db.func.sum(db.case((Timetable.generation == old, 1), else_=0))
+    in_new = db.func.sum(db.case((Timetable.generation == new, 1), else_=0))
+    rows = db.session.query(
+        Timetable.course_id, db.func.max(Course.name), in_old, in_new,
+        pick(old, Timetable.day), pick(old, Timetable.start_time), pick(old, Timetable.classroom_id), pick(old, Timetable.faculty_id),
+        pick(new, Timetable.day), pick(new, Timetable.start_time), pick(new, Timetable.classroom_id), pick(new, Timetable.faculty_id),
+    ).outerjoin(Course, Timetable.course_id == Course.id) \
+     .filter(Timetable.generation.in_([old, new])) \
+     .group_by(Timetable.course_id).all()
+
+    changes = []
+    for course_id, name, n_old, n_new, *slots in rows:
+        before, after = tuple(slots[:4]), tuple(slots[4:])
+        if not n_old:
+            status = 'added'
+        elif not n_new:
+            status = 'removed'
+        elif before != after:
+            status = 'moved'
+        else:
+            continue
+        changes.append({'course_id': course_id, 'course': name, 'status': status,
+                        'before': before if n_old else None, 'after': after if n_new else None})
+    return sorted(changes, key=lambda c: (c['status'], c['course'] or ''))
+
+def course_pairs_sharing_students(course_ids=None, with_counts=False):
+    """(course_a, course_b[, students]) pairs with a_id < b_id that have an enrolled student in common"""
+    first, second = enrollments.alias('e1'), enrollments.alias('e2')
+    query = db.session.query(first.c.course_id, second.c.course_id, db.func.count(first.c.user_id)).join(
+        second, (first.c.user_id == second.c.user_id) & (first.c.course_id < second.c.course_id))
+    if course_ids is not None:
+        if not course_ids:
+            return []
+        query = query.filter(first.c.course_id.in_(course_ids), second.c.course_id.in_(course_ids))
+    rows = query.group_by(first.c.course_id, second.c.course_id).all()
+    return rows if with_counts else [(a, b) for a, b, _ in rows]
+
+# --- Enrollment eligibility ---
+CATALOG_VERSION_KEY = 'catalog_version'
+_CATALOG_MODELS = (Course, Faculty, Classroom)
+OPTION_LABEL_CACHE_SIZE = 256
+
+_option_label_cache = OrderedDict()  # (catalog version, partition, department, year, semester) -> {course id: label}
+_option_label_cache_lock = threading.Lock()
+
+def catalog_version(partition=None):
+    """Token that changes whenever a course, faculty or classroom of the partition is written"""
+    state = db.session.get(AppState, partition_key(CATALOG_VERSION_KEY, partition))
+    return state.value if state else ''
+
+def catalog_versions():
+    """Catalog version tokens of every partition, for caches that span partitions"""
+    return tuple(db.session.query(AppState.key, AppState.value).filter(db.or_(
+        AppState.key == CATALOG_VERSION_KEY, AppState.key.startswith(CATALOG_VERSION_KEY + ':')
+    )).order_by(AppState.key))
+
+def _bump_catalog_version(session, partitions):
+    """Give each written partition a new token, once per transaction: readers only see it on commit"""
+    bumped = session.info.setdefault('catalog_versions_bumped', set())
+    for partition in set(partitions) - bumped:
+        key = partition_key(CATALOG_VERSION_KEY, partition)
+        state = session.get(AppState, key)
+        if state is None:
+            state = AppState(key=key)
+            session.add(state)
+        # A fresh random token rather than a counter, so concurrent writers can't commit the same value
+        state.value = os.urandom(8).hex()
+        bumped.add(partition)
+
+@event.listens_for(db.session, 'before_flush')
+def _catalog_flush(session, flush_context, instances):
+    written = [obj for obj in session.new | session.deleted if isinstance(obj, _CATALOG_MODELS)]
+    written += [obj for obj in session.dirty if isinstance(obj, _CATALOG_MODELS) and session.is_modified(obj)]
+    if written:
+        # New rows get their partition from the column defaults, i.e. the current one
+        _bump_catalog_version(session, {Partition(obj.term, obj.campus) if obj.term and obj.campus
+                                        else current_partition() for obj in written})
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _catalog_bulk_write(orm_execute_state):
+    # Bulk updates and deletes are confined to the current partition by _partition_criteria, inserts default to it
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+            mapper.class_ in _CATALOG_MODELS for mapper in orm_execute_state.all_mappers):
+        _bump_catalog_version(orm_execute_state.session, [current_partition()])
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def _catalog_transaction_end(session):
+    session.info.pop('catalog_versions_bumped', None)
+
+def course_group_query(department, year, semester):
+    """Courses of one (department, year, semester) group, served by ix_course_partition_group"""
+    return Course.query.filter(Course.department == department, Course.year == year, Course.semester == semester)
+
+def eligible_course_ids(user):
+    """Ids of the courses in the student's group they are not enrolled in yet, as one anti-join"""
+    enrolled = db.session.query(enrollments.c.course_id).filter(
+        enrollments.c.user_id == user.id, enrollments.c.course_id == Course.id)
+    query = course_group_query(user.department, user.year, user.semester).filter(~enrolled.exists())
+    return [course_id for (course_id,) in query.with_entities(Course.id).order_by(Course.id)]
+
+def course_option_labels(department, year, semester):
+    """Enrollment option labels of a course group as course id -> label, cached per catalog version"""
+    key = (catalog_version(), current_partition(), department, year, semester)
+    with _option_label_cache_lock:
+        labels = _option_label_cache.get(key)
+        if labels is not None:
+            _option_label_cache.move_to_end(key)
+            return labels
+    rows = course_group_query(department, year, semester).with_entities(Course.id, Course.name, Faculty.name, Classroom.name) \
+        .outerjoin(Faculty, Course.faculty_id == Faculty.id).outerjoin(Classroom, Course.classroom_id == Classroom.id)
+    labels = {course_id: f"{name} (Faculty: {faculty if faculty is not None else 'Unassigned'}, "
+                         f"Classroom: {classroom if classroom is not None else 'Unassigned'})"
+              for course_id, name, faculty, classroom in rows}
+    with _option_label_cache_lock:
+        _option_label_cache[key] = labels
+        while len(_option_label_cache) > OPTION_LABEL_CACHE_SIZE:
+            _option_label_cache.popitem(last=False)
+    return labels
+
+def enrollment_choices(user, course_ids=None):
+    """(course id, label) choices for the enrollment form; `course_ids` defaults to eligible_course_ids(user)"""
+    labels = course_option_labels(user.department, user.year, user.semester)
+    if course_ids is None:
+        course_ids = eligible_course_ids(user)
+    return [(course_id, labels[course_id]) for course_id in course_ids if course_id in labels]
+
 # Forms
 class RegistrationForm(FlaskForm):
     full_name = StringField('Full Name', validators=[DataRequired()])
@@ -208,26 +861,181 @@ class ClassroomForm(FlaskForm):
     type = SelectField('Type', choices=[('smart-classroom', 'Smart Classroom'), ('lab', 'Lab'), ('seminar', 'Seminar Hall')])
     submit = SubmitField('Add Classroom')
 
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+TEACHING_SLOTS = (time(10, 0), time(11, 0), time(12, 0), time(14, 0), time(15, 0), time(16, 0))
+
+# --- Scheduler scoring ---
+ScoringTerm = namedtuple('ScoringTerm', 'name default label')
+
+# Soft constraints as weighted terms; the defaults are the scheduler's original constants. The
+# "packing day" is where multi-hour courses are gathered and the group day load isn't penalized.
+SCORING_TERMS = (
+    ScoringTerm('group_adjacent', 2000, 'Next to another class of the group that day'),
+    ScoringTerm('group_isolated', -100, 'Group has classes that day, none adjacent'),
+    ScoringTerm('group_free_day', 300, 'First class of the group that day'),
+    ScoringTerm('faculty_adjacent', 1200, 'Next to another class of the faculty that day'),
+    ScoringTerm('faculty_isolated', -200, 'Faculty teaches that day, no class adjacent'),
+    ScoringTerm('faculty_free_day', 500, 'First class of the faculty that day'),
+    ScoringTerm('group_day_load', -150, 'Per class the group already has that day (not on the packing day)'),
+    ScoringTerm('earlier_day', 300, 'Per day earlier in the week'),
+    ScoringTerm('earlier_slot', 50, 'Per hour the class starts before 17:00'),
+    ScoringTerm('pack_day_long_course', 1000, 'Multi-hour course on the packing day'),
+    ScoringTerm('pack_day_later_slot', 50, 'Per start hour of a multi-hour course on the packing day'),
+)
+DEFAULT_PACK_DAY = 'Monday'
+
+ScoringTables = namedtuple('ScoringTables', 'static day_load neighbours group faculty')
+
+_static_scoring_terms = []
+
+def static_scoring_term(fn):
+    """Register a score contribution that depends only on (day, slot, multi-hour or not).
+
+    `fn(weights, days, day, slot, long_course)` is evaluated once per run for every combination
+    when the tables are compiled, so added terms cost nothing in the placement loop.
+    """
+    _static_scoring_terms.append(fn)
+    return fn
+
+@static_scoring_term
+def _earlier_day_term(weights, days, day, slot, long_course):
+    return (5 - days.index(day)) * weights['earlier_day']
+
+@static_scoring_term
+def _slot_time_term(weights, days, day, slot, long_course):
+    if day == weights['pack_day'] and long_course:
+        # Multi-hour courses are packed into the later slots of the packing day
+        return weights['pack_day_long_course'] + slot.hour * weights['pack_day_later_slot']
+    return (17 - slot.hour) * weights['earlier_slot']
+
+def default_scoring_weights():
+    weights = {term.name: term.default for term in SCORING_TERMS}
+    weights['pack_day'] = DEFAULT_PACK_DAY
+    return weights
+
+def normalize_scoring_weights(values):
+    """Defaults overlaid with the known terms of `values`; raises ValueError for non-numeric weights"""
+    weights = default_scoring_weights()
+    for term in SCORING_TERMS:
+        if values.get(term.name) not in (None, ''):
+            weights[term.name] = int(values[term.name])
+    if values.get('pack_day'):
+        if values['pack_day'] not in DAY_ORDER:
+            raise ValueError(f"Unknown packing day '{values['pack_day']}'")
+        weights['pack_day'] = values['pack_day']
+    return weights
+
+def scoring_weights():
+    """Weights of the configured scoring policy, defaults when none is stored"""
+    policy = db.session.get(ScoringPolicy, app.config['SCORING_POLICY'])
+    return normalize_scoring_weights(json.loads(policy.weights)) if policy else default_scoring_weights()
+
+def compile_scoring(weights, days, slots):
+    """Precompute a run's scoring tables so scoring a candidate is a few lookups and additions"""
+    static = {(day, slot, long_course): sum(term(weights, days, day, slot, long_course) for term in _static_scoring_terms)
+              for day in days for slot in slots for long_course in (False, True)}
+    day_load = {day: 0 if day == weights['pack_day'] else weights['group_day_load'] for day in days}
+    neighbours = {slot: {slot.hour - 1, slot.hour + 1} for slot in slots}
+    group = (weights['group_adjacent'], weights['group_isolated'], weights['group_free_day'])
+    faculty = (weights['faculty_adjacent'], weights['faculty_isolated'], weights['faculty_free_day'])
+    return ScoringTables(static, day_load, neighbours, group, faculty)
+
+ROOM_MODES = ('greedy', 'matching')
+# Added to a room's cost when its type differs from the course's assigned classroom; larger
+# than any capacity difference, so a room of the right type always wins when one is free
+ROOM_TYPE_MISMATCH_COST = 100000
+
+def min_cost_assignment(costs):
+    """Rows assigned to distinct columns at minimum total cost (Hungarian algorithm, O(n^2 m)).
+
+    `costs` is a list of equal-length rows in which None marks a forbidden pair. Returns the
+    column of each row, or None for rows that can't be matched without a forbidden pair; as
+    many rows as possible are matched.
+    """
+    n = len(costs)
+    if not n:
+        return []
+    m = len(costs[0])
+    allowed = [c for row in costs for c in row if c is not None]
+    # Dearer than any assignment of allowed pairs, so the number of forbidden pairs is minimized first
+    forbidden = (max(allowed, default=0) + 1) * (n + 1)
+    width = max(m, n)  # dummy columns leave surplus rows unmatched
+    a = [[forbidden if j >= m or row[j] is None else row[j] for j in range(width)] for row in costs]
+    u, v = [0] * (n + 1), [0] * (width + 1)
+    owner, way = [0] * (width + 1), [0] * (width + 1)  # 1-based; owner[0] is the row being added
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        min_slack = [float('inf')] * (width + 1)
+        used = [False] * (width + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = owner[j0], float('inf'), 0
+            row = a[i0 - 1]
+            for j in range(1, width + 1):
+                if not used[j]:
+                    slack = row[j - 1] - u[i0] - v[j]
+                    if slack < min_slack[j]:
+                        min_slack[j], way[j] = slack, j0
+                    if min_slack[j] < delta:
+                        delta, j1 = min_slack[j], j
+            for j in range(width + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            j0 = j1
+            if not owner[j0]:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+    result = [None] * n
+    for j in range(1, m + 1):
+        if owner[j] and costs[owner[j] - 1][j - 1] is not None:
+            result[owner[j] - 1] = j - 1
+    return result
+
+# Bump when a scheduler change makes the same inputs produce a different timetable, so
+# generations stored with older input fingerprints are no longer reused
+SCHEDULER_REVISION = 1
+
 class ConflictFreeScheduler:
     """Intelligent timetable scheduler with comprehensive conflict detection"""
 
-    def __init__(self, courses: List[Course]):
+    def __init__(self, courses: List[Course], placed_course_ids=(), faculties=None, classrooms=None,
+                 conflict_pairs=None, weights=None, carried=(), room_mode=None, course_sizes=None):
+        """`placed_course_ids` are courses already in the timetable that placements must respect.
+
+        `carried` are Timetable rows of other groups kept as they are: placements avoid them and
+        generate() copies them into the new generation, so a run can be scoped to a few groups.
+
+        Faculties, classrooms, the course pairs sharing students and the scoring weights are
+        loaded from the database unless given, which lets a sandbox solve a detached snapshot
+        (see run_sandbox) and a run be repeated with a past generation's weights.
+
+        `room_mode` overrides ROOM_ASSIGNMENT; `course_sizes` (course id -> enrolled students)
+        is read from the database when the matching mode needs it and it isn't given.
+        """
         self.courses = courses
+        self.carried = list(carried)
+        self.placed_course_ids = sorted(set(placed_course_ids))
 
         # Scheduling constraints
-        self.slots = [time(10, 0), time(11, 0), time(12, 0), time(14, 0),
-                      time(15, 0), time(16, 0)]
+        self.slots = list(TEACHING_SLOTS)
 
-        # Load resources
-        self.faculties = {f.id: f for f in Faculty.query.all()}
-        self.classrooms = {c.id: c for c in Classroom.query.all()}
+        # Load resources in id order: rooms are tried in this order, so it must not depend on the query plan
+        self.faculties = {f.id: f for f in (Faculty.query.order_by(Faculty.id) if faculties is None else faculties)}
+        self.classrooms = {c.id: c for c in (Classroom.query.order_by(Classroom.id) if classrooms is None else classrooms)}
 
         # Parse faculty available days
         self.faculty_days = {f.id: self._parse_available_days(f.availability) for f in self.faculties.values()}
         self.days = sorted(set(d for days in self.faculty_days.values() for d in days))
 
         # Define day order to prioritize earliest days
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        day_order = DAY_ORDER
         self.days = sorted(self.days, key=lambda d: day_order.index(d) if d in day_order else 7)
 
         # Create time_slots as list of (day, start_time) tuples, sorted by day order then time
@@ -237,8 +1045,79 @@ class ConflictFreeScheduler:
                 self.time_slots.append((day, slot))
         self.time_slots = sorted(self.time_slots, key=lambda s: (day_order.index(s[0]) if s[0] in day_order else 7, s[1]))
 
+        # Courses sharing enrolled students (electives, backlogs) must not overlap either; each
+        # course gets a bit so the check against a slot's placed courses is a single AND
+        course_ids = dict.fromkeys([c.id for c in courses] + list(placed_course_ids) +
+                                   [r.course_id for r in self.carried if r.course_id])
+        self.course_bits = {course_id: 1 << i for i, course_id in enumerate(course_ids)}
+        self.conflict_masks = self._load_enrollment_conflicts(conflict_pairs)
+
+        self.weights = scoring_weights() if weights is None else normalize_scoring_weights(weights)
+        self.scoring = compile_scoring(self.weights, self.days, self.slots)
+
+        self.room_mode = room_mode or app.config['ROOM_ASSIGNMENT']
+        if self.room_mode not in ROOM_MODES:
+            raise ValueError(f"Unknown room assignment mode: {self.room_mode}")
+        self.room_costs = self._rank_rooms(course_sizes) if self.room_mode == 'matching' else None
+
         self.current_gen = None
 
+    def _rank_rooms(self, course_sizes=None):
+        """Per course, {room id: cost} of the rooms big enough for its enrolled students, cheapest first.
+
+        The cost is the unused capacity, plus ROOM_TYPE_MISMATCH_COST when the room's type differs
+        from that of the classroom assigned to the course.
+        """
+        if course_sizes is None:
+            course_sizes = dict(db.session.query(enrollments.c.course_id, db.func.count(enrollments.c.user_id)).filter(
+                enrollments.c.course_id.in_([c.id for c in self.courses])).group_by(enrollments.c.course_id).all())
+        ranked = {}
+        for course in self.courses:
+            size = course_sizes.get(course.id, 0)
+            home = self.classrooms.get(course.classroom_id)
+            costs = {room.id: room.capacity - size + (ROOM_TYPE_MISMATCH_COST if home and room.type != home.type else 0)
+                     for room in self.classrooms.values() if (room.capacity or 0) >= size}
+            ranked[course.id] = dict(sorted(costs.items(), key=lambda item: item[1]))
+        return ranked
+
+    def _load_enrollment_conflicts(self, pairs=None) -> Dict[int, int]:
+        """Sparse course conflict graph from shared enrollments, as course id -> bitmask of neighbours"""
+        if pairs is None:
+            pairs = course_pairs_sharing_students(list(self.course_bits))
+        masks = {}
+        self.conflict_pairs = []
+        for a, b in pairs:
+            if a not in self.course_bits or b not in self.course_bits:
+                continue
+            masks[a] = masks.get(a, 0) | self.course_bits[b]
+            masks[b] = masks.get(b, 0) | self.course_bits[a]
+            self.conflict_pairs.append((min(a, b), max(a, b)))
+        self.conflict_pairs.sort()
+        return masks
+
+    def input_fingerprint(self):
+        """SHA-256 of everything solve() reads, in canonical form.
+
+        Solving is deterministic, so equal fingerprints mean an identical timetable and
+        generate() can reuse the stored generation instead of solving again. Courses keep the
+        caller's order since it is their placement priority.
+        """
+        inputs = {
+            'revision': SCHEDULER_REVISION,
+            'courses': [(c.id, c.faculty_id, c.classroom_id, c.duration, c.department, c.semester) for c in self.courses],
+            'carried': sorted(repr((r.course_id, r.faculty_id, r.classroom_id, r.day, r.start_time, r.end_time,
+                                    r.department, r.semester)) for r in self.carried),
+            'placed': self.placed_course_ids,
+            'faculty': sorted((f_id, sorted(days)) for f_id, days in self.faculty_days.items()),
+            'rooms': [(c.id, c.capacity, c.type) for c in self.classrooms.values()],
+            'conflicts': self.conflict_pairs,
+            'slots': [slot.isoformat() for slot in self.slots],
+            'weights': sorted(self.weights.items()),
+            'room_mode': self.room_mode,
+            'room_costs': self.room_costs,
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
     def _parse_available_days(self, availability: str) -> List[str]:
         """Parse faculty availability string to extract available days."""
         days_map = {
@@ -252,223 +1131,1966 @@ class ConflictFreeScheduler:
             part = part.strip()
             if part in days_map:
                 days.append(days_map[part])
-        return list(set(days))  # Remove duplicates
+        return list(dict.fromkeys(days))  # Remove duplicates, keeping the order given
+
+
+
+    def _reset_occupancy(self):
+        """Empty per-run occupancy: faculty, classroom, group and enrolled-course usage per day"""
+        self.faculty_schedule = {f.id: {d: [] for d in self.days} for f in self.faculties.values()}
+        self.classroom_schedule = {c.id: {d: [] for d in self.days} for c in self.classrooms.values()}
+        self.dept_sem_schedule = {}
+        self.student_schedule = {d: {} for d in self.days}  # day -> slot -> bitmask of placed courses
+        self.room_match = {}  # two-phase mode: (day, slot) -> {room id: course} feasible so far
+
+    def _block_slots(self, slot, duration):
+        """The consecutive hourly slots a class starting at `slot` occupies"""
+        return [(datetime.combine(datetime.today(), slot) + timedelta(hours=i)).time() for i in range(duration)]
+
+    def _occupy(self, course_id, department, semester, faculty_id, classroom_id, day, slot, duration):
+        """Mark all consecutive slots of a placed class as occupied"""
+        key = (department, semester)
+        if key not in self.dept_sem_schedule:
+            self.dept_sem_schedule[key] = {d: [] for d in self.days}
+        for next_slot in self._block_slots(slot, duration):
+            if faculty_id in self.faculty_schedule and day in self.days:
+                self.faculty_schedule[faculty_id][day].append(next_slot)
+            if classroom_id in self.classroom_schedule and day in self.days:
+                self.classroom_schedule[classroom_id][day].append(next_slot)
+            if day in self.days:
+                self.dept_sem_schedule[key][day].append(next_slot)
+                self.student_schedule[day][next_slot] = self.student_schedule[day].get(next_slot, 0) | self.course_bits.get(course_id, 0)
+
+    def _available(self, course, faculty, classroom, day, slot):
+        # Check if faculty is available on this day
+        if day not in self.faculty_days[faculty.id]:
+            return False
+        return self._block_free(course, faculty.id, classroom.id, day, slot)
+
+    def _block_free(self, course, faculty_id, classroom_id, day, slot):
+        """Whether every hour of the course's block starting at `slot` is free for all parties.
+
+        A classroom_id of None leaves rooms out, for the two-phase mode's slot assignment.
+        """
+        conflict_mask = self.conflict_masks.get(course.id, 0)
+        dept_sem = self.dept_sem_schedule.get((course.department, course.semester))
+        room_slots = self.classroom_schedule[classroom_id][day] if classroom_id is not None else ()
+        # For multi-hour courses, check consecutive slots
+        slots_needed = self._block_slots(slot, course.duration)
+        if any(s not in self.slots for s in slots_needed):
+            return False
+        # Check all consecutive slots for conflicts
+        for s in slots_needed:
+            if s in self.faculty_schedule[faculty_id][day]:
+                return False
+            if s in room_slots:
+                return False
+            if dept_sem and s in dept_sem[day]:
+                return False
+            if self.student_schedule[day].get(s, 0) & conflict_mask:
+                return False
+        return True
+
+    def _score(self, course, faculty, day, slot):
+        """Weighted soft-constraint score of a candidate, from the run's compiled tables"""
+        tables = self.scoring
+        score = tables.static[day, slot, course.duration > 1]
+        neighbours = tables.neighbours[slot]
+
+        # Compact with other same dept-sem classes that day
+        dept_slots = self.dept_sem_schedule.get((course.department, course.semester), {}).get(day, [])
+        adjacent, isolated, free_day = tables.group
+        if dept_slots:
+            score += adjacent if any(s.hour in neighbours for s in dept_slots) else isolated
+        else:
+            score += free_day
+        score += tables.day_load[day] * len(dept_slots)
+
+        # Faculty idle time minimization
+        fac_slots = self.faculty_schedule[faculty.id][day]
+        adjacent, isolated, free_day = tables.faculty
+        if fac_slots:
+            score += adjacent if any(s.hour in neighbours for s in fac_slots) else isolated
+        else:
+            score += free_day
+        return score
+
+    def _best_option(self, course):
+        """Highest scoring free (day, slot, classroom, faculty) for a course, or None"""
+        faculty = course.faculty
+        if not faculty or faculty.id not in self.faculty_days:
+            return None
+        best_option = None
+        best_score = -1e9
+        if self.room_costs is None:
+            rooms = list(self.classrooms.values())
+        else:
+            rooms = [self.classrooms[room_id] for room_id in self.room_costs.get(course.id, ())]
+        for day, slot in sorted(self.time_slots, key=lambda s: (s[0], s[1])):
+            for classroom in rooms:
+                if not self._available(course, faculty, classroom, day, slot):
+                    continue
+                score = self._score(course, faculty, day, slot)
+                if score > best_score:
+                    best_score = score
+                    best_option = (day, slot, classroom, faculty)
+        return best_option
+
+    def _best_slot(self, course):
+        """Two-phase mode, phase one: the highest scoring free (day, slot) for the course's
+        faculty and group where every hour of the block can still get a fitting room.
+
+        Returns (day, slot, faculty, room matchings of the block's hours) or None.
+        """
+        faculty = course.faculty
+        if not faculty or faculty.id not in self.faculty_days or not self.room_costs.get(course.id):
+            return None
+        available_days = self.faculty_days[faculty.id]
+        best_option = None
+        best_score = -1e9
+        for day, slot in sorted(self.time_slots, key=lambda s: (s[0], s[1])):
+            if day not in available_days or not self._block_free(course, faculty.id, None, day, slot):
+                continue
+            score = self._score(course, faculty, day, slot)
+            if score > best_score:
+                matchings = self._match_block(course, day, slot)
+                if matchings is not None:
+                    best_score = score
+                    best_option = (day, slot, faculty, matchings)
+        return best_option
+
+    def _match_block(self, course, day, slot):
+        """Room matchings of each hour of the block with the course added, or None if some hour
+        can't fit it; courses already matched may move to other rooms to make space"""
+        matchings = {}
+        for s in self._block_slots(slot, course.duration):
+            match = dict(self.room_match.get((day, s), ()))
+            if not self._augment(course, day, s, match, set()):
+                return None
+            matchings[day, s] = match
+        return matchings
+
+    def _augment(self, course, day, slot, match, seen):
+        """Find the course a room through an augmenting path (Kuhn's algorithm), updating match"""
+        for room_id in self.room_costs[course.id]:
+            if room_id in seen or slot in self.classroom_schedule[room_id][day]:
+                continue
+            seen.add(room_id)
+            holder = match.get(room_id)
+            if holder is None or self._augment(holder, day, slot, match, seen):
+                match[room_id] = course
+                return True
+        return False
+
+    def _assign_rooms(self, slotted):
+        """Two-phase mode, phase two: rooms for the courses starting at each (day, slot), as a
+        minimum-cost matching over the rooms free for their whole block.
+
+        Returns (timetable, courses left without a room).
+        """
+        self._reset_occupancy()
+        for r in self.carried:
+            self._occupy_row(r)
+        starts = {}
+        for entry in slotted:
+            starts.setdefault((entry[1], entry[2]), []).append(entry)
+        rooms = list(self.classrooms.values())
+        placed, leftover = {}, []
+        for day, slot in sorted(starts, key=lambda k: (self.days.index(k[0]), k[1])):
+            group = starts[day, slot]
+            costs = [[self._room_cost(course, room, day, slot) for room in rooms] for course, *_ in group]
+            for (course, _, _, faculty), column in zip(group, min_cost_assignment(costs)):
+                if column is None:
+                    leftover.append(course)
+                    continue
+                room = rooms[column]
+                placed[course.id] = (course, day, slot, room, faculty)
+                self._occupy(course.id, course.department, course.semester, faculty.id, room.id, day, slot, course.duration)
+        return [placed[course.id] for course, *_ in slotted if course.id in placed], leftover
+
+    def _room_cost(self, course, room, day, slot):
+        cost = self.room_costs[course.id].get(room.id)
+        if cost is None:
+            return None
+        busy = self.classroom_schedule[room.id][day]
+        if any(s in busy for s in self._block_slots(slot, course.duration)):
+            return None
+        return cost
+
+    def _solve_two_phase(self):
+        slotted = []
+        for course in self.courses:
+            option = self._best_slot(course)
+            if option:
+                day, slot, faculty, matchings = option
+                self.room_match.update(matchings)
+                slotted.append((course, day, slot, faculty))
+                self._occupy(course.id, course.department, course.semester, faculty.id, None, day, slot, course.duration)
+        timetable, leftover = self._assign_rooms(slotted)
+        # A multi-hour block can fit every hour's matching yet find no single room free for the
+        # whole block; such courses fall back to a greedy placement around everything else
+        for course in leftover:
+            option = self._best_option(course)
+            if option:
+                day, slot, classroom, faculty = option
+                timetable.append((course, day, slot, classroom, faculty))
+                self._occupy(course.id, course.department, course.semester, faculty.id, classroom.id, day, slot, course.duration)
+        return timetable
+
+    def solve(self):
+        """Place every course with greedy scoring, then shift entries earlier where possible.
+
+        Works purely in memory and returns the placements as (course, day, slot, classroom,
+        faculty) tuples; generate() persists them, the sandbox only compares them.
+        """
+        self._reset_occupancy()
+        for r in self.carried:
+            self._occupy_row(r)
+        if self.room_mode == 'matching':
+            timetable = self._solve_two_phase()
+            self._optimize_schedule(timetable)
+            return timetable
+        timetable = []
+
+        # Try to fill each day compactly per dept-semester
+        for course in self.courses:
+            best_option = self._best_option(course)
+            if best_option:
+                day, slot, classroom, faculty = best_option
+                timetable.append((course, day, slot, classroom, faculty))
+                # Mark all consecutive slots as occupied for multi-hour courses
+                self._occupy(course.id, course.department, course.semester, faculty.id, classroom.id, day, slot, course.duration)
+
+        self._optimize_schedule(timetable)
+        return timetable
+
+    def generate(self):
+        """Generate optimized timetable across all departments with greedy scoring.
+
+        The result is stored as a new generation and made active; older generations are kept
+        (see apply_generation_retention) so they can be diffed and rolled back to. If a stored,
+        unedited generation was solved from identical inputs it is made active instead.
+        """
+        fingerprint = self.input_fingerprint()
+        previous = TimetableGeneration.query.filter_by(input_fingerprint=fingerprint, revision=0) \
+            .order_by(TimetableGeneration.generation.desc()).first()
+        if previous is not None:
+            self.current_gen = previous.generation
+            if active_generation() != previous.generation:
+                set_active_generation(previous.generation)
+                db.session.commit()
+            return True, f"Inputs unchanged since generation {previous.generation}; reused it without solving"
+
+        timetable = self.solve()
+
+        new_gen = next_generation_number()
+
+        # Save results
+        for course, day, slot, classroom, faculty in timetable:
+            db.session.add(self._entry(course, day, slot, classroom, faculty, new_gen))
+        for r in self.carried:
+            db.session.add(Timetable(department=r.department, semester=r.semester, course_id=r.course_id,
+                                     faculty_id=r.faculty_id, classroom_id=r.classroom_id, day=r.day,
+                                     start_time=r.start_time, end_time=r.end_time, generation=new_gen))
+        db.session.add(TimetableGeneration(generation=new_gen, entry_count=len(timetable) + len(self.carried),
+                                           scoring=json.dumps(self.weights, sort_keys=True),
+                                           input_fingerprint=fingerprint))
+        db.session.flush()
+        self.current_gen = new_gen
+        set_active_generation(new_gen)
+        apply_generation_retention()
+        db.session.commit()
+        return True, "Timetable generated successfully"
+
+    def _entry(self, course, day, slot, classroom, faculty, generation):
+        return Timetable(
+            department=course.department,
+            semester=course.semester,
+            course_id=course.id,
+            faculty_id=faculty.id,
+            classroom_id=classroom.id,
+            day=day,
+            start_time=slot,
+            end_time=(datetime.combine(datetime.today(), slot) + timedelta(hours=course.duration)).time(),
+            generation=generation
+        )
+
+    def place_incrementally(self, course, generation):
+        """Place (or re-place) one course in an existing generation, leaving other entries alone.
+
+        Occupancy is loaded from the generation's other entries and the course gets the best
+        scoring free slot, written as a single row. Only if nothing fits are the other courses of
+        its department/semester re-placed around it (a scoped repair). If that fails too, the
+        generation is left untouched. Returns (success, message).
+        """
+        rows = db.session.query(
+            Timetable.id, Timetable.course_id, Timetable.faculty_id, Timetable.classroom_id, Timetable.day,
+            Timetable.start_time, Timetable.end_time, Timetable.department, Timetable.semester
+        ).filter(Timetable.generation == generation).all()
+        others = [r for r in rows if r.course_id != course.id]
+        stale_ids = [r.id for r in rows if r.course_id == course.id]
+
+        self._reset_occupancy()
+        for r in others:
+            self._occupy_row(r)
+        option = self._best_option(course)
+        if option:
+            day, slot, classroom, faculty = option
+            self._replace_entries(stale_ids, [self._entry(course, day, slot, classroom, faculty, generation)], generation)
+            return True, f"{course.name} scheduled on {day} at {slot.strftime('%I:%M %p')} in {classroom.name}."
+        return self._repair_group(course, generation, others, stale_ids)
+
+    def _occupy_row(self, r):
+        duration = max(1, round((datetime.combine(datetime.today(), r.end_time) -
+                                 datetime.combine(datetime.today(), r.start_time)).seconds / 3600))
+        self._occupy(r.course_id, r.department, r.semester, r.faculty_id, r.classroom_id, r.day, r.start_time, duration)
+
+    def _repair_group(self, course, generation, others, stale_ids):
+        """Re-place the course's whole department/semester group around the rest of the timetable"""
+        key = (course.department, course.semester)
+        group_rows = [r for r in others if (r.department, r.semester) == key and r.course_id]
+        group_courses = {c.id: c for c in Course.query.filter(Course.id.in_([r.course_id for r in group_rows])).all()}
+        self._reset_occupancy()
+        for r in others:
+            if (r.department, r.semester) != key or not r.course_id:
+                self._occupy_row(r)
+        # The changed course goes first so it gets a slot; the rest keep their original order.
+        # The repair is only applied if every course of the group still fits.
+        new_entries = []
+        for c in [course] + [group_courses.get(r.course_id) for r in group_rows]:
+            option = self._best_option(c) if c else None
+            if option is None:
+                # Nothing is written, so a course that was already placed keeps its existing entries
+                note = "its current slot is kept" if stale_ids else "it is not in the timetable yet"
+                return False, f"No free slot for {course.name} ({note}); regenerate the timetable to fit it in."
+            day, slot, classroom, faculty = option
+            new_entries.append(self._entry(c, day, slot, classroom, faculty, generation))
+            self._occupy(c.id, c.department, c.semester, faculty.id, classroom.id, day, slot, c.duration)
+        self._replace_entries(stale_ids + [r.id for r in group_rows], new_entries, generation)
+        return True, f"{course.name} scheduled by rearranging {key[0].upper()} Semester {key[1]}."
+
+    def _replace_entries(self, stale_ids, new_entries, generation):
+        if stale_ids:
+            Timetable.query.filter(Timetable.id.in_(stale_ids)).delete(synchronize_session=False)
+        db.session.add_all(new_entries)
+        TimetableGeneration.query.filter_by(generation=generation).update(
+            {'entry_count': TimetableGeneration.entry_count + len(new_entries) - len(stale_ids)}, synchronize_session=False)
+        touch_generation(generation)
+
+    def _optimize_schedule(self, timetable):
+        """Shift courses to earlier slots if possible without conflicts"""
+        for index in range(len(timetable)):
+            self._shift_course_up(timetable, index)
+
+    def _shift_course_up(self, timetable, index):
+        """Attempt to shift a placement to an earlier slot on the same day"""
+        course, day, current_slot, classroom, faculty = timetable[index]
+        earlier_slots = [s for s in self.slots if s < current_slot]
+        if not earlier_slots:
+            return
+
+        # Occupancy of every other placement, including ones already shifted
+        self._reset_occupancy()
+        for r in self.carried:
+            self._occupy_row(r)
+        for i, (other, other_day, other_slot, other_room, other_faculty) in enumerate(timetable):
+            if i != index:
+                self._occupy(other.id, other.department, other.semester, other_faculty.id, other_room.id,
+                             other_day, other_slot, other.duration)
+
+        for new_slot in sorted(earlier_slots, reverse=True):  # Nearest earlier slot first
+            if self._block_free(course, faculty.id, classroom.id, day, new_slot):
+                timetable[index] = (course, day, new_slot, classroom, faculty)
+                break
+
+def place_course_incrementally(course):
+    """Fit an added or edited course into the active timetable without regenerating it.
+
+    Returns (success, message), or None when there is no active timetable to update. Caller commits.
+    """
+    generation = active_generation()
+    if not generation:
+        return None
+    if not (course.faculty_id and course.classroom_id):
+        stale = Timetable.query.filter_by(generation=generation, course_id=course.id).delete(synchronize_session=False)
+        if stale:
+            touch_generation(generation)
+        return None
+    placed = [course_id for (course_id,) in db.session.query(Timetable.course_id).filter(
+        Timetable.generation == generation, Timetable.course_id.isnot(None)).distinct()]
+    scheduler = ConflictFreeScheduler([course], placed_course_ids=placed)
+    return scheduler.place_incrementally(course, generation)
+
+# --- Admin writes ---
+class CatalogWrites:
+    """Unit of work for admin edits of courses, faculty, classrooms and accounts.
+
+    Used as a context manager around one edit. The methods issue set-based UPDATE/DELETE
+    statements keyed by id instead of loading related rows through ORM cascades, and on exit
+    everything done in the block, ORM attribute changes included, is committed in one
+    transaction (or rolled back if the block raised). Generations whose entries are rewritten
+    in place get their revision bumped, as touch_generation() does.
+
+        with CatalogWrites() as writes:
+            writes.update_courses(course_ids, {'classroom_id': room.id})
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            db.session.rollback()
+            return False
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return False
+
+    @staticmethod
+    def _execute(statement):
+        return db.session.execute(statement, execution_options={'synchronize_session': False}).rowcount
+
+    def _touch_entries(self, condition):
+        """Bump the revision of every generation with entries matching `condition`; call before changing them"""
+        self._execute(db.update(TimetableGeneration).where(TimetableGeneration.generation.in_(
+            db.select(Timetable.generation).where(condition))).values(revision=TimetableGeneration.revision + 1))
+
+    def update_courses(self, course_ids, values):
+        """Set course columns on many courses in one statement. A new faculty or classroom also
+        carries over to the courses' entries in the active timetable. Returns the courses updated."""
+        if not course_ids or not values:
+            return 0
+        updated = self._execute(db.update(Course).where(Course.id.in_(course_ids)).values(**values))
+        entry_values = {key: values[key] for key in ('faculty_id', 'classroom_id') if key in values}
+        generation = active_generation()
+        if entry_values and generation and self._execute(db.update(Timetable).where(
+                Timetable.generation == generation, Timetable.course_id.in_(course_ids)).values(**entry_values)):
+            touch_generation(generation)
+        return updated
+
+    def delete_courses(self, course_ids):
+        """Delete courses and their enrollments; their timetable entries stay in history, unlinked"""
+        if not course_ids:
+            return 0
+        self._execute(enrollments.delete().where(enrollments.c.course_id.in_(course_ids)))
+        self._touch_entries(Timetable.course_id.in_(course_ids))
+        self._execute(db.update(Timetable).where(Timetable.course_id.in_(course_ids)).values(course_id=None))
+        return self._execute(db.delete(Course).where(Course.id.in_(course_ids)))
+
+    def delete_faculty(self, faculty_id):
+        """Delete a faculty member, unassigning their courses and timetable entries"""
+        self._touch_entries(Timetable.faculty_id == faculty_id)
+        self._execute(db.update(Course).where(Course.faculty_id == faculty_id).values(faculty_id=None))
+        self._execute(db.update(Timetable).where(Timetable.faculty_id == faculty_id).values(faculty_id=None))
+        return self._execute(db.delete(Faculty).where(Faculty.id == faculty_id))
+
+    def delete_classroom(self, classroom_id):
+        """Delete a classroom, unassigning its courses and timetable entries"""
+        self._touch_entries(Timetable.classroom_id == classroom_id)
+        self._execute(db.update(Course).where(Course.classroom_id == classroom_id).values(classroom_id=None))
+        self._execute(db.update(Timetable).where(Timetable.classroom_id == classroom_id).values(classroom_id=None))
+        return self._execute(db.delete(Classroom).where(Classroom.id == classroom_id))
+
+    def delete_user(self, user_id):
+        """Delete an account and its enrollments"""
+        self._execute(enrollments.delete().where(enrollments.c.user_id == user_id))
+        return self._execute(db.delete(User).where(User.id == user_id))
+
+# --- Generation lock ---
+GENERATION_LOCK_NAME = 'generate'
+GENERATION_ADVISORY_KEY = 0x54544745  # pg advisory lock id for generation runs
+LAST_GENERATION_JOB_KEY = 'last_generation_job'
+
+GenerationRun = namedtuple('GenerationRun', 'result lock_wait_ms deduplicated')
+
+class GenerationStats:
+    """Process-wide generation run counters, exposed on /admin/generation_lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.deduplicated = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def add(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'deduplicated': self.deduplicated,
+                'timeouts': self.timeouts,
+                'lock_wait_avg_ms': round(self.wait_total / self.waits * 1000, 3) if self.waits else 0.0,
+                'lock_wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+
+generation_stats = GenerationStats()
+
+class _AdvisoryLock:
+    """Postgres session advisory lock held on its own autocommit connection"""
+    backend = 'advisory'
+
+    def __init__(self, key):
+        self.key = key
+        self.conn = None
+        self.acquired = False
+
+    def try_acquire(self):
+        if self.conn is None:
+            self.conn = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        self.acquired = bool(self.conn.execute(db.text('SELECT pg_try_advisory_lock(:key)'), {'key': self.key}).scalar())
+        return self.acquired
+
+    def release(self):
+        if self.conn is None:
+            return
+        try:
+            if self.acquired:
+                self.conn.execute(db.text('SELECT pg_advisory_unlock(:key)'), {'key': self.key})
+        finally:
+            self.conn.close()
+
+class _RowLock:
+    """JobLock row claimed with a conditional UPDATE, on separate short transactions"""
+    backend = 'row'
+
+    def __init__(self, name):
+        self.name = name
+        self.owner = os.urandom(16).hex()
+        self.acquired = False
+
+    def try_acquire(self):
+        table = JobLock.__table__
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=app.config['GENERATION_LOCK_TTL'])
+        with db.engine.begin() as conn:
+            claimed = conn.execute(table.update().where(
+                table.c.name == self.name, db.or_(table.c.owner.is_(None), table.c.expires_at < now)
+            ).values(owner=self.owner, expires_at=expires)).rowcount
+            exists = claimed or conn.execute(db.select(table.c.name).where(table.c.name == self.name)).first()
+        if not exists:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(table.insert().values(name=self.name, owner=self.owner, expires_at=expires))
+                claimed = True
+            except IntegrityError:
+                claimed = False  # another process created and took it first
+        self.acquired = bool(claimed)
+        return self.acquired
+
+    def release(self):
+        if self.acquired:
+            table = JobLock.__table__
+            with db.engine.begin() as conn:
+                conn.execute(table.update().where(table.c.name == self.name, table.c.owner == self.owner)
+                             .values(owner=None, expires_at=None))
+
+def generation_lock():
+    """The lock serializing generation runs of the current partition across processes; other
+    partitions take their own lock and generate in parallel"""
+    partition = current_partition()
+    default = partition == default_partition()
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql') and db_pool_mode() != 'external':
+        return _AdvisoryLock(GENERATION_ADVISORY_KEY if default else
+                             GENERATION_ADVISORY_KEY << 32 | int(partition_digest(partition), 16))
+    # Session-level advisory locks are unreliable behind transaction poolers, so those use the row too
+    return _RowLock(GENERATION_LOCK_NAME if default else f"{GENERATION_LOCK_NAME}:{partition_digest(partition)}")
+
+class _GenerationJob:
+    def __init__(self):
+        self.done = threading.Event()
+        self.run = None
+        self.error = None
+
+_generation_jobs = {}
+_generation_jobs_lock = threading.Lock()
+
+def generation_job_key(*parts):
+    """Identity of a generation request; concurrent requests with the same key share one run"""
+    return hashlib.sha1(repr((tuple(current_partition()),) + parts).encode()).hexdigest()[:16]
+
+def run_generation(job_key, run):
+    """Call `run()`, which generates and commits a timetable, with generation runs serialized.
+
+    Runs wait for a database-level lock (see generation_lock), so concurrent requests can't
+    interleave or pick the same generation number. A request identical to one already running
+    (same `job_key`) waits for that run and shares its result instead of starting another: in
+    this process through the in-flight job table, across processes through the last finished
+    job recorded in AppState. Returns a GenerationRun whose `result` is run()'s (success, message).
+    """
+    with _generation_jobs_lock:
+        job = _generation_jobs.get(job_key)
+        leader = job is None
+        if leader:
+            job = _generation_jobs[job_key] = _GenerationJob()
+    if not leader:
+        generation_stats.add('deduplicated')
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return GenerationRun(job.run.result, 0.0, True)
+
+    try:
+        job.run = _run_generation_locked(job_key, run)
+        return job.run
+    except BaseException as e:
+        job.error = e
+        raise
+    finally:
+        with _generation_jobs_lock:
+            del _generation_jobs[job_key]
+        job.done.set()
+
+def _run_generation_locked(job_key, run):
+    requested_at = datetime.now().timestamp()
+    lock = generation_lock()
+    start = perf_counter()
+    try:
+        while not lock.try_acquire():
+            if perf_counter() - start >= app.config['GENERATION_LOCK_TIMEOUT']:
+                generation_stats.add('timeouts')
+                return GenerationRun((False, 'Another timetable generation is still running; try again shortly.'),
+                                     (perf_counter() - start) * 1000, False)
+            sleep(0.2)
+        waited_ms = (perf_counter() - start) * 1000
+        generation_stats.record_wait(waited_ms / 1000)
+        # Objects loaded before the wait (the active pointer among them) may predate the last run
+        db.session.expire_all()
+
+        last_job_key = partition_key(LAST_GENERATION_JOB_KEY)
+        state = db.session.get(AppState, last_job_key, populate_existing=True)
+        last = json.loads(state.value) if state else None
+        if last and last['key'] == job_key and last['finished'] >= requested_at:
+            # An identical request in another process finished while this one waited
+            generation_stats.add('deduplicated')
+            return GenerationRun((last['success'], last['message']), waited_ms, True)
+
+        generation_stats.add('runs')
+        try:
+            success, message = run()
+        except Exception:
+            db.session.rollback()
+            raise
+        if state is None:
+            state = AppState(key=last_job_key)
+            db.session.add(state)
+        state.value = json.dumps({'key': job_key, 'finished': datetime.now().timestamp(),
+                                  'success': success, 'message': message[:100]})
+        db.session.commit()
+        return GenerationRun((success, message), waited_ms, False)
+    finally:
+        lock.release()
+
+def describe_generation_run(job):
+    """The run's message, noting lock waits and shared runs"""
+    success, message = job.result
+    if job.deduplicated:
+        message += ' (shared with an identical request that was already running)'
+    elif job.lock_wait_ms >= 1000:
+        message += f' (waited {job.lock_wait_ms / 1000:.1f}s for another generation to finish)'
+    return success, message
+
+# --- What-if sandbox ---
+# Detached, picklable copies of what the scheduler reads, so a scenario can be solved in a worker
+# process without a database session and without touching the live timetable
+SandboxFaculty = namedtuple('SandboxFaculty', 'id name availability')
+SandboxClassroom = namedtuple('SandboxClassroom', 'id name capacity type')
+SandboxCourse = namedtuple('SandboxCourse', 'id name department semester duration faculty classroom_id')
+SandboxSnapshot = namedtuple('SandboxSnapshot', 'faculties classrooms courses conflict_pairs weights course_sizes')
+
+SANDBOX_MAX_SCENARIOS = 16
+
+_sandbox_pool = None
+_sandbox_pool_lock = threading.Lock()
+
+def sandbox_snapshot():
+    """Current faculty, classrooms, schedulable courses (as tuples), shared-enrollment pairs, scoring
+    weights and enrollment counts"""
+    faculties = [SandboxFaculty(*row) for row in db.session.query(Faculty.id, Faculty.name, Faculty.availability)
+                 .order_by(Faculty.id)]
+    classrooms = [SandboxClassroom(*row) for row in db.session.query(Classroom.id, Classroom.name, Classroom.capacity, Classroom.type)
+                  .order_by(Classroom.id)]
+    courses = db.session.query(Course.id, Course.name, Course.department, Course.semester, Course.duration,
+                               Course.faculty_id, Course.classroom_id).filter(
+        Course.faculty_id.isnot(None), Course.classroom_id.isnot(None)).order_by(Course.id).all()
+    sizes = dict(db.session.query(enrollments.c.course_id, db.func.count(enrollments.c.user_id))
+                 .group_by(enrollments.c.course_id).all())
+    return SandboxSnapshot(faculties, classrooms, [tuple(c) for c in courses],
+                           course_pairs_sharing_students([c.id for c in courses]), scoring_weights(), sizes)
+
+def sandbox_scenario(close_rooms=(), faculty_days=None, drop_courses=()):
+    """Normalised hypothetical changes: rooms closed, faculty availability overrides, courses dropped"""
+    return {'close_rooms': sorted({int(r) for r in close_rooms}),
+            'faculty_days': {int(f): str(days) for f, days in (faculty_days or {}).items()},
+            'drop_courses': sorted({int(c) for c in drop_courses})}
+
+def solve_sandbox(snapshot, scenario):
+    """Apply a scenario to a snapshot and run the scheduler on it; no database access.
+
+    Returns {'placements': {course_id: (day, start_time, classroom_id, faculty_id)}, 'unplaced': [course ids]}.
+    """
+    overrides = scenario['faculty_days']
+    faculties = {f.id: f._replace(availability=overrides.get(f.id, f.availability)) for f in snapshot.faculties}
+    closed, dropped = set(scenario['close_rooms']), set(scenario['drop_courses'])
+    classrooms = [c for c in snapshot.classrooms if c.id not in closed]
+    courses = [SandboxCourse(course_id, name, dept, sem, duration, faculties.get(faculty_id), classroom_id)
+               for course_id, name, dept, sem, duration, faculty_id, classroom_id in snapshot.courses
+               if course_id not in dropped]
+    scheduler = ConflictFreeScheduler(courses, faculties=list(faculties.values()), classrooms=classrooms,
+                                      conflict_pairs=snapshot.conflict_pairs, weights=snapshot.weights,
+                                      course_sizes=snapshot.course_sizes)
+    placements = {course.id: (day, slot, classroom.id, faculty.id)
+                  for course, day, slot, classroom, faculty in scheduler.solve()}
+    return {'placements': placements, 'unplaced': [c.id for c in courses if c.id not in placements]}
+
+def _sandbox_executor():
+    global _sandbox_pool
+    if app.config['SANDBOX_WORKERS'] <= 0:
+        return None
+    with _sandbox_pool_lock:
+        if _sandbox_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # Spawned workers import the app fresh instead of inheriting the server's threads and connections
+            _sandbox_pool = ProcessPoolExecutor(max_workers=app.config['SANDBOX_WORKERS'],
+                                                mp_context=multiprocessing.get_context('spawn'))
+    return _sandbox_pool
+
+def run_sandboxes(scenarios):
+    """Solve each scenario against one snapshot of the current data and diff it with the live generation.
+
+    Scenarios run concurrently in the worker pool. Returns one dict per scenario with the
+    scheduled and unplaced counts and the same per-course changes as diff_generations.
+    """
+    snapshot = sandbox_snapshot()
+    executor = _sandbox_executor()
+    if executor is None:
+        results = [solve_sandbox(snapshot, scenario) for scenario in scenarios]
+    else:
+        futures = [executor.submit(solve_sandbox, snapshot, scenario) for scenario in scenarios]
+        results = [future.result(timeout=app.config['SANDBOX_TIMEOUT']) for future in futures]
+
+    live = {}
+    generation = active_generation()
+    if generation:
+        live = {course_id: tuple(slot) for course_id, *slot in db.session.query(
+            Timetable.course_id, Timetable.day, Timetable.start_time, Timetable.classroom_id, Timetable.faculty_id
+        ).filter(Timetable.generation == generation, Timetable.course_id.isnot(None))}
+    names = dict(db.session.query(Course.id, Course.name).all())
+    reports = []
+    for scenario, result in zip(scenarios, results):
+        placements = result['placements']
+        changes = []
+        for course_id in live.keys() | placements.keys():
+            before, after = live.get(course_id), placements.get(course_id)
+            if before == after:
+                continue
+            status = 'added' if before is None else 'removed' if after is None else 'moved'
+            changes.append({'course_id': course_id, 'course': names.get(course_id), 'status': status,
+                            'before': before, 'after': after})
+        reports.append({'scenario': scenario, 'scheduled': len(placements),
+                        'unplaced': result['unplaced'],
+                        'changes': sorted(changes, key=lambda c: (c['status'], c['course'] or ''))})
+    return reports
+
+# --- Generation profiling ---
+PROFILE_MODES = ('cprofile', 'sample')
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+def profile_generation(scheduler, mode='cprofile'):
+    """Run scheduler.generate() under a profiler and store the profile next to its generation.
+
+    'cprofile' writes a pstats file (.prof) plus collapsed stacks (.collapsed) for flame graphs,
+    'sample' only runs the low-overhead stack sampler. Returns (generate() result, file names).
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+    import cProfile
+    profile_dir = app.config['PROFILE_DIR']
+    os.makedirs(profile_dir, exist_ok=True)
+
+    sampler = _StackSampler(threading.get_ident())
+    profiler = cProfile.Profile() if mode == 'cprofile' else None
+    sampler.start()
+    if profiler:
+        profiler.enable()
+    try:
+        result = scheduler.generate()
+    finally:
+        if profiler:
+            profiler.disable()
+        sampler.stop()
+
+    generation = scheduler.current_gen
+    stem = f"generation_{generation}" if generation else f"generation_failed_{datetime.now():%Y%m%d%H%M%S}"
+    files = []
+    if profiler:
+        profiler.dump_stats(os.path.join(profile_dir, stem + '.prof'))
+        files.append(stem + '.prof')
+    with open(os.path.join(profile_dir, stem + '.collapsed'), 'w') as f:
+        for stack, count in sorted(sampler.counts.items()):
+            f.write(f"{stack} {count}\n")
+    files.append(stem + '.collapsed')
+
+    _rotate_profiles(profile_dir, app.config['PROFILE_KEEP'])
+    return result, files
+
+def _rotate_profiles(profile_dir, keep):
+    """Delete all but the newest `keep` profiled runs (a run is all files sharing a stem)"""
+    runs = {}
+    for name in os.listdir(profile_dir):
+        stem, ext = os.path.splitext(name)
+        if ext in ('.prof', '.collapsed'):
+            mtime = os.path.getmtime(os.path.join(profile_dir, name))
+            runs[stem] = max(runs.get(stem, 0), mtime)
+    for stem in sorted(runs, key=runs.get, reverse=True)[keep:]:
+        for ext in ('.prof', '.collapsed'):
+            path = os.path.join(profile_dir, stem + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+def list_profiles():
+    """Stored profile files, newest first"""
+    profile_dir = app.config['PROFILE_DIR']
+    if not os.path.isdir(profile_dir):
+        return []
+    names = [n for n in os.listdir(profile_dir) if n.endswith(('.prof', '.collapsed'))]
+    return sorted(names, key=lambda n: os.path.getmtime(os.path.join(profile_dir, n)), reverse=True)
+
+# --- Headless commands ---
+# CLI counterparts of the generate, validate, fix and export pages for batch jobs. With --json
+# each prints one report with per-phase timings; they exit with status 1 when conflicts remain.
+
+def _partition_options(command):
+    """--term/--campus options that run the command inside that partition (default: DEFAULT_TERM/DEFAULT_CAMPUS)"""
+    @functools.wraps(command)
+    def scoped(*args, term, campus, **kwargs):
+        default = default_partition()
+        partition = Partition(term or default.term, campus or default.campus)
+        if not valid_partition(*partition):
+            raise click.BadParameter('letters, digits, dots, dashes and underscores only', param_hint='--term/--campus')
+        with partition_scope(partition):
+            return command(*args, **kwargs)
+    scoped = click.option('--campus', default=None, help='Campus of the partition to work in.')(scoped)
+    return click.option('--term', default=None, help='Term of the partition to work in.')(scoped)
+
+def _scope_options(command):
+    command = click.option('--semester', type=int, default=None, help='Only this semester.')(command)
+    return click.option('--department', default=None, help='Only this department (cse, ece, ...).')(command)
+
+def _in_scope(department, semester, scope):
+    return (not scope['department'] or department == scope['department']) and (
+        scope['semester'] is None or semester == scope['semester'])
+
+def _ms(since):
+    return round((perf_counter() - since) * 1000, 1)
+
+def _emit_report(report, as_json, lines):
+    if as_json:
+        click.echo(json.dumps(report, indent=2, default=str))
+    else:
+        for line in lines:
+            click.echo(line)
+    if report.get('exit_code'):
+        sys.exit(report['exit_code'])
+
+NO_SCHEDULABLE_COURSES = 'No courses with assigned faculty and classroom found.'
+
+def _carried_rows(groups_kept, course_ids):
+    """Active entries outside the regenerated groups, kept as they are by a scoped run"""
+    rows = db.session.query(
+        Timetable.course_id, Timetable.faculty_id, Timetable.classroom_id, Timetable.day,
+        Timetable.start_time, Timetable.end_time, Timetable.department, Timetable.semester
+    ).filter(Timetable.generation == (active_generation() or -1)).all()
+    return [r for r in rows if groups_kept(r.department, r.semester) and r.course_id not in course_ids
+            and r.day and r.start_time and r.end_time]
+
+def _scoped_conflicts(entries, scope):
+    """Conflicts involving at least one entry in scope (clashes across groups are still found)"""
+    ids = {tt.id for tt in entries if _in_scope(tt.department, tt.semester, scope)}
+    return [c for c in find_timetable_conflicts(entries)
+            if ids.intersection(c.get('timetable_ids') or [c.get('timetable_id')])], len(ids)
+
+def _run_scheduler(report, load, weights, dry_run, job_parts, profile_mode=None):
+    """Solve (dry run) or generate a new generation; fills in report and returns profile files.
+
+    `load()` returns the (courses, carried rows) to schedule. A real run calls it only once the
+    generation lock is held, so catalog edits and generations committed meanwhile are included.
+    """
+    started = perf_counter()
+    files, loaded = [], []
+    if dry_run:
+        courses, carried = load()
+        placements = ConflictFreeScheduler(courses, weights=weights, carried=carried).solve() if courses else []
+        placed = {course.id for course, *_ in placements}
+        report.update(success=bool(courses), message='Dry run: nothing was saved' if courses else NO_SCHEDULABLE_COURSES,
+                      generation=None)
+    else:
+        def run():
+            loaded[:] = load()
+            courses, carried = loaded
+            if not courses:
+                return False, NO_SCHEDULABLE_COURSES
+            scheduler = ConflictFreeScheduler(courses, weights=weights, carried=carried)
+            if profile_mode:
+                result, files[:] = profile_generation(scheduler, profile_mode)
+                return result
+            return scheduler.generate()
+
+        job = run_generation(generation_job_key(*job_parts, catalog_version(), profile_mode,
+                                                sorted(weights.items())), run)
+        success, message = describe_generation_run(job)
+        # A run shared with an identical request loaded nothing here
+        courses, carried = loaded or load()
+        generation = active_generation()
+        placed = {course_id for (course_id,) in db.session.query(Timetable.course_id).filter(
+            Timetable.generation == (generation or -1)).distinct()}
+        report.update(success=success, message=message, generation=generation,
+                      lock_wait_ms=job.lock_wait_ms, deduplicated=job.deduplicated)
+    report['courses'] = len(courses)
+    report['placed'] = sum(1 for c in courses if c.id in placed)
+    report['unplaced'] = [c.name for c in courses if c.id not in placed]
+    report['carried'] = len(carried)
+    report['timings_ms']['solve' if dry_run else 'generate'] = _ms(started)
+    return files
+
+def _generate_report(profile_mode, weights_from, department, semester, dry_run):
+    """Body of generate-timetable for the current partition: (report, output lines)"""
+    started = perf_counter()
+    scope = {'department': department, 'semester': semester}
+    report = {'command': 'generate', 'partition': current_partition()._asdict(), 'scope': scope,
+              'dry_run': dry_run, 'timings_ms': {}}
+    if weights_from is None:
+        weights = scoring_weights()
+    else:
+        record = db.session.get(TimetableGeneration, weights_from)
+        if record is None or not record.scoring:
+            raise click.ClickException(f'Generation {weights_from} has no stored scoring weights.')
+        weights = json.loads(record.scoring)
+    scoped = department or semester is not None
+
+    def load():
+        query = Course.query.order_by(Course.id)
+        if department:
+            query = query.filter(Course.department == department)
+        if semester is not None:
+            query = query.filter(Course.semester == semester)
+        courses = [c for c in query.all() if c.faculty_id and c.classroom_id]
+        carried = _carried_rows(lambda d, s: not _in_scope(d, s, scope), {c.id for c in courses}) if scoped else []
+        return courses, carried
+
+    files = _run_scheduler(report, load, weights, dry_run, ('generate', department, semester), profile_mode)
+    if not report['courses']:
+        return report, [report['message']]
+    lines = [f"Profile written: {os.path.join(app.config['PROFILE_DIR'], name)}" for name in files]
+    lines.append(report['message'])
+    if report['unplaced']:
+        lines.append(f"Unplaced courses: {', '.join(report['unplaced'])}")
+    if not dry_run and report['success']:
+        validate_started = perf_counter()
+        conflicts, _ = _scoped_conflicts(served_timetable_entries(), scope)
+        report['conflicts'] = len(conflicts)
+        report['timings_ms']['validate'] = _ms(validate_started)
+        if conflicts:
+            lines.append(f"{len(conflicts)} conflict(s) in the new timetable; run validate-timetable for details.")
+    report['timings_ms']['total'] = _ms(started)
+    report['exit_code'] = 1 if not report['success'] or report['unplaced'] or report.get('conflicts') else 0
+    return report, lines
+
+def _generate_partition(partition, options):
+    """One partition's generate-timetable run; the entry point of --all-partitions workers"""
+    with app.app_context(), partition_scope(partition):
+        return _generate_report(**options)
+
+@app.cli.command('generate-timetable')
+@click.option('--profile', 'profile_mode', type=click.Choice(PROFILE_MODES), default=None,
+              help='Profile the run and store the results in PROFILE_DIR.')
+@click.option('--weights-from', 'weights_from', type=int, default=None,
+              help='Score with the weights stored with this generation instead of the current policy.')
+@_partition_options
+@click.option('--all-partitions', is_flag=True, help='Generate every term and campus, in parallel (ignores --term/--campus).')
+@click.option('--jobs', type=int, default=None, help='Worker processes for --all-partitions (default: one per CPU).')
+@_scope_options
+@click.option('--dry-run', is_flag=True, help='Solve and report without saving a generation.')
+@click.option('--json', 'as_json', is_flag=True, help='Print a JSON report.')
+def generate_timetable_command(profile_mode, weights_from, all_partitions, jobs, department, semester, dry_run, as_json):
+    """Generate the timetable for all schedulable courses.
+
+    With --department/--semester only those courses are rescheduled; the rest of the active
+    timetable is carried over unchanged into the new generation. Partitions have separate
+    generation locks, so --all-partitions solves them in parallel worker processes.
+    """
+    if profile_mode and dry_run:
+        raise click.UsageError('--profile cannot be combined with --dry-run.')
+    options = {'profile_mode': profile_mode, 'weights_from': weights_from, 'department': department,
+               'semester': semester, 'dry_run': dry_run}
+    if not all_partitions:
+        report, lines = _generate_report(**options)
+        return _emit_report(report, as_json, lines)
+
+    if weights_from is not None:
+        raise click.UsageError('--weights-from names one generation and cannot be combined with --all-partitions.')
+    started = perf_counter()
+    partitions = known_partitions()
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(partitions)))
+    if workers == 1:
+        results = [_generate_partition(partition, options) for partition in partitions]
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(_generate_partition, partitions, [options] * len(partitions)))
+    reports = [report for report, _ in results]
+    lines = [f"[{report['partition']['term']} / {report['partition']['campus']}] {line}"
+             for report, partition_lines in results for line in partition_lines]
+    _emit_report({'command': 'generate', 'partitions': reports, 'workers': workers,
+                  'timings_ms': {'total': _ms(started)},
+                  'exit_code': max((report.get('exit_code', 0) for report in reports), default=0)}, as_json, lines)
+
+@app.cli.command('validate-timetable')
+@_partition_options
+@_scope_options
+@click.option('--json', 'as_json', is_flag=True, help='Print a JSON report.')
+def validate_timetable_command(department, semester, as_json):
+    """Check the served timetable for conflicts; exits with status 1 if there are any."""
+    started = perf_counter()
+    scope = {'department': department, 'semester': semester}
+    entries = served_timetable_entries()
+    loaded = perf_counter()
+    conflicts, checked = _scoped_conflicts(entries, scope)
+    report = {
+        'command': 'validate', 'partition': current_partition()._asdict(), 'scope': scope,
+        'generation': active_generation(), 'entries': checked,
+        'conflicts': conflicts,
+        'timings_ms': {'load': round((loaded - started) * 1000, 1), 'validate': _ms(loaded), 'total': _ms(started)},
+        'exit_code': 1 if conflicts else 0,
+    }
+    lines = [f"{c['severity'].upper()}: {c['type']}: {c['description']}" for c in conflicts]
+    lines.append(f"{len(conflicts)} conflict(s) in {checked} entries.")
+    _emit_report(report, as_json, lines)
+
+@app.cli.command('fix-conflicts')
+@_partition_options
+@_scope_options
+@click.option('--dry-run', is_flag=True, help='Solve and report without saving a generation.')
+@click.option('--json', 'as_json', is_flag=True, help='Print a JSON report.')
+def fix_conflicts_command(department, semester, dry_run, as_json):
+    """Reschedule the groups involved in conflicts, keeping the rest of the timetable.
+
+    Exits with status 1 if conflicts remain afterwards.
+    """
+    started = perf_counter()
+    scope = {'department': department, 'semester': semester}
+    report = {'command': 'fix', 'partition': current_partition()._asdict(), 'scope': scope, 'dry_run': dry_run,
+              'timings_ms': {}}
+    entries = served_timetable_entries()
+    conflicts, _ = _scoped_conflicts(entries, scope)
+    report['conflicts_before'] = len(conflicts)
+    report['timings_ms']['validate'] = _ms(started)
+    if not conflicts:
+        report.update(success=True, message='No conflicts to fix.', groups=[], conflicts=0, exit_code=0)
+        report['timings_ms']['total'] = _ms(started)
+        return _emit_report(report, as_json, [report['message']])
+
+    conflict_ids = {i for c in conflicts for i in (c.get('timetable_ids') or [c.get('timetable_id')])}
+    groups = sorted({(tt.department, tt.semester) for tt in entries if tt.id in conflict_ids})
+    report['groups'] = [{'department': d, 'semester': s} for d, s in groups]
+
+    def load():
+        courses = []
+        for dept, sem in groups:
+            courses.extend(c for c in Course.query.filter_by(department=dept, semester=sem).order_by(Course.id)
+                           if c.faculty_id and c.classroom_id)
+        return courses, _carried_rows(lambda d, s: (d, s) not in groups, {c.id for c in courses})
+
+    _run_scheduler(report, load, scoring_weights(), dry_run, ('fix', groups))
+    lines = [report['message'], f"Rescheduled groups: {', '.join(f'{d.upper()} Semester {s}' for d, s in groups)}"]
+    if report['unplaced']:
+        lines.append(f"Unplaced courses: {', '.join(report['unplaced'])}")
+    if not dry_run:
+        validate_started = perf_counter()
+        remaining, _ = _scoped_conflicts(served_timetable_entries(), scope)
+        report['conflicts'] = len(remaining)
+        report['timings_ms']['revalidate'] = _ms(validate_started)
+        lines.append(f"{len(remaining)} conflict(s) remain.")
+    report['timings_ms']['total'] = _ms(started)
+    report['exit_code'] = 1 if not report['success'] or report['unplaced'] or report.get('conflicts') else 0
+    _emit_report(report, as_json, lines)
+
+@app.cli.command('export-timetable')
+@click.option('--format', 'formats', type=click.Choice(('pdf', 'docx')), multiple=True,
+              help='Formats to write (repeatable; default both).')
+@_partition_options
+@_scope_options
+@click.option('--output-dir', type=click.Path(file_okay=False), default='.', show_default=True)
+@click.option('--dry-run', is_flag=True, help='Report the files without writing them.')
+@click.option('--json', 'as_json', is_flag=True, help='Print a JSON report.')
+def export_timetable_command(formats, department, semester, output_dir, dry_run, as_json):
+    """Write the served timetable as PDF and/or DOCX files."""
+    started = perf_counter()
+    scope = {'department': department, 'semester': semester}
+    entries = [tt for tt in served_timetable_entries() if _in_scope(tt.department, tt.semester, scope)]
+    title = f"Timetable - {department.upper() if department else 'All'} Semester {semester if semester is not None else 'All'}"
+    stem = '_'.join(['timetable'] + ([department] if department else []) + ([str(semester)] if semester is not None else []))
+    report = {'command': 'export', 'partition': current_partition()._asdict(), 'scope': scope, 'dry_run': dry_run, 'generation': active_generation(),
+              'entries': len(entries), 'files': [], 'timings_ms': {'load': _ms(started)}}
+    if not dry_run:
+        os.makedirs(output_dir, exist_ok=True)
+    for fmt in formats or ('pdf', 'docx'):
+        path = os.path.join(output_dir, f'{stem}.{fmt}')
+        written = perf_counter()
+        if not dry_run:
+            with open(path, 'wb') as out:
+                if fmt == 'pdf':
+                    write_timetable_pdf(entries, title, out)
+                else:
+                    write_timetable_docx(served_timetable_rows(department, semester)[1], title, out)
+        report['files'].append({'format': fmt, 'path': path, 'bytes': None if dry_run else os.path.getsize(path),
+                                'ms': _ms(written)})
+    report['timings_ms']['total'] = _ms(started)
+    _emit_report(report, as_json, [f"{'Would write' if dry_run else 'Wrote'} {f['path']}" for f in report['files']])
+
+# --- Bulk import ---
+IMPORT_KINDS = ('courses', 'faculty', 'classrooms', 'enrollments')
+IMPORT_FORMATS = ('csv', 'json', 'jsonl')
+_JSON_WHITESPACE = re.compile(r'\s*')
+
+def _iter_json_array(text, chunk_size=1 << 16):
+    """Yield the elements of a top-level JSON array read incrementally from a text stream"""
+    decoder = json.JSONDecoder()
+    # expect: '[' before the array, 'first' after it opens, 'item' after a comma, ',' after an item
+    buf, pos, eof, expect = '', 0, False, '['
+    while True:
+        pos = _JSON_WHITESPACE.match(buf, pos).end()
+        if pos < len(buf):
+            char = buf[pos]
+            if expect == '[':
+                if char != '[':
+                    raise ValueError('Expected a JSON array of objects')
+                expect, pos = 'first', pos + 1
+                continue
+            if expect == ',':
+                if char not in ',]':
+                    raise ValueError(f"Expected ',' or ']' between array elements, got '{char}'")
+                if char == ']':
+                    return
+                expect, pos = 'item', pos + 1
+                continue
+            if char == ']' and expect == 'first':
+                return
+            if char in ',]':
+                raise ValueError(f"Expected a JSON object, got '{char}'")
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield obj
+                expect, pos = ',', end
+                continue
+        elif eof:
+            raise ValueError('Unexpected end of JSON array')
+        chunk = text.read(chunk_size)
+        buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+
+def iter_import_rows(stream, fmt):
+    """Yield row dicts from a binary CSV, JSON array or JSON-lines stream without loading it whole"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        import csv
+        yield from csv.DictReader(text)
+    elif fmt == 'jsonl':
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from _iter_json_array(text)
+
+def _import_format(filename, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    return 'jsonl' if ext == 'ndjson' else ext if ext in IMPORT_FORMATS else 'csv'
+
+def _form_errors(form):
+    return [f"{name}: {msg}" for name, msgs in form.errors.items() for msg in msgs]
+
+def _validate_form_row(form_cls, row, **choices):
+    """Validate a row with the same form the single-item page uses; returns (form, errors)"""
+    # Blank cells are left out so the form's defaults (duration, max_load) apply
+    formdata = MultiDict({k: str(v).strip() for k, v in row.items() if k and v is not None and str(v).strip()})
+    form = form_cls(formdata=formdata, meta={'csrf': False})
+    for field_name, field_choices in choices.items():
+        getattr(form, field_name).choices = field_choices
+    form.validate()
+    return form, _form_errors(form)
+
+def _name_lookup(rows):
+    """Map name -> id for (id, name) rows; names used more than once map to None"""
+    lookup = {}
+    for id_, name in rows:
+        lookup[name] = None if name in lookup else id_
+    return lookup
+
+def _resolve_ref(row, label, id_key, name_key, ids, by_name):
+    """Resolve a reference given either as `<id_key>` or as a unique `<name_key>`"""
+    raw_id = str(row.get(id_key) or '').strip()
+    if raw_id:
+        if raw_id.isdigit() and int(raw_id) in ids:
+            return int(raw_id), None
+        return None, f"Unknown {label} id '{raw_id}'"
+    name = str(row.get(name_key) or '').strip()
+    if not name:
+        return None, f"{label.capitalize()} is required"
+    if name not in by_name:
+        return None, f"Unknown {label} '{name}'"
+    if by_name[name] is None:
+        return None, f"{label.capitalize()} name '{name}' is ambiguous, use {id_key}"
+    return by_name[name], None
+
+class BulkImporter:
+    """Validates rows in batches and inserts them with bulk statements, one transaction per batch.
+
+    Reference columns (faculty, classroom, user, course) are resolved through lookup maps
+    loaded once per import instead of one query per row.
+    """
+
+    def __init__(self, kind, batch_size=None, dry_run=False):
+        if kind not in IMPORT_KINDS:
+            raise ValueError(f"Unknown import kind: {kind}")
+        self.kind = kind
+        self.batch_size = batch_size or app.config['IMPORT_BATCH_SIZE']
+        self.dry_run = dry_run
+        self.rows = 0
+        self.valid = 0
+        self.inserted = 0
+        self.errors = []  # (row number, [messages])
+        self._load_lookups()
+
+    def _load_lookups(self):
+        if self.kind == 'courses':
+            faculty_rows = db.session.query(Faculty.id, Faculty.name).all()
+            classroom_rows = db.session.query(Classroom.id, Classroom.name).all()
+            self.faculty_ids = {id_ for id_, _ in faculty_rows}
+            self.faculty_by_name = _name_lookup(faculty_rows)
+            self.classroom_ids = {id_ for id_, _ in classroom_rows}
+            self.classroom_by_name = _name_lookup(classroom_rows)
+        elif self.kind == 'enrollments':
+            users = db.session.query(User.id, User.email, User.role).all()
+            self.student_ids = {id_ for id_, _, role in users if role == 'student'}
+            self.user_ids = {id_ for id_, _, _ in users}
+            self.user_by_email = {email.lower(): id_ for id_, email, _ in users}
+            course_rows = db.session.query(Course.id, Course.name).all()
+            self.course_ids = {id_ for id_, _ in course_rows}
+            self.course_by_name = _name_lookup(course_rows)
+            self.existing_enrollments = set(db.session.query(enrollments.c.user_id, enrollments.c.course_id).all())
+
+    def run(self, rows):
+        batch = []
+        for number, row in enumerate(rows, start=1):
+            self.rows = number
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        return self
+
+    def _flush(self, batch):
+        values = []
+        for number, row in batch:
+            if not isinstance(row, dict):
+                self.errors.append((number, ['Row must be an object']))
+                continue
+            value, errors = getattr(self, f'_validate_{self.kind}')(row)
+            if errors:
+                self.errors.append((number, errors))
+            elif value is not None:
+                values.append(value)
+        self.valid += len(values)
+        if not values or self.dry_run:
+            return
+        try:
+            if self.kind == 'enrollments':
+                db.session.execute(enrollments.insert(), values)
+            else:
+                model = {'courses': Course, 'faculty': Faculty, 'classrooms': Classroom}[self.kind]
+                db.session.execute(db.insert(model), values)
+            db.session.commit()
+            self.inserted += len(values)
+        except Exception as e:
+            db.session.rollback()
+            first, last = batch[0][0], batch[-1][0]
+            self.errors.append((first, [f"Batch of rows {first}-{last} failed: {e}"]))
+
+    def _validate_courses(self, row):
+        errors = []
+        faculty_id, error = _resolve_ref(row, 'faculty', 'faculty_id', 'faculty', self.faculty_ids, self.faculty_by_name)
+        if error:
+            errors.append(error)
+        classroom_id, error = _resolve_ref(row, 'classroom', 'classroom_id', 'classroom', self.classroom_ids, self.classroom_by_name)
+        if error:
+            errors.append(error)
+        if errors:
+            return None, errors
+        row = dict(row, faculty_id=faculty_id, classroom_id=classroom_id)
+        form, errors = _validate_form_row(CourseForm, row, faculty_id=[(faculty_id, '')], classroom_id=[(classroom_id, '')])
+        if errors:
+            return None, errors
+        return dict(name=form.name.data, faculty_id=faculty_id, classroom_id=classroom_id, duration=form.duration.data,
+                    department=form.department.data, year=form.year.data, semester=form.semester.data), []
+
+    def _validate_faculty(self, row):
+        form, errors = _validate_form_row(FacultyForm, row)
+        if errors:
+            return None, errors
+        return dict(name=form.name.data, availability=form.availability.data, max_load=form.max_load.data,
+                    department=form.department.data, year=form.year.data, semester=form.semester.data), []
+
+    def _validate_classrooms(self, row):
+        form, errors = _validate_form_row(ClassroomForm, row)
+        if errors:
+            return None, errors
+        return dict(name=form.name.data, capacity=form.capacity.data, type=form.type.data), []
+
+    def _validate_enrollments(self, row):
+        errors = []
+        raw_user = str(row.get('user_id') or '').strip()
+        email = str(row.get('email') or '').strip().lower()
+        if raw_user:
+            user_id = int(raw_user) if raw_user.isdigit() and int(raw_user) in self.user_ids else None
+            if user_id is None:
+                errors.append(f"Unknown user id '{raw_user}'")
+        elif email:
+            user_id = self.user_by_email.get(email)
+            if user_id is None:
+                errors.append(f"Unknown user '{email}'")
+        else:
+            user_id = None
+            errors.append('Email or user_id is required')
+        if user_id is not None and user_id not in self.student_ids:
+            errors.append('Only students can be enrolled in courses')
+        course_id, error = _resolve_ref(row, 'course', 'course_id', 'course', self.course_ids, self.course_by_name)
+        if error:
+            errors.append(error)
+        if errors:
+            return None, errors
+        if (user_id, course_id) in self.existing_enrollments:
+            return None, []  # already enrolled, nothing to do
+        self.existing_enrollments.add((user_id, course_id))
+        return dict(user_id=user_id, course_id=course_id), []
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(IMPORT_KINDS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@_partition_options
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None, help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (IMPORT_BATCH_SIZE).')
+@click.option('--dry-run', is_flag=True, help='Validate only, insert nothing.')
+def import_data_command(kind, path, fmt, batch_size, dry_run):
+    """Bulk import courses, faculty, classrooms or enrollments from CSV/JSON."""
+    start = datetime.now()
+    with open(path, 'rb') as f:
+        importer = BulkImporter(kind, batch_size=batch_size, dry_run=dry_run)
+        try:
+            importer.run(iter_import_rows(f, _import_format(path, fmt)))
+        except ValueError as e:
+            importer.errors.append((importer.rows + 1, [f"Unreadable input: {e}"]))
+    for number, messages in importer.errors:
+        click.echo(f"row {number}: {'; '.join(messages)}", err=True)
+    elapsed = (datetime.now() - start).total_seconds()
+    click.echo(f"{importer.rows} rows read, {importer.valid} valid, {importer.inserted} inserted, "
+               f"{len(importer.errors)} rejected in {elapsed:.2f}s")
+    if importer.errors:
+        sys.exit(1)
+
+# --- Read API helpers ---
+API_FIELDS = ('id', 'course_id', 'course', 'faculty_id', 'faculty', 'classroom_id', 'classroom',
+              'day', 'start_time', 'end_time', 'department', 'semester', 'generation')
+
+def timetable_etag(*scope):
+    """Strong ETag for a view of the timetable: version plus whatever scopes the view"""
+    digest = hashlib.sha1(repr((served_timetable_version(), tuple(current_partition())) + scope).encode()).hexdigest()[:20]
+    return f"tt-{digest}"
+
+def enrolled_course_ids(user_id):
+    """Sorted ids of the courses a user is enrolled in, for ETags of student-scoped views"""
+    return tuple(db.session.scalars(db.select(enrollments.c.course_id).where(
+        enrollments.c.user_id == user_id).order_by(enrollments.c.course_id)))
+
+def page_etag(user, *scope):
+    """ETag of a timetable page rendered for `user`, or None when it has to be rendered anyway
+    because flashed messages are waiting. Besides the timetable, the catalog and `scope` it covers
+    who the page is for and the CSRF token the page embeds: the session's CSRF secret and a window
+    of half WTF_CSRF_TIME_LIMIT, so a page revalidated from the browser cache posts a valid token."""
+    if user is None or session.get('_flashes'):
+        return None
+    generate_csrf()
+    limit = app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    window = int(datetime.now().timestamp() // (limit / 2)) if limit else 0
+    scope += (user.id, session.get('user_role'), session.get('user_name'), user.department, user.year, user.semester)
+    if session.get('user_role') == 'student':
+        scope += (enrolled_course_ids(user.id),)
+    return timetable_etag('page', request.path, catalog_version(), session.get('csrf_token'), window, *scope)
+
+def page_not_modified(etag):
+    """304 for a conditional request that already has the page tagged `etag`, else None"""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+def render_page(etag, template, **context):
+    """render_template() with the page's ETag; browsers keep the page but revalidate every use"""
+    response = app.make_response(render_template(template, **context))
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def timetable_rows(generation, department=None, semester=None, faculty_id=None, classroom_id=None, student_id=None):
+    """Timetable entries of one generation as plain tuples, names joined in the same query"""
+    query = db.session.query(
+        Timetable.id, Timetable.course_id, Course.name, Timetable.faculty_id, Faculty.name,
+        Timetable.classroom_id, Classroom.name, Timetable.day, Timetable.start_time, Timetable.end_time,
+        Timetable.department, Timetable.semester, Timetable.generation
+    ).outerjoin(Course, Timetable.course_id == Course.id) \
+     .outerjoin(Faculty, Timetable.faculty_id == Faculty.id) \
+     .outerjoin(Classroom, Timetable.classroom_id == Classroom.id) \
+     .filter(Timetable.generation == generation)
+    if department:
+        query = query.filter(Timetable.department == department)
+    if semester is not None:
+        query = query.filter(Timetable.semester == semester)
+    if faculty_id is not None:
+        query = query.filter(Timetable.faculty_id == faculty_id)
+    if classroom_id is not None:
+        query = query.filter(Timetable.classroom_id == classroom_id)
+    if student_id is not None:
+        enrolled = db.select(enrollments.c.course_id).where(enrollments.c.user_id == student_id)
+        query = query.filter(Timetable.course_id.in_(enrolled))
+    rows = query.all()
+    rows.sort(key=_row_order)
+    return rows
+
+def _row_order(row):
+    return (DAY_ORDER.index(row[7]) if row[7] in DAY_ORDER else 7, row[8] or time.min)
+
+# --- Timetable snapshot ---
+# File layout (little-endian): header, version string, catalog version string, fixed-size entry
+# records sorted by id, string table (offsets into a UTF-8 blob). Ids are -1, days 255 and times
+# 0xFFFF when missing. An empty version marks a database with no active-generation pointer.
+_SNAPSHOT_MAGIC = b'TTSNAP02'
+_SNAPSHOT_HEADER = struct.Struct('<8s5I')  # magic, version and catalog lengths, entries, strings, generation
+# id, course, faculty, classroom, generation, day index, start/end minutes, department (string),
+# semester, course/faculty/classroom names (strings)
+_SNAPSHOT_RECORD = struct.Struct('<5i3H5i')
+_SNAPSHOT_OFFSET = struct.Struct('<2I')
+
+NamedRef = namedtuple('NamedRef', 'id name')
+
+class SnapshotEntry(namedtuple('SnapshotEntry', 'id course_id faculty_id classroom_id day start_time end_time '
+                                                'department semester generation course faculty_obj classroom_obj')):
+    """A Timetable entry read from the snapshot, with the attributes templates and the validator use"""
+    __slots__ = ()
+
+    def row(self):
+        """The entry in timetable_rows() shape"""
+        name = lambda ref: ref.name if ref else None
+        return (self.id, self.course_id, name(self.course), self.faculty_id, name(self.faculty_obj),
+                self.classroom_id, name(self.classroom_obj), self.day, self.start_time, self.end_time,
+                self.department, self.semester, self.generation)
+
+def _read_snapshot_header(buffer, path):
+    """(version, catalog version, entries, strings, generation, records offset) of a snapshot"""
+    magic, version_len, catalog_len, count, strings, generation = _SNAPSHOT_HEADER.unpack_from(buffer)
+    if magic != _SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a timetable snapshot")
+    pos = _SNAPSHOT_HEADER.size
+    version = bytes(buffer[pos:pos + version_len]).decode()
+    catalog = bytes(buffer[pos + version_len:pos + version_len + catalog_len]).decode()
+    return version, catalog, count, strings, generation, pos + version_len + catalog_len
+
+class TimetableSnapshot:
+    """Read-only memory map of a snapshot file.
+
+    The pages live in the OS page cache and are shared by every worker mapping the same file;
+    entries are decoded per read, so no worker keeps its own copy of the timetable. Filters are
+    applied to the raw records, so only matching entries are decoded.
+    """
+
+    def __init__(self, path):
+        import mmap
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.version, self.catalog, self.count, self.strings, generation, self._records_at = \
+            _read_snapshot_header(self._map, path)
+        self.generation = generation or None
+        self._offsets_at = self._records_at + self.count * _SNAPSHOT_RECORD.size
+        self._blob_at = self._offsets_at + self.strings * _SNAPSHOT_OFFSET.size
+        self._string_index = None
+
+    @property
+    def has_pointer(self):
+        return bool(self.version)
+
+    def is_current(self, stat):
+        return (self.stat.st_ino, self.stat.st_mtime_ns, self.stat.st_size) == (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def string(self, index):
+        if index < 0:
+            return None
+        start, end = _SNAPSHOT_OFFSET.unpack_from(self._map, self._offsets_at + index * _SNAPSHOT_OFFSET.size)
+        return self._map[self._blob_at + start:self._blob_at + end].decode()
+
+    def string_index(self, value):
+        """Index of a string in the string table, or None; the table is read once per map"""
+        if self._string_index is None:
+            self._string_index = {self.string(i): i for i in range(self.strings)}
+        return self._string_index.get(value)
+
+    def _records(self):
+        return _SNAPSHOT_RECORD.iter_unpack(memoryview(self._map)[self._records_at:self._offsets_at])
+
+    def _decode(self, records):
+        """SnapshotEntry per raw record; strings shared between entries are decoded once per call"""
+        strings = {}
+
+        def text(index):
+            if index not in strings:
+                strings[index] = self.string(index)
+            return strings[index]
+
+        def clock(minutes):
+            return None if minutes == 0xFFFF else time(minutes // 60, minutes % 60)
+
+        def ref(id_, index):
+            return NamedRef(id_, text(index)) if index >= 0 else None
+
+        for (id_, course_id, faculty_id, classroom_id, generation, day, start, end,
+             department, semester, course, faculty, classroom) in records:
+            course_id, faculty_id, classroom_id = (None if i < 0 else i for i in (course_id, faculty_id, classroom_id))
+            yield SnapshotEntry(
+                id_, course_id, faculty_id, classroom_id, DAY_ORDER[day] if day < len(DAY_ORDER) else None,
+                clock(start), clock(end), text(department), None if semester < 0 else semester, generation,
+                ref(course_id, course), ref(faculty_id, faculty), ref(classroom_id, classroom))
+
+    def entries(self):
+        """Entries in id order"""
+        return self._decode(self._records())
+
+    def rows(self, department=None, semester=None, faculty_id=None, classroom_id=None, course_ids=None):
+        """timetable_rows() over the snapshot; course_ids stands in for the student filter"""
+        department_index = None
+        if department:
+            department_index = self.string_index(department)
+            if department_index is None:
+                return []
+        # Compare the fixed-width integer fields of each record; strings are only decoded for matches
+        matches = [r for r in self._records()
+                   if (department_index is None or r[8] == department_index)
+                   and (semester is None or r[9] == semester)
+                   and (faculty_id is None or r[2] == faculty_id)
+                   and (classroom_id is None or r[3] == classroom_id)
+                   and (course_ids is None or r[1] in course_ids)]
+        rows = [e.row() for e in self._decode(matches)]
+        rows.sort(key=_row_order)
+        return rows
+
+def _pack_snapshot(version, catalog, generation, rows):
+    strings, blob, offsets = {}, bytearray(), [0]
+
+    def intern(value):
+        if value is None:
+            return -1
+        if value not in strings:
+            strings[value] = len(strings)
+            blob.extend(value.encode())
+            offsets.append(len(blob))
+        return strings[value]
+
+    def minutes(value):
+        return 0xFFFF if value is None else value.hour * 60 + value.minute
+
+    def ident(value):
+        return -1 if value is None else value
+
+    records = bytearray()
+    for (id_, course_id, course, faculty_id, faculty, classroom_id, classroom, day, start, end,
+         department, semester, row_generation) in rows:
+        records += _SNAPSHOT_RECORD.pack(
+            id_, ident(course_id), ident(faculty_id), ident(classroom_id), ident(row_generation),
+            DAY_ORDER.index(day) if day in DAY_ORDER else 255, minutes(start), minutes(end),
+            intern(department), ident(semester), intern(course), intern(faculty), intern(classroom))
+    version, catalog = version.encode(), catalog.encode()
+    header = _SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, len(version), len(catalog), len(rows), len(strings), generation or 0)
+    # The offsets table has one more entry than there are strings: string i is blob[off[i]:off[i+1]]
+    table = b''.join(_SNAPSHOT_OFFSET.pack(offsets[i], offsets[i + 1]) for i in range(len(strings)))
+    return b''.join((header, version, catalog, records, table, blob))
+
+def timetable_snapshot_path(partition=None):
+    """Snapshot file of a partition: TIMETABLE_SNAPSHOT itself for the default one, a sibling
+    file per other partition. None when snapshots are off."""
+    path = app.config['TIMETABLE_SNAPSHOT']
+    partition = partition or current_partition()
+    if not path or partition == default_partition():
+        return path
+    return f"{path}.{partition_digest(partition)}"
+
+def _snapshot_source(path):
+    """(version, catalog version) the snapshot file at `path` was built from, or None"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(_SNAPSHOT_HEADER.size + 512)
+        return _read_snapshot_header(head, path)[:2]
+    except (OSError, ValueError, struct.error):
+        return None
+
+def write_timetable_snapshot(path=None):
+    """Write the served timetable to the snapshot file, replacing the previous one atomically.
+
+    Reads through its own connection so it can run from an after_commit hook. Writers are
+    serialized with a lock file, so the last one to finish always wrote the newest committed
+    state. The file is only rebuilt when the active generation, its revision or the partition's
+    catalog version (names are stored in the file) differ from what it was built from. Without
+    an active-generation pointer an empty marker file is written, so readers don't query for
+    one on every request. Returns the snapshot version, '' for the marker.
+    """
+    path = path or timetable_snapshot_path()
+    with open(path + '.lock', 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        with db.engine.connect() as conn:
+            state = dict(conn.execute(db.select(AppState.key, AppState.value).where(AppState.key.in_(
+                [partition_key(ACTIVE_GENERATION_KEY), partition_key(CATALOG_VERSION_KEY)]))).all())
+            pointer = state.get(partition_key(ACTIVE_GENERATION_KEY))
+            catalog = state.get(partition_key(CATALOG_VERSION_KEY)) or ''
+            generation, rows, version = None, [], ''
+            if pointer is not None:
+                # Databases from before history tracking are served straight from the tables
+                generation = int(pointer) or None
+                revision = conn.execute(db.select(TimetableGeneration.revision)
+                                        .where(TimetableGeneration.generation == generation)).scalar()
+                version = f"{pointer}.{revision or 0}"  # same token as timetable_version()
+            else:
+                catalog = ''
+            if _snapshot_source(path) == (version, catalog):
+                return version
+            if pointer is not None:
+                rows = conn.execute(db.select(
+                    Timetable.id, Timetable.course_id, Course.name, Timetable.faculty_id, Faculty.name,
+                    Timetable.classroom_id, Classroom.name, Timetable.day, Timetable.start_time, Timetable.end_time,
+                    Timetable.department, Timetable.semester, Timetable.generation
+                ).select_from(Timetable)
+                 .outerjoin(Course, Timetable.course_id == Course.id)
+                 .outerjoin(Faculty, Timetable.faculty_id == Faculty.id)
+                 .outerjoin(Classroom, Timetable.classroom_id == Classroom.id)
+                 .where(Timetable.generation == (generation or -1))
+                 .order_by(Timetable.id)).all()
+        import tempfile
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_pack_snapshot(version, catalog, generation, rows))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return version
+
+_snapshots = {}  # path -> TimetableSnapshot
+_snapshot_lock = threading.Lock()
+
+def timetable_snapshot():
+    """The current partition's snapshot, remapped when another process replaced the file.
+
+    None when TIMETABLE_SNAPSHOT is unset, there is no active-generation pointer or no snapshot
+    can be built; callers then read the database. A missing or unreadable file is rebuilt.
+    """
+    path = timetable_snapshot_path()
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        stat = None
+    snapshot = _snapshots.get(path)
+    if snapshot is None or stat is None or not snapshot.is_current(stat):
+        with _snapshot_lock:
+            snapshot = _snapshots.get(path)
+            if snapshot is None or stat is None or not snapshot.is_current(stat):
+                # The old map is left to the garbage collector: in-flight reads may still hold views of it
+                snapshot = _snapshots[path] = _map_snapshot(path, stat)
+    return snapshot if snapshot and snapshot.has_pointer else None
+
+def _map_snapshot(path, stat):
+    """Map the snapshot file, (re)building it first when it is missing or in an older format"""
+    try:
+        if stat is not None:
+            try:
+                return TimetableSnapshot(path)
+            except ValueError:
+                pass
+        write_timetable_snapshot(path)
+        return TimetableSnapshot(path)
+    except Exception:
+        app.logger.exception("Could not build the timetable snapshot")
+        return None
+
+def served_timetable_version():
+    snapshot = timetable_snapshot()
+    return snapshot.version if snapshot else timetable_version()
+
+def served_timetable_entries():
+    """The active generation's entries for the dashboard, generation page and validator"""
+    snapshot = timetable_snapshot()
+    if snapshot:
+        return list(snapshot.entries())
+    return active_timetables().options(
+        db.joinedload(Timetable.course),
+        db.joinedload(Timetable.faculty_obj),
+        db.joinedload(Timetable.classroom_obj)
+    ).all()
+
+def served_timetable_rows(department=None, semester=None, faculty_id=None, classroom_id=None, student_id=None):
+    """(generation, timetable_rows()) of the served generation"""
+    snapshot = timetable_snapshot()
+    if snapshot is None:
+        generation = active_generation()
+        rows = timetable_rows(generation, department, semester, faculty_id, classroom_id, student_id) if generation else []
+        return generation, rows
+    course_ids = None
+    if student_id is not None:
+        course_ids = {c for (c,) in db.session.query(enrollments.c.course_id).filter(enrollments.c.user_id == student_id)}
+    return snapshot.generation, snapshot.rows(department, semester, faculty_id, classroom_id, course_ids)
+
+def refresh_timetable_snapshot():
+    """Rewrite the snapshot after a commit; on failure readers fall back to the database and
+    rebuild the file on their next read"""
+    try:
+        write_timetable_snapshot()
+    except Exception:
+        app.logger.exception("Could not refresh the timetable snapshot")
+        try:
+            os.unlink(timetable_snapshot_path())
+        except FileNotFoundError:
+            pass
+
+# --- Live change notifications ---
+# Commits touching the served timetable are tracked per session; after they commit the snapshot
+# is refreshed and the event watchers (here and, through NOTIFY, in other processes) wake up
+_TIMETABLE_MODELS = (Timetable, TimetableGeneration) + _CATALOG_MODELS
+TIMETABLE_CHANNEL = 'timetable_changed'
 
+def _timetable_affected(obj):
+    return isinstance(obj, _TIMETABLE_MODELS) or (
+        isinstance(obj, AppState) and obj.key.split(':', 1)[0] == ACTIVE_GENERATION_KEY)
 
+@event.listens_for(db.session, 'before_flush')
+def _timetable_flush(session, flush_context, instances):
+    if any(_timetable_affected(obj) for obj in session.new | session.deleted) or any(
+            _timetable_affected(obj) and session.is_modified(obj) for obj in session.dirty):
+        session.info['timetable_changed'] = True
 
-    def generate(self):
-        """Generate optimized timetable across all departments with greedy scoring"""
-        # Delete all old timetables for global regeneration
-        Timetable.query.delete()
-        db.session.commit()
+@event.listens_for(db.session, 'do_orm_execute')
+def _timetable_bulk_write(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    # Enrollments have no mapper; their writes change student-filtered views and enrollment conflicts
+    if getattr(orm_execute_state.statement, 'table', None) is enrollments or any(
+            mapper.class_ in _TIMETABLE_MODELS for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info['timetable_changed'] = True
 
-        all_courses = self.courses
-        all_faculties = self.faculties
-        all_classrooms = self.classrooms
-        all_slots = sorted(self.time_slots, key=lambda s: (s[0], s[1]))
+@event.listens_for(db.session, 'after_commit')
+def _timetable_after_commit(session):
+    if not session.info.pop('timetable_changed', False):
+        return
+    if app.config['TIMETABLE_SNAPSHOT']:
+        refresh_timetable_snapshot()
+    if _use_listen_notify():
+        try:
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql(f"NOTIFY {TIMETABLE_CHANNEL}")
+                conn.commit()
+        except Exception:
+            app.logger.exception("Could not notify other processes of a timetable change")
+    timetable_events.changed()
 
-        timetable = []
-        faculty_schedule = {f.id: {d: [] for d in self.days} for f in all_faculties.values()}
-        classroom_schedule = {c.id: {d: [] for d in self.days} for c in all_classrooms.values()}
-        dept_sem_schedule = {}
+@event.listens_for(db.session, 'after_rollback')
+def _timetable_rollback(session):
+    session.info.pop('timetable_changed', None)
 
-        def available(course, faculty, classroom, day, slot):
-            # Check if faculty is available on this day
-            if day not in self.faculty_days[faculty.id]:
-                return False
-            # For multi-hour courses, check consecutive slots
-            duration = course.duration
-            if duration > 1:
-                slots_needed = []
-                for i in range(duration):
-                    next_slot = (datetime.combine(datetime.today(), slot) + timedelta(hours=i)).time()
-                    if next_slot not in self.slots:
-                        return False
-                    slots_needed.append(next_slot)
-                # Check all consecutive slots for conflicts
-                for s in slots_needed:
-                    if s in faculty_schedule[faculty.id][day]:
-                        return False
-                    if s in classroom_schedule[classroom.id][day]:
-                        return False
-                    if (course.department, course.semester) in dept_sem_schedule:
-                        if s in dept_sem_schedule[(course.department, course.semester)][day]:
-                            return False
-            else:
-                # Single hour course
-                if slot in faculty_schedule[faculty.id][day]:
-                    return False
-                if slot in classroom_schedule[classroom.id][day]:
-                    return False
-                if (course.department, course.semester) in dept_sem_schedule:
-                    if slot in dept_sem_schedule[(course.department, course.semester)][day]:
-                        return False
-            return True
+def _use_listen_notify():
+    # Transaction poolers (DB_POOL_MODE=external) can't hold a LISTEN session; those poll instead
+    return app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql+psycopg2') and db_pool_mode() != 'external'
 
-        # Try to fill each day compactly per dept-semester
-        for course in all_courses:
-            best_option = None
-            best_score = -1e9
-
-            for slot_info in all_slots:
-                day = slot_info[0]
-                slot = slot_info[1]
-                for classroom in all_classrooms.values():
-                    faculty = course.faculty
-                    if not faculty:
-                        continue
-
-                    if not available(course, faculty, classroom, day, slot):
-                        continue
-
-                    # --- Scoring: Compact & Balanced ---
-                    score = 0
-
-                    # Compact with other same dept-sem classes that day
-                    dept_slots = dept_sem_schedule.get((course.department, course.semester), {}).get(day, [])
-                    if dept_slots:
-                        # Prefer adjacent slots
-                        if any(abs(slot.hour - s.hour) == 1 for s in dept_slots):
-                            score += 2000
-                        else:
-                            score -= 100
-                    else:
-                        score += 300
-
-                    # Faculty idle time minimization
-                    fac_slots = faculty_schedule[faculty.id][day]
-                    if fac_slots:
-                        if any(abs(slot.hour - s.hour) == 1 for s in fac_slots):
-                            score += 1200
-                        else:
-                            score -= 200
-                    else:
-                        score += 500
-
-                    # Penalize overloading the same day (no penalty for Monday to pack more)
-                    num_classes_today = len(dept_slots)
-                    if day != 'Monday':
-                        score -= num_classes_today * 150
-
-                    # Prefer earlier days in week (increased to heavily favor Monday)
-                    score += (5 - self.days.index(day)) * 300
-
-                    # Extra bonus for multi-hour courses on Monday to pack them there
-                    if day == 'Monday' and course.duration > 1:
-                        score += 1000
-
-                    # Further reduce preference for earlier slots to allow packing later slots on Monday
-                    if day == 'Monday' and course.duration > 1:
-                        # Prefer later slots for multi-hour courses on Monday
-                        score += slot.hour * 50
-                    else:
-                        score += (17 - slot.hour) * 50
-
-                    if score > best_score:
-                        best_score = score
-                        best_option = (day, slot, classroom, faculty)
+def _group_fingerprints(rows):
+    """(department, semester) -> digest of the group's entries in timetable_rows() shape, ids left out"""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row[10], row[11]), []).append(repr(row[1:10]))
+    return {key: hashlib.sha1('\n'.join(sorted(entries)).encode()).hexdigest() for key, entries in groups.items()}
 
-            if best_option:
-                day, slot, classroom, faculty = best_option
-                timetable.append((course, day, slot, classroom, faculty))
+class TimetableEvents:
+    """Process-wide fan-out of timetable changes to server-sent event streams.
 
-                # Mark all consecutive slots as occupied for multi-hour courses
-                duration = course.duration
-                for i in range(duration):
-                    next_slot = (datetime.combine(datetime.today(), slot) + timedelta(hours=i)).time()
-                    faculty_schedule[faculty.id][day].append(next_slot)
-                    classroom_schedule[classroom.id][day].append(next_slot)
-                    if (course.department, course.semester) not in dept_sem_schedule:
-                        dept_sem_schedule[(course.department, course.semester)] = {d: [] for d in self.days}
-                    dept_sem_schedule[(course.department, course.semester)][day].append(next_slot)
-
-        # Get next global generation number
-        max_gen = db.session.query(db.func.max(Timetable.generation)).scalar() or 0
-        new_gen = max_gen + 1
+    A single watcher thread per process notices changes: at once for commits made in this
+    process or announced with NOTIFY on PostgreSQL, otherwise by polling the served version
+    every SSE_POLL_INTERVAL seconds. It diffs per-group fingerprints once per partition that has
+    subscribers and queues 'generation' and 'group' events for each of that partition's
+    subscribers, so the cost doesn't grow with clients.
+    """
 
-        # Save results
-        for course, day, slot, classroom, faculty in timetable:
-            new_entry = Timetable(
-                department=course.department,
-                semester=course.semester,
-                course_id=course.id,
-                faculty_id=faculty.id,
-                classroom_id=classroom.id,
-                day=day,
-                start_time=slot,
-                end_time=(datetime.combine(datetime.today(), slot) + timedelta(hours=course.duration)).time(),
-                generation=new_gen
-            )
-            db.session.add(new_entry)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # partition -> set of queues
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._seen = {}  # partition -> (version, generation, group fingerprints)
 
-        db.session.commit()
-        self.current_gen = new_gen
-        self._optimize_schedule()
-        return True, "Timetable generated successfully"
+    def subscribe(self, partition=None):
+        import queue
+        subscriber = queue.SimpleQueue()
+        with self._lock:
+            self._subscribers.setdefault(partition or current_partition(), set()).add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='timetable-events', daemon=True)
+                self._thread.start()
+        return subscriber
 
-    def _optimize_schedule(self):
-        """Shift courses to earlier slots if possible without conflicts"""
-        # Get all current timetables for this generation
-        current_tts = Timetable.query.filter_by(generation=self.current_gen).all()
-        for tt in current_tts:
-            self._shift_course_up(tt)
-
-    def _shift_course_up(self, tt):
-        """Attempt to shift a timetable entry to an earlier slot"""
-        # Find earlier slots on the same day
-        current_slot = tt.start_time
-        day = tt.day
-        duration = tt.course.duration
-        earlier_slots = [s for s in self.slots if s < current_slot]
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for partition, subscribers in list(self._subscribers.items()):
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[partition]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def changed(self):
+        self._wakeup.set()
+
+    def publish(self, partition, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(partition, ()))
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def check(self):
+        """Compare each watched partition's served timetable with the last one seen and publish what changed"""
+        with self._lock:
+            partitions = list(self._subscribers)
+        # Partitions nobody watches any more re-baseline quietly when someone subscribes again
+        self._seen = {partition: seen for partition, seen in self._seen.items() if partition in partitions}
+        for partition in partitions:
+            self._check(partition)
+
+    def _check(self, partition):
+        with app.app_context(), partition_scope(partition):
+            version = served_timetable_version()
+            last_version, last_generation, last_groups = self._seen.get(partition, (None, None, {}))
+            if version == last_version:
+                return
+            generation, rows = served_timetable_rows()
+        groups = _group_fingerprints(rows)
+        if last_version is not None:
+            if generation != last_generation:
+                self.publish(partition, {'type': 'generation', 'generation': generation, 'version': version})
+            for department, semester in sorted(set(groups) | set(last_groups), key=repr):
+                if groups.get((department, semester)) != last_groups.get((department, semester)):
+                    self.publish(partition, {'type': 'group', 'department': department, 'semester': semester,
+                                             'version': version})
+        self._seen[partition] = (version, generation, groups)
+
+    def _listen(self):
+        """A dedicated LISTEN connection outside the pool, or None to poll"""
+        if not _use_listen_notify():
+            return None
+        try:
+            conn = db.engine.raw_connection()
+            conn.detach()
+            dbapi_conn = conn.driver_connection
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {TIMETABLE_CHANNEL}")
+            return dbapi_conn
+        except Exception:
+            app.logger.exception("LISTEN failed; polling for timetable changes instead")
+            return None
 
-        for new_slot in sorted(earlier_slots, reverse=True):  # Try earliest first
-            # Check if available for the entire block
-            faculty_schedule = {f.id: {d: [] for d in self.days} for f in self.faculties.values()}
-            classroom_schedule = {c.id: {d: [] for d in self.days} for c in self.classrooms.values()}
-            dept_sem_schedule = {}
-
-            # Populate schedules from current generation
-            all_tts = Timetable.query.filter_by(generation=self.current_gen).all()
-            for t in all_tts:
-                if t.id != tt.id:  # Exclude current
-                    faculty_schedule[t.faculty_id][t.day].append(t.start_time)
-                    classroom_schedule[t.classroom_id][t.day].append(t.start_time)
-                    key = (t.department, t.semester)
-                    if key not in dept_sem_schedule:
-                        dept_sem_schedule[key] = {d: [] for d in self.days}
-                    dept_sem_schedule[key][t.day].append(t.start_time)
-
-            # Check availability for multi-hour block
-            available = True
-            slots_needed = []
-            for i in range(duration):
-                next_slot = (datetime.combine(datetime.today(), new_slot) + timedelta(hours=i)).time()
-                if next_slot not in self.slots:
-                    available = False
-                    break
-                slots_needed.append(next_slot)
-
-            if not available:
+    def _run(self):
+        import select
+        with app.app_context():
+            listener = self._listen()
+        while True:
+            interval = app.config['SSE_POLL_INTERVAL']
+            if listener is not None:
+                try:
+                    if select.select([listener], [], [], interval)[0]:
+                        listener.poll()
+                        del listener.notifies[:]
+                except Exception:
+                    app.logger.exception("Lost the LISTEN connection; polling for timetable changes")
+                    listener = None
+            elif self._wakeup.wait(interval):
+                self._wakeup.clear()
+            if not self.subscriber_count():
+                self._seen = {}  # nobody to tell; re-baseline quietly when someone subscribes
                 continue
+            try:
+                self.check()
+            except Exception:
+                app.logger.exception("Timetable change check failed")
 
-            for s in slots_needed:
-                if s in faculty_schedule[tt.faculty_id][day]:
-                    available = False
-                    break
-                if s in classroom_schedule[tt.classroom_id][day]:
-                    available = False
-                    break
-                key = (tt.department, tt.semester)
-                if key in dept_sem_schedule and s in dept_sem_schedule[key][day]:
-                    available = False
-                    break
-
-            if available:
-                # Shift the entire block
-                tt.start_time = new_slot
-                tt.end_time = (datetime.combine(datetime.today(), new_slot) + timedelta(hours=duration)).time()
-                db.session.commit()
-                break  # Shifted to earliest possible
+timetable_events = TimetableEvents()
+_sse_slots = threading.BoundedSemaphore(app.config['SSE_MAX_STREAMS'])
 
 # Routes
 @app.route('/')
@@ -527,6 +3149,26 @@ def logout():
     flash('You have been logged out.', 'info')
     return redirect(url_for('index'))
 
+@app.route('/partition', methods=['POST'])
+def switch_partition():
+    """Pick the term and campus to work in; admins may open a new one by naming it"""
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+    if 'partition' in request.form:
+        term, _, campus = request.form['partition'].partition('/')
+    else:
+        term, campus = request.form.get('term', '').strip(), request.form.get('campus', '').strip()
+    partition = Partition(term, campus)
+    if not valid_partition(term, campus):
+        flash('Term and campus may only contain letters, digits, dots, dashes and underscores.', 'danger')
+    elif session.get('user_role') != 'admin' and partition not in known_partitions():
+        flash('Access denied.', 'danger')
+    else:
+        session['partition'] = list(partition)
+        flash(f'Now working in term {term} at campus {campus}.', 'info')
+    return redirect(url_for('dashboard'))
+
 @app.route('/profile', methods=['GET', 'POST'])
 def profile():
     if 'user_id' not in session:
@@ -574,20 +3216,15 @@ def delete_account():
         pass  # Assuming token is validated via template
     
     try:
-        if user.role == 'faculty':
-            # Delete corresponding Faculty entry
-            faculty = Faculty.query.filter_by(name=user.full_name).first()
-            if faculty:
-                # Nullify references
-                Course.query.filter_by(faculty_id=faculty.id).update({'faculty_id': None})
-                Timetable.query.filter_by(faculty_id=faculty.id).update({'faculty_id': None})
-                db.session.delete(faculty)
-        
-        db.session.delete(user)
-        db.session.commit()
+        with CatalogWrites() as writes:
+            if user.role == 'faculty':
+                # Delete corresponding Faculty entry, unassigning their courses
+                faculty_id = db.session.query(Faculty.id).filter_by(name=user.full_name).limit(1).scalar()
+                if faculty_id:
+                    writes.delete_faculty(faculty_id)
+            writes.delete_user(user.id)
         flash('Your account has been deleted successfully.', 'success')
     except Exception as e:
-        db.session.rollback()
         flash(f'Error deleting account: {str(e)}', 'danger')
         return redirect(url_for('profile'))
     
@@ -624,9 +3261,13 @@ def add_course():
         course = Course(name=form.name.data, faculty_id=form.faculty_id.data,
                         classroom_id=form.classroom_id.data, duration=form.duration.data,
                         department=form.department.data, year=form.year.data, semester=form.semester.data)
-        db.session.add(course)
-        db.session.commit()
+        with CatalogWrites():
+            db.session.add(course)
+            db.session.flush()
+            placement = place_course_incrementally(course)
         flash('Course added successfully!')
+        if placement:
+            flash(placement[1], 'success' if placement[0] else 'warning')
         return redirect(url_for('dashboard'))
     return render_template('add_course.html', form=form, user_role=user_role)
 
@@ -660,18 +3301,23 @@ def edit_course(course_id):
         form.faculty_id.choices = [(f.id, f.name) for f in Faculty.query.all()]
     
     if form.validate_on_submit():
-        course.name = form.name.data
-        course.faculty_id = form.faculty_id.data
-        course.classroom_id = form.classroom_id.data
-        course.duration = form.duration.data
-        course.department = form.department.data
-        course.year = form.year.data
-        course.semester = form.semester.data
-        db.session.commit()
-        # Update timetable semester for this course
-        Timetable.query.filter_by(course_id=course.id).update({'semester': course.semester})
-        db.session.commit()
+        # Only these affect where the scheduler can put the course
+        placement_fields = (course.faculty_id, course.classroom_id, course.duration, course.department, course.semester)
+        placement = None
+        with CatalogWrites():
+            course.name = form.name.data
+            course.faculty_id = form.faculty_id.data
+            course.classroom_id = form.classroom_id.data
+            course.duration = form.duration.data
+            course.department = form.department.data
+            course.year = form.year.data
+            course.semester = form.semester.data
+            # Re-place only this course in the active timetable; earlier generations keep their history
+            if placement_fields != (course.faculty_id, course.classroom_id, course.duration, course.department, course.semester):
+                placement = place_course_incrementally(course)
         flash('Course updated successfully!', 'success')
+        if placement:
+            flash(placement[1], 'success' if placement[0] else 'warning')
         return redirect(url_for('dashboard'))
     return render_template('edit_course.html', form=form, user_role=user_role)
 
@@ -710,13 +3356,13 @@ def enroll_course():
         flash('Access denied. Only students can enroll in courses.', 'danger')
         return redirect(url_for('dashboard'))
     
-    user = User.query.get(session['user_id'])
-    available_courses = [c for c in Course.query.all() if c not in user.enrolled_courses and c.department == user.department and c.year == user.year and c.semester == user.semester]
+    user = db.session.get(User, session['user_id'])
+    available_ids = eligible_course_ids(user)
 
     if request.method == 'POST' and 'course_id' in request.form:
         course_id = int(request.form['course_id'])
-        course = Course.query.get(course_id)
-        if course and course in available_courses:
+        course = db.session.get(Course, course_id) if course_id in available_ids else None
+        if course:
             user.enrolled_courses.append(course)
             db.session.commit()
             flash(f'Successfully enrolled in {course.name}!', 'success')
@@ -726,7 +3372,7 @@ def enroll_course():
             return redirect(url_for('enroll_course'))
     
     form = EnrollmentForm()
-    form.course_id.choices = [(c.id, f"{c.name} (Faculty: {c.faculty.name if c.faculty else 'Unassigned'}, Classroom: {c.classroom.name if c.classroom else 'Unassigned'})") for c in available_courses]
+    form.course_id.choices = enrollment_choices(user, available_ids)
     
     if form.validate_on_submit():
         course = Course.query.get(form.course_id.data)
@@ -780,14 +3426,61 @@ def delete_course(course_id):
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
     try:
-        db.session.delete(course)
-        db.session.commit()
+        with CatalogWrites() as writes:
+            writes.delete_courses([course.id])
         flash('Course deleted successfully!', 'success')
     except Exception as e:
-        db.session.rollback()
         flash(f'Error deleting course: {str(e)}', 'danger')
     return redirect(url_for('dashboard'))
 
+@app.route('/courses/bulk_edit', methods=['POST'])
+def bulk_edit_courses():
+    """Reassign the selected courses to one classroom and/or faculty in a single transaction"""
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+    if session.get('user_role') != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+    requested = set(request.form.getlist('course_ids', type=int))
+    course_ids = sorted(db.session.scalars(db.select(Course.id).where(Course.id.in_(requested)))) if requested else []
+    if not course_ids:
+        flash('Select at least one course.', 'warning')
+        return redirect(url_for('dashboard', _anchor='courses'))
+    values = {}
+    for field, model in (('classroom_id', Classroom), ('faculty_id', Faculty)):
+        target = request.form.get(field, type=int)
+        if target is None:
+            continue
+        if db.session.get(model, target) is None:
+            flash(f'Unknown {model.__name__.lower()}.', 'danger')
+            return redirect(url_for('dashboard', _anchor='courses'))
+        values[field] = target
+    if not values:
+        flash('Choose a classroom or faculty to apply.', 'warning')
+        return redirect(url_for('dashboard', _anchor='courses'))
+    try:
+        with CatalogWrites() as writes:
+            updated = writes.update_courses(course_ids, values)
+    except Exception as e:
+        flash(f'Error updating courses: {str(e)}', 'danger')
+        return redirect(url_for('dashboard', _anchor='courses'))
+    flash(f'Updated {updated} course{"s" if updated != 1 else ""}.', 'success')
+    # Entries keep their slots, so a new room or teacher may now clash
+    entries = active_timetables().options(
+        db.joinedload(Timetable.course),
+        db.joinedload(Timetable.faculty_obj),
+        db.joinedload(Timetable.classroom_obj)
+    ).all()
+    selected = set(course_ids)
+    changed = {tt.id for tt in entries if tt.course_id in selected}
+    clashes = sum(1 for conflict in find_timetable_conflicts(entries)
+                  if changed.intersection(conflict.get('timetable_ids') or [conflict.get('timetable_id')]))
+    if clashes:
+        flash(f'{clashes} timetable conflict{"s" if clashes != 1 else ""} now involve the updated courses; '
+              'review them on the Validate page.', 'warning')
+    return redirect(url_for('dashboard', _anchor='courses'))
+
 @app.route('/delete_faculty/<int:faculty_id>', methods=['POST'])
 def delete_faculty(faculty_id):
     if 'user_id' not in session:
@@ -799,14 +3492,10 @@ def delete_faculty(faculty_id):
         return redirect(url_for('dashboard'))
     faculty = Faculty.query.get_or_404(faculty_id)
     try:
-        # Nullify references in related models
-        Course.query.filter_by(faculty_id=faculty.id).update({'faculty_id': None})
-        Timetable.query.filter_by(faculty_id=faculty.id).update({'faculty_id': None})
-        db.session.delete(faculty)
-        db.session.commit()
+        with CatalogWrites() as writes:
+            writes.delete_faculty(faculty.id)
         flash('Faculty deleted successfully!', 'success')
     except Exception as e:
-        db.session.rollback()
         flash(f'Error deleting faculty: {str(e)}', 'danger')
     return redirect(url_for('dashboard'))
 
@@ -821,11 +3510,10 @@ def delete_classroom(classroom_id):
         return redirect(url_for('dashboard'))
     classroom = Classroom.query.get_or_404(classroom_id)
     try:
-        db.session.delete(classroom)
-        db.session.commit()
+        with CatalogWrites() as writes:
+            writes.delete_classroom(classroom.id)
         flash('Classroom deleted successfully!', 'success')
     except Exception as e:
-        db.session.rollback()
         flash(f'Error deleting classroom: {str(e)}', 'danger')
     return redirect(url_for('dashboard'))
 
@@ -841,6 +3529,7 @@ def delete_timetable(tt_id):
     tt = Timetable.query.get_or_404(tt_id)
     try:
         db.session.delete(tt)
+        touch_generation(tt.generation)
         db.session.commit()
         flash('Timetable entry deleted successfully!', 'success')
     except Exception as e:
@@ -885,6 +3574,31 @@ def add_classroom():
         return redirect(url_for('dashboard'))
     return render_template('add_classroom.html', form=form)
 
+@app.route('/bulk_import', methods=['GET', 'POST'])
+def bulk_import():
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+    if session.get('user_role') != 'admin':
+        flash('Access denied. Only admins can import data.', 'danger')
+        return redirect(url_for('dashboard'))
+
+    importer = None
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        if kind not in IMPORT_KINDS or not upload or not upload.filename:
+            flash('Choose what to import and a CSV or JSON file.', 'warning')
+            return redirect(url_for('bulk_import'))
+        importer = BulkImporter(kind, dry_run=bool(request.form.get('dry_run')))
+        try:
+            importer.run(iter_import_rows(upload.stream, _import_format(upload.filename, request.form.get('format'))))
+        except ValueError as e:
+            importer.errors.append((importer.rows + 1, [f"Unreadable input: {e}"]))
+        flash(f"{importer.rows} rows read, {importer.valid} valid, {importer.inserted} inserted, {len(importer.errors)} rejected.",
+              'warning' if importer.errors else 'success')
+    return render_template('bulk_import.html', importer=importer, kinds=IMPORT_KINDS)
+
 @app.route('/generate_timetable', methods=['GET', 'POST'])
 def generate():
     if 'user_id' not in session:
@@ -898,26 +3612,42 @@ def generate():
             flash('Access denied. Only admins can generate timetables.', 'danger')
             return redirect(url_for('dashboard'))
 
-        # Get all schedulable courses across all departments and semesters
-        courses_to_schedule = Course.query.all()
-        schedulable_courses = [c for c in courses_to_schedule if c.faculty_id and c.classroom_id]
+        profile_mode = request.form.get('profile')
+        if profile_mode not in PROFILE_MODES:
+            profile_mode = None
+        files = []
 
-        if not schedulable_courses:
-            flash('No courses with assigned faculty and classroom found.', 'warning')
-        else:
+        def run():
+            # All schedulable courses across departments and semesters, read once the lock is held
+            # so edits committed while this request waited for another generation are included
+            schedulable_courses = [c for c in Course.query.order_by(Course.id) if c.faculty_id and c.classroom_id]
+            if not schedulable_courses:
+                return False, NO_SCHEDULABLE_COURSES
             scheduler = ConflictFreeScheduler(schedulable_courses)
-            success, message = scheduler.generate()
-            if success:
-                flash(message)
-            else:
-                flash(message, 'warning')
+            if profile_mode:
+                result, files[:] = profile_generation(scheduler, profile_mode)
+                return result
+            return scheduler.generate()
+
+        job = run_generation(generation_job_key('generate', catalog_version(), profile_mode,
+                                                sorted(scoring_weights().items())), run)
+        success, message = describe_generation_run(job)
+        if files:
+            message = f"{message} (profile saved: {', '.join(files)})"
+        if success:
+            flash(message)
+        else:
+            flash(message, 'warning')
+
+    etag = None
+    if request.method == 'GET':
+        etag = page_etag(db.session.get(User, session['user_id']), tuple(list_profiles()) if user_role == 'admin' else ())
+        not_modified = page_not_modified(etag)
+        if not_modified:
+            return not_modified
 
     # Get all timetables
-    timetables = Timetable.query.options(
-        db.joinedload(Timetable.course),
-        db.joinedload(Timetable.faculty_obj),
-        db.joinedload(Timetable.classroom_obj)
-    ).all()
+    timetables = served_timetable_entries()
 
     # Group timetables by department and semester
     timetable_groups = {}
@@ -930,11 +3660,12 @@ def generate():
     if user_role == 'student':
         user = User.query.get(session['user_id'])
         courses = user.enrolled_courses
+        enrolled_ids = {c.id for c in courses}
         faculties = Faculty.query.filter_by(department=user.department).all()
         # Filter timetable_groups to only include groups where courses are enrolled
         filtered_groups = {}
         for key, tts in timetable_groups.items():
-            filtered_tts = [tt for tt in tts if tt.course in courses]
+            filtered_tts = [tt for tt in tts if tt.course_id in enrolled_ids]
             if filtered_tts:
                 filtered_groups[key] = filtered_tts
         timetable_groups = filtered_groups
@@ -951,10 +3682,21 @@ def generate():
             timetable_groups = {}
     # For admin, show all groups
 
-    courses = Course.query.all()
+    courses = Course.query.order_by(Course.id).all()
     faculties = Faculty.query.all()
     classrooms = Classroom.query.all()
-    return render_template('generate_timetable.html', timetables=timetables, courses=courses, faculties=faculties, classrooms=classrooms, user_role=user_role, timetable_groups=timetable_groups)
+    profiles = list_profiles() if user_role == 'admin' else []
+    return render_page(etag, 'generate_timetable.html', timetables=timetables, courses=courses, faculties=faculties, classrooms=classrooms, user_role=user_role, timetable_groups=timetable_groups, profiles=profiles)
+
+@app.route('/profiles/<path:filename>')
+def download_profile(filename):
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+    if session.get('user_role') != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+    return send_from_directory(app.config['PROFILE_DIR'], filename, as_attachment=True)
 
 @app.route('/dashboard')
 def dashboard():
@@ -971,18 +3713,12 @@ def dashboard():
     user_role = session.get('user_role')
     user_name = session.get('user_name')
 
-    all_timetables = Timetable.query.options(
-        db.joinedload(Timetable.course),
-        db.joinedload(Timetable.faculty_obj),
-        db.joinedload(Timetable.classroom_obj)
-    ).all()
-    all_courses = Course.query.all()
-    all_faculties = Faculty.query.all()
-    all_classrooms = Classroom.query.all()
+    etag = page_etag(user)
+    not_modified = page_not_modified(etag)
+    if not_modified:
+        return not_modified
 
-    timetables = all_timetables
-    courses = all_courses
-    faculties = all_faculties
+    all_classrooms = Classroom.query.all()
     classrooms = all_classrooms
     current_faculty_id = None
     enrolled_courses = []
@@ -990,49 +3726,65 @@ def dashboard():
     form = None
     timetable_groups = {}  # For admin: group by (department, semester)
 
-    if user_role == 'faculty':
-        # Find the faculty matching the user's name
-        faculty = Faculty.query.filter_by(name=user_name).first()
-        if faculty:
-            current_faculty_id = faculty.id
-            timetables = [tt for tt in all_timetables if tt.faculty_id == faculty.id]
-            # For faculty, show only their courses
-            courses = [c for c in all_courses if c.faculty_id == faculty.id]
-            # Limit faculties to their department for modal
-            faculties = Faculty.query.filter_by(department=faculty.department).all()
-            # Show all classrooms
-            classrooms = all_classrooms
-        else:
-            flash('Faculty profile not found. Contact admin.', 'warning')
-            faculties = []
-            classrooms = []
-
-    elif user_role == 'student':
-        user = User.query.get(session['user_id'])
+    if user_role == 'student':
+        # Only the student's own group and enrollments are loaded, so the page cost doesn't grow
+        # with the size of the catalog or the timetable
         enrolled_courses = user.enrolled_courses
-        # Filter courses by student's department, year, semester
-        matching_courses = [c for c in all_courses if c.department == user.department and c.year == user.year and c.semester == user.semester]
-        available_courses = [c for c in matching_courses if c not in enrolled_courses]
+        enrolled_ids = {c.id for c in enrolled_courses}
+        matching_courses = course_group_query(user.department, user.year, user.semester).options(
+            db.joinedload(Course.faculty), db.joinedload(Course.classroom)).order_by(Course.id).all()
+        available_courses = [c for c in matching_courses if c.id not in enrolled_ids]
         form = EnrollmentForm()
-        form.course_id.choices = [(c.id, f"{c.name} (Faculty: {c.faculty.name if c.faculty else 'Unassigned'}, Classroom: {c.classroom.name if c.classroom else 'Unassigned'})") for c in available_courses]
+        form.course_id.choices = enrollment_choices(user, [c.id for c in available_courses])
         # For students, show matching courses and timetables for enrolled courses
         courses = matching_courses
-        timetables = [tt for tt in all_timetables if tt.course in enrolled_courses] if enrolled_courses else []
+        if not enrolled_ids:
+            timetables = []
+        elif timetable_snapshot():
+            timetables = [tt for tt in served_timetable_entries() if tt.course_id in enrolled_ids]
+        else:
+            timetables = active_timetables().filter(Timetable.course_id.in_(enrolled_ids)).options(
+                db.joinedload(Timetable.course),
+                db.joinedload(Timetable.faculty_obj),
+                db.joinedload(Timetable.classroom_obj)
+            ).all()
         faculties = Faculty.query.filter_by(department=user.department).all()
-        classrooms = all_classrooms
-        current_faculty_id = None
+    else:
+        all_timetables = served_timetable_entries()
+        all_courses = Course.query.order_by(Course.id).all()
+        timetables = all_timetables
+        courses = all_courses
+        faculties = Faculty.query.all()
 
-    elif user_role == 'admin':
-        # Group timetables by department and semester
-        for tt in all_timetables:
-            key = (tt.department, tt.semester)
-            if key not in timetable_groups:
-                timetable_groups[key] = []
-            timetable_groups[key].append(tt)
+        if user_role == 'faculty':
+            # Find the faculty matching the user's name
+            faculty = Faculty.query.filter_by(name=user_name).first()
+            if faculty:
+                current_faculty_id = faculty.id
+                timetables = [tt for tt in all_timetables if tt.faculty_id == faculty.id]
+                # For faculty, show only their courses
+                courses = [c for c in all_courses if c.faculty_id == faculty.id]
+                # Limit faculties to their department for modal
+                faculties = Faculty.query.filter_by(department=faculty.department).all()
+                # Show all classrooms
+                classrooms = all_classrooms
+            else:
+                flash('Faculty profile not found. Contact admin.', 'warning')
+                faculties = []
+                classrooms = []
+
+        elif user_role == 'admin':
+            # Group timetables by department and semester
+            for tt in all_timetables:
+                key = (tt.department, tt.semester)
+                if key not in timetable_groups:
+                    timetable_groups[key] = []
+                timetable_groups[key].append(tt)
 
     enrolled_courses = enrolled_courses if user_role == 'student' else []
 
-    return render_template('dashboard.html', timetables=timetables, courses=courses, faculties=faculties, classrooms=classrooms, user_role=user_role, current_faculty_id=current_faculty_id, enrolled_courses=enrolled_courses, available_courses=available_courses if user_role == 'student' else None, form=form if user_role == 'student' else None, timetable_groups=timetable_groups)
+    live_version = served_timetable_version() if app.config['SSE_ENABLED'] else None
+    return render_page(etag, 'dashboard.html', timetables=timetables, courses=courses, faculties=faculties, classrooms=classrooms, user_role=user_role, current_faculty_id=current_faculty_id, enrolled_courses=enrolled_courses, available_courses=available_courses if user_role == 'student' else None, form=form if user_role == 'student' else None, timetable_groups=timetable_groups, live_version=live_version)
 
 @app.route('/export_pdf')
 def export_pdf():
@@ -1041,14 +3793,24 @@ def export_pdf():
     if department and semester:
         try:
             semester = int(semester)
-            timetables = Timetable.query.filter_by(department=department, semester=semester).all()
+            timetables = active_timetables().filter_by(department=department, semester=semester).all()
         except ValueError:
-            timetables = Timetable.query.all()
+            timetables = active_timetables().all()
     else:
-        timetables = Timetable.query.all()
+        timetables = active_timetables().all()
     buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.drawString(100, 750, f"Timetable - {department.upper() if department else 'All'} Semester {semester if semester else 'All'}")
+    write_timetable_pdf(timetables, f"Timetable - {department.upper() if department else 'All'} Semester {semester if semester else 'All'}", buffer)
+    buffer.seek(0)
+    return send_file(buffer, as_attachment=True, download_name=f'timetable_{department}_{semester}.pdf' if department and semester else 'timetable.pdf', mimetype='application/pdf')
+
+def write_timetable_pdf(timetables, title, out):
+    """Write timetable entries (ORM or snapshot) as a PDF listing, in the order given"""
+    # Export backends are heavy to import and most requests never need them
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    p = canvas.Canvas(out, pagesize=letter)
+    p.drawString(100, 750, title)
     y = 700
     line_height = 15
     for tt in timetables:
@@ -1067,8 +3829,81 @@ def export_pdf():
             y = 700
     p.showPage()
     p.save()
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f'timetable_{department}_{semester}.pdf' if department and semester else 'timetable.pdf', mimetype='application/pdf')
+
+# Exports are built in a spooled file: small ones stay in memory, big ones spill to disk
+EXPORT_SPOOL_BYTES = 1 << 20
+
+def write_timetable_docx(rows, title, out):
+    """Write timetable_rows() output as a DOCX with one day x slot grid per (department, semester).
+
+    Multi-hour classes are merged across the slots they span. Grid size depends on days and
+    slots, not entries, so a whole institute stays a handful of compact tables.
+    """
+    # Export backends are heavy to import and most requests never need them
+    from docx import Document
+    from docx.enum.section import WD_ORIENT
+    from docx.shared import Pt
+    from docx.table import _Cell
+
+    doc = Document()
+    section = doc.sections[0]
+    section.orientation = WD_ORIENT.LANDSCAPE
+    section.page_width, section.page_height = section.page_height, section.page_width
+    # Style lookups by name scan the whole style sheet, so resolve them once
+    heading_style, grid_style = doc.styles['Heading 1'], doc.styles['Table Grid']
+    font_size = Pt(8)
+    doc.add_heading(title, 0)
+    if not rows:
+        doc.add_paragraph('No timetable entries.')
+
+    groups = {}
+    for row in rows:
+        groups.setdefault((row[10], row[11]), []).append(row)
+    for (department, semester), entries in sorted(groups.items(), key=lambda g: (g[0][0] or '', g[0][1] or 0)):
+        doc.add_paragraph(f"{(department or '').upper()} Semester {semester}", style=heading_style)
+        days = [d for d in DAY_ORDER if d in DAY_ORDER[:5] or any(e[7] == d for e in entries)]
+        slots = sorted(set(TEACHING_SLOTS) | {e[8] for e in entries if e[8]})
+
+        # Lay the grid out first: text per cell, None for cells covered by a multi-hour class
+        layout = [['Day'] + [slot.strftime('%I:%M %p') for slot in slots]]
+        layout += [[day] + [''] * len(slots) for day in days]
+        spans = {}
+        for entry in entries:
+            if entry[7] not in days or not entry[8]:
+                continue
+            i = days.index(entry[7]) + 1
+            cols = [j for j, slot in enumerate(slots, 1) if entry[8] <= slot < (entry[9] or entry[8])] or [slots.index(entry[8]) + 1]
+            text = f"{entry[2] or 'N/A'}\n{entry[4] or 'N/A'}, {entry[6] or 'N/A'}"
+            if len(cols) > 1 and all(layout[i][j] == '' for j in cols):
+                layout[i][cols[0]] = text
+                spans[i, cols[0]] = len(cols)
+                for j in cols[1:]:
+                    layout[i][j] = None
+            else:
+                # Overlapping entries (a clash) share cells instead of being merged
+                for j in cols:
+                    if layout[i][j] is not None:
+                        layout[i][j] = f"{layout[i][j]}\n{text}" if layout[i][j] else text
+
+        # Then write it straight into the row XML; Table.cell()/merge() rescan the table per call
+        table = doc.add_table(rows=len(layout), cols=len(slots) + 1, style=grid_style)
+        for i, row in enumerate(table.rows):
+            tr = row._tr
+            tcs = list(tr.tc_lst)
+            for j, tc in enumerate(tcs):
+                value = layout[i][j]
+                if value is None:
+                    tr.remove(tc)
+                    continue
+                if (i, j) in spans:
+                    covered = tcs[j:j + spans[i, j]]
+                    tc.grid_span = len(covered)
+                    tc.width = sum(c.width or 0 for c in covered) or None
+                if value:
+                    run = _Cell(tc, table).paragraphs[0].add_run(value)
+                    run.font.size = font_size
+                    run.bold = i == 0
+    doc.save(out)
 
 @app.route('/export_doc')
 def export_doc():
@@ -1077,38 +3912,523 @@ def export_doc():
     if department and semester:
         try:
             semester = int(semester)
-            timetables = Timetable.query.filter_by(department=department, semester=semester).all()
+            scope = {'department': department, 'semester': semester}
         except ValueError:
-            timetables = Timetable.query.all()
+            scope = {}
     else:
-        timetables = Timetable.query.all()
-    doc = Document()
-    doc.add_heading(f'Timetable - {department.upper() if department else "All"} Semester {semester if semester else "All"}', 0)
-    for tt in timetables:
-        doc.add_paragraph(f"Day: {tt.day}\nTime: {tt.start_time.strftime('%I:%M %p')} - {tt.end_time.strftime('%I:%M %p')}\nCourse: {tt.course.name}\nFaculty: {tt.faculty_obj.name}\nClassroom: {tt.classroom_obj.name}")
-    buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f'timetable_{department}_{semester}.docx' if department and semester else 'timetable.docx', mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+        scope = {}
+    _, rows = served_timetable_rows(**scope)
+    title = f'Timetable - {department.upper() if department else "All"} Semester {semester if semester else "All"}'
+    import tempfile
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    write_timetable_docx(rows, title, spool)
+    spool.seek(0)
+    return send_file(spool, as_attachment=True, download_name=f'timetable_{department}_{semester}.docx' if department and semester else 'timetable.docx', mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
 
-@app.route('/validate_timetables')
-def validate_timetables():
+def _api_error(message, status):
+    return jsonify({'status': status, 'error': message}), status
+
+def _int_arg(name):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    if not value.isdigit():
+        raise ValueError(f"'{name}' must be an integer")
+    return int(value)
+
+@app.route('/api/v1/timetables')
+def api_timetables():
+    """Read-only timetable entries of the served generation.
+
+    Filters: department, semester, faculty, room, student (ids). `fields` selects a subset of
+    API_FIELDS. Responses carry an ETag so pollers get a 304 until the timetable or the
+    catalog changes.
+    """
+    try:
+        semester = _int_arg('semester')
+        faculty_id = _int_arg('faculty')
+        classroom_id = _int_arg('room')
+        student_id = _int_arg('student')
+    except ValueError as e:
+        return _api_error(str(e), 400)
+    department = request.args.get('department') or None
+    fields = [f for f in (request.args.get('fields') or '').split(',') if f] or list(API_FIELDS)
+    unknown = [f for f in fields if f not in API_FIELDS]
+    if unknown:
+        return _api_error(f"Unknown fields: {', '.join(unknown)}", 400)
+
+    if student_id is not None:
+        # Enrollments are private: only the student themself or staff may filter by student
+        if 'user_id' not in session:
+            return _api_error('Login required to filter by student', 401)
+        if session.get('user_role') == 'student' and session['user_id'] != student_id:
+            return _api_error('Access denied', 403)
+
+    # Rows carry course, faculty and room names; a student filter also follows their enrollments
+    etag = timetable_etag('api/v1/timetables', catalog_version(), department, semester, faculty_id, classroom_id, student_id,
+                          tuple(fields), enrolled_course_ids(student_id) if student_id is not None else None)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        generation, rows = served_timetable_rows(department, semester, faculty_id, classroom_id, student_id)
+        indexes = [API_FIELDS.index(f) for f in fields]
+        entries = []
+        for row in rows:
+            entry = {}
+            for field, i in zip(fields, indexes):
+                value = row[i]
+                entry[field] = value.strftime('%H:%M') if isinstance(value, time) else value
+            entries.append(entry)
+        body = json.dumps({'generation': generation, 'count': len(entries), 'entries': entries}, separators=(',', ':'))
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# --- iCalendar feeds ---
+CALENDAR_KINDS = ('student', 'faculty', 'room')
+_ICS_DAYS = {'Monday': 'MO', 'Tuesday': 'TU', 'Wednesday': 'WE', 'Thursday': 'TH',
+             'Friday': 'FR', 'Saturday': 'SA', 'Sunday': 'SU'}
+_ics_cache = OrderedDict()  # (kind, id, catalog version[, enrolled course ids], partition) -> (etag, body)
+_ics_cache_lock = threading.Lock()
+
+def _calendar_serializer():
+    from itsdangerous import URLSafeSerializer
+    return URLSafeSerializer(app.config['SECRET_KEY'], salt='calendar-feed')
+
+def calendar_feed_url(kind, object_id):
+    """Subscribable feed URL of the current partition; the id is signed so feeds cannot be enumerated"""
+    partition = current_partition()
+    token = _calendar_serializer().dumps([kind, object_id] if partition == default_partition()
+                                         else [kind, object_id, *partition])
+    return url_for('calendar_feed', token=token, _external=True)
+
+app.jinja_env.globals['calendar_feed_url'] = calendar_feed_url
+
+def _ics_escape(text):
+    return str(text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def _ics_line(line):
+    """Fold a content line at 75 octets as RFC 5545 requires"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return data + b'\r\n'
+    parts, start = [], 0
+    while start < len(data):
+        end = min(start + (75 if not parts else 74), len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:  # don't split a UTF-8 sequence
+            end -= 1
+        parts.append((b' ' if parts else b'') + data[start:end])
+        start = end
+    return b'\r\n'.join(parts) + b'\r\n'
+
+def _term_start():
+    if app.config['TERM_START']:
+        return datetime.strptime(app.config['TERM_START'], '%Y-%m-%d').date()
+    today = datetime.now().date()
+    return today - timedelta(days=today.weekday())
+
+def _term_end():
+    if app.config['TERM_END']:
+        return datetime.strptime(app.config['TERM_END'], '%Y-%m-%d').date()
+    return None
+
+def _ics_offset(offset):
+    minutes = int(offset.total_seconds()) // 60
+    return f"{'-' if minutes < 0 else '+'}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+
+@functools.lru_cache(maxsize=8)
+def _ics_vtimezone(tzid, first, last):
+    """VTIMEZONE lines for `tzid` listing the offset in force on `first` and every change up to `last`"""
+    from zoneinfo import ZoneInfo
+    zone = ZoneInfo(tzid)
+
+    def local(instant):
+        return instant.astimezone(zone)
+
+    def component(instant, offset_from):
+        here = local(instant)
+        kind = 'DAYLIGHT' if here.dst() else 'STANDARD'
+        return [f"BEGIN:{kind}", f"DTSTART:{(instant + offset_from).replace(tzinfo=None):%Y%m%dT%H%M%S}",
+                f"TZOFFSETFROM:{_ics_offset(offset_from)}", f"TZOFFSETTO:{_ics_offset(here.utcoffset())}",
+                f"TZNAME:{_ics_escape(here.tzname())}", f"END:{kind}"]
+
+    # Start a day early so the first onset precedes local midnight of `first` in every zone
+    instant = datetime.combine(first - timedelta(days=1), time(), tzinfo=timezone.utc)
+    end = datetime.combine(last + timedelta(days=1), time(), tzinfo=timezone.utc)
+    lines = ['BEGIN:VTIMEZONE', f"TZID:{tzid}", *component(instant, local(instant).utcoffset())]
+    while instant < end:
+        offset = local(instant).utcoffset()
+        if local(instant + timedelta(days=1)).utcoffset() != offset:
+            # Offsets change on a minute boundary; bisect the day for the first minute of the new one
+            low, high = 0, 24 * 60
+            while high - low > 1:
+                middle = (low + high) // 2
+                low, high = (middle, high) if local(instant + timedelta(minutes=middle)).utcoffset() == offset \
+                    else (low, middle)
+            lines += component(instant + timedelta(minutes=high), offset)
+        instant += timedelta(days=1)
+    return tuple(lines + ['END:VTIMEZONE'])
+
+def _iter_ics(name, rows, host):
+    """Serialize timetable rows as weekly recurring VEVENTs, one content line at a time
+
+    With CALENDAR_TZID set, event times are local to that zone, which the feed describes in a VTIMEZONE,
+    and UNTIL is given in UTC as RFC 5545 requires; otherwise times are floating.
+    """
+    tzid = app.config['CALENDAR_TZID']
+    dt_param = f";TZID={tzid}" if tzid else ''
+    start, term_end = _term_start(), _term_end()
+    until = ''
+    if term_end:
+        last = datetime.combine(term_end, time(23, 59, 59))
+        if tzid:
+            from zoneinfo import ZoneInfo
+            last = last.replace(tzinfo=ZoneInfo(tzid)).astimezone(timezone.utc)
+        until = f";UNTIL={last:%Y%m%dT%H%M%S}{'Z' if tzid else ''}"
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    yield _ics_line('BEGIN:VCALENDAR')
+    yield _ics_line('VERSION:2.0')
+    yield _ics_line('PRODID:-//Timetable App//Timetable Feed//EN')
+    yield _ics_line('CALSCALE:GREGORIAN')
+    yield _ics_line(f"X-WR-CALNAME:{_ics_escape(name)}")
+    if tzid:
+        # Without TERM_END the events repeat indefinitely; describe a year of offset changes
+        for line in _ics_vtimezone(tzid, start, term_end or start + timedelta(days=365)):
+            yield _ics_line(line)
+    for (entry_id, _, course, _, faculty, _, classroom, day, start_time, end_time,
+         department, semester, generation) in rows:
+        if day not in _ICS_DAYS or not start_time or not end_time:
+            continue
+        first = start + timedelta(days=(DAY_ORDER.index(day) - start.weekday()) % 7)
+        yield _ics_line('BEGIN:VEVENT')
+        yield _ics_line(f"UID:timetable-{entry_id}@{host}")
+        yield _ics_line(f"DTSTAMP:{stamp}")
+        yield _ics_line(f"DTSTART{dt_param}:{datetime.combine(first, start_time):%Y%m%dT%H%M%S}")
+        yield _ics_line(f"DTEND{dt_param}:{datetime.combine(first, end_time):%Y%m%dT%H%M%S}")
+        yield _ics_line(f"RRULE:FREQ=WEEKLY;BYDAY={_ICS_DAYS[day]}{until}")
+        yield _ics_line(f"SUMMARY:{_ics_escape(course)}")
+        yield _ics_line(f"LOCATION:{_ics_escape(classroom)}")
+        description = f"Faculty: {faculty or 'Unassigned'}\n{(department or '').upper()} Semester {semester}\nGeneration {generation}"
+        yield _ics_line(f"DESCRIPTION:{_ics_escape(description)}")
+        yield _ics_line('END:VEVENT')
+    yield _ics_line('END:VCALENDAR')
+
+def _cache_while_streaming(key, etag, chunks):
+    """Pass chunks through to the client and keep the finished body for the next poll"""
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    with _ics_cache_lock:
+        _ics_cache[key] = (etag, b''.join(body))
+        _ics_cache.move_to_end(key)
+        while len(_ics_cache) > app.config['ICS_CACHE_SIZE']:
+            _ics_cache.popitem(last=False)
+
+@app.route('/calendar/<token>.ics')
+def calendar_feed(token):
+    """Weekly recurring iCalendar feed for a student, faculty member or classroom"""
+    from itsdangerous import BadSignature
+    try:
+        kind, object_id, *partition = _calendar_serializer().loads(token)
+    except (BadSignature, ValueError):
+        return _api_error('Unknown calendar feed', 404)
+    if kind not in CALENDAR_KINDS:
+        return _api_error('Unknown calendar feed', 404)
+    # Feeds are fetched by calendar clients without a session; the token names the partition
+    with partition_scope(partition or default_partition()):
+        return _calendar_feed(kind, object_id)
+
+def _calendar_feed(kind, object_id):
+    # Course, faculty and room names are rendered into the events; student feeds follow enrollments
+    scope = (kind, object_id, catalog_version()) + ((enrolled_course_ids(object_id),) if kind == 'student' else ())
+    key = scope + (current_partition(),)
+    etag = timetable_etag('ics', *scope)
+    headers = {'Cache-Control': 'no-cache', 'ETag': f'"{etag}"'}
+    if request.if_none_match.contains_weak(etag):
+        return app.response_class(status=304, headers=headers)
+    with _ics_cache_lock:
+        cached = _ics_cache.get(key)
+    if cached and cached[0] == etag:
+        return app.response_class(cached[1], mimetype='text/calendar', headers=headers)
+
+    if kind == 'student':
+        owner = db.session.get(User, object_id)
+        filters = {'student_id': object_id}
+    elif kind == 'faculty':
+        owner = db.session.get(Faculty, object_id)
+        filters = {'faculty_id': object_id}
+    else:
+        owner = db.session.get(Classroom, object_id)
+        filters = {'classroom_id': object_id}
+    if not owner:
+        return _api_error('Unknown calendar feed', 404)
+    name = f"Timetable - {getattr(owner, 'full_name', None) or owner.name}"
+    _, rows = served_timetable_rows(**filters)
+    chunks = _cache_while_streaming(key, etag, _iter_ics(name, rows, request.host))
+    return app.response_class(chunks, mimetype='text/calendar', headers=headers)
+
+def _sse(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, separators=(',', ':'))}"]
+    return '\n'.join(lines) + '\n\n'
+
+@app.route('/events/timetable')
+def timetable_events_stream():
+    """Server-sent events: 'generation' when a new generation goes live, 'group' when a group's
+    entries change (students and faculty only get their own groups), and 'resync' when the
+    timetable changed since the version given as ?since= or Last-Event-ID"""
+    if 'user_id' not in session:
+        return _api_error('Login required', 401)
+    if not app.config['SSE_ENABLED']:
+        return app.response_class(status=204)  # tells EventSource not to reconnect
+
+    groups = None
+    if session.get('user_role') == 'student':
+        user = db.session.get(User, session['user_id'])
+        groups = {(c.department, c.semester) for c in user.enrolled_courses} if user else set()
+    elif session.get('user_role') == 'faculty':
+        faculty = Faculty.query.filter_by(name=session.get('user_name')).first()
+        groups = set(db.session.query(Course.department, Course.semester).filter(
+            Course.faculty_id == faculty.id).distinct().all()) if faculty else set()
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    version = served_timetable_version()
+    if not _sse_slots.acquire(blocking=False):
+        # Refuse rather than let streams take every thread from page requests
+        return app.response_class('retry: 30000\n\n', status=503, mimetype='text/event-stream',
+                                  headers={'Cache-Control': 'no-cache', 'Retry-After': '30'})
+    subscriber = timetable_events.subscribe()
+
+    def stream():
+        import queue
+        try:
+            yield 'retry: 5000\n\n'
+            if since and since != version:
+                yield _sse('resync', {'version': version}, version)
+            deadline = perf_counter() + app.config['SSE_STREAM_SECONDS']
+            while (remaining := deadline - perf_counter()) > 0:
+                try:
+                    event = subscriber.get(timeout=min(15, remaining))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event['type'] == 'group' and groups is not None and (event['department'], event['semester']) not in groups:
+                    yield f"id: {event['version']}\n\n"  # keeps Last-Event-ID current without an event
+                    continue
+                yield _sse(event['type'], event, event['version'])
+        finally:
+            timetable_events.unsubscribe(subscriber)
+
+    response = app.response_class(stream(), mimetype='text/event-stream',
+                                  headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(_sse_slots.release)  # runs even if the stream never started
+    return response
+
+@app.route('/admin/db_pool')
+def db_pool_status():
+    if 'user_id' not in session:
+        return _api_error('Login required', 401)
+    if session.get('user_role') != 'admin':
+        return _api_error('Access denied', 403)
+    pool = db.engine.pool
+    return jsonify({'mode': db_pool_mode(), 'pool': pool.status(), 'stats': pool_stats.snapshot()})
+
+def _sandbox_json(report):
+    def slot(value):
+        return None if value is None else [value[0], value[1].strftime('%H:%M'), value[2], value[3]]
+    changes = [dict(change, before=slot(change['before']), after=slot(change['after'])) for change in report['changes']]
+    return dict(report, changes=changes)
+
+@app.route('/api/v1/sandbox', methods=['POST'])
+def api_sandbox():
+    """Solve what-if scenarios without touching the live timetable and diff each one against it.
+
+    Body: {"scenarios": [{"close_rooms": [ids], "faculty_days": {"id": "Tue Thu"}, "drop_courses": [ids]}]}
+    or a single scenario object. Slots in `before`/`after` are [day, start, classroom_id, faculty_id].
+    """
+    if 'user_id' not in session:
+        return _api_error('Login required', 401)
+    if session.get('user_role') != 'admin':
+        return _api_error('Access denied', 403)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return _api_error('Expected a JSON object', 400)
+    raw = payload['scenarios'] if 'scenarios' in payload else [payload]
+    if not isinstance(raw, list) or not 1 <= len(raw) <= SANDBOX_MAX_SCENARIOS:
+        return _api_error(f'Between 1 and {SANDBOX_MAX_SCENARIOS} scenarios are allowed', 400)
+    try:
+        scenarios = [sandbox_scenario(s.get('close_rooms', ()), s.get('faculty_days'), s.get('drop_courses', ()))
+                     for s in raw]
+    except (AttributeError, TypeError, ValueError):
+        return _api_error('Invalid scenario', 400)
+    try:
+        reports = run_sandboxes(scenarios)
+    except TimeoutError:
+        return _api_error('Sandbox timed out', 504)
+    return jsonify({'generation': active_generation(), 'results': [_sandbox_json(r) for r in reports]})
+
+@app.route('/admin/generation_lock')
+def generation_lock_status():
+    if 'user_id' not in session:
+        return _api_error('Login required', 401)
+    if session.get('user_role') != 'admin':
+        return _api_error('Access denied', 403)
+    with _generation_jobs_lock:
+        running = len(_generation_jobs)
+    return jsonify({'backend': generation_lock().backend, 'running_here': running, 'stats': generation_stats.snapshot()})
+
+# --- Analytics ---
+ANALYTICS_CACHE_SIZE = 8
+
+_analytics_cache = OrderedDict()  # (timetable version, catalog version, partition) -> analytics dict
+_analytics_cache_lock = threading.Lock()
+
+def _covered_slots(start, end):
+    return [s for s in TEACHING_SLOTS if start <= s < end]
+
+def timetable_analytics():
+    """Room occupancy heatmap, faculty load against max_load and group gap hours of the active generation.
+
+    Each figure comes from one GROUP BY query, so the Python pass runs over distinct
+    (day, time, room/faculty/group) combinations rather than entries. Results are cached per
+    timetable and catalog version.
+    """
+    key = (timetable_version(), catalog_version(), current_partition())
+    with _analytics_cache_lock:
+        cached = _analytics_cache.get(key)
+        if cached is not None:
+            _analytics_cache.move_to_end(key)
+            return cached
+
+    generation = active_generation()
+    current = Timetable.generation == (generation or -1)
+    slots = [s.strftime('%H:%M') for s in TEACHING_SLOTS]
+    used_days = {d for (d,) in db.session.query(Timetable.day).filter(current).distinct()}
+    days = [d for d in DAY_ORDER if d in DAY_ORDER[:5] or d in used_days]
+
+    # Rooms: which rooms are taken in each day x slot cell
+    rooms = db.session.query(Classroom.id, Classroom.name).order_by(Classroom.name).all()
+    taken = {(d, s): set() for d in days for s in TEACHING_SLOTS}
+    room_hours = dict.fromkeys((r.id for r in rooms), 0)
+    for day, start, end, classroom_id, count in db.session.query(
+            Timetable.day, Timetable.start_time, Timetable.end_time, Timetable.classroom_id, db.func.count()
+    ).filter(current, Timetable.classroom_id.isnot(None)).group_by(
+            Timetable.day, Timetable.start_time, Timetable.end_time, Timetable.classroom_id):
+        for s in _covered_slots(start, end):
+            if (day, s) in taken:
+                taken[day, s].add(classroom_id)
+        if classroom_id in room_hours:
+            room_hours[classroom_id] += count * len(_covered_slots(start, end))
+    capacity_hours = len(days) * len(TEACHING_SLOTS)
+    heatmap = {d: {s.strftime('%H:%M'): {'occupied': len(taken[d, s]),
+                                         'idle': [r.id for r in rooms if r.id not in taken[d, s]]}
+                   for s in TEACHING_SLOTS} for d in days}
+    utilization = [{'id': r.id, 'name': r.name, 'hours': room_hours[r.id],
+                    'percent': round(100 * room_hours[r.id] / capacity_hours, 1) if capacity_hours else 0.0}
+                   for r in rooms]
+
+    # Faculty: classes per day and weekly hours; max_load caps the weekly class count
+    per_day, hours = {}, {}
+    for faculty_id, day, start, end, count in db.session.query(
+            Timetable.faculty_id, Timetable.day, Timetable.start_time, Timetable.end_time, db.func.count()
+    ).filter(current, Timetable.faculty_id.isnot(None)).group_by(
+            Timetable.faculty_id, Timetable.day, Timetable.start_time, Timetable.end_time):
+        per_day.setdefault(faculty_id, {})
+        per_day[faculty_id][day] = per_day[faculty_id].get(day, 0) + count
+        hours[faculty_id] = hours.get(faculty_id, 0) + count * len(_covered_slots(start, end))
+    faculty = []
+    for faculty_id, name, max_load in db.session.query(Faculty.id, Faculty.name, Faculty.max_load).order_by(Faculty.name):
+        by_day = per_day.get(faculty_id, {})
+        peak_day = max(by_day, key=by_day.get) if by_day else None
+        peak = by_day.get(peak_day, 0)
+        classes = sum(by_day.values())
+        faculty.append({'id': faculty_id, 'name': name, 'max_load': max_load, 'classes': classes,
+                        'hours': hours.get(faculty_id, 0), 'peak_day': peak_day, 'peak_day_classes': peak,
+                        'over_max_load': max_load is not None and classes > max_load})
+
+    # Groups: idle teaching slots between a group's first and last class of each day
+    occupied = {}
+    for department, semester, day, start, end in db.session.query(
+            Timetable.department, Timetable.semester, Timetable.day, Timetable.start_time, Timetable.end_time
+    ).filter(current).group_by(
+            Timetable.department, Timetable.semester, Timetable.day, Timetable.start_time, Timetable.end_time):
+        occupied.setdefault((department, semester), {}).setdefault(day, set()).update(_covered_slots(start, end))
+    groups = []
+    for (department, semester), by_day in sorted(occupied.items(), key=lambda item: (item[0][0] or '', item[0][1] or 0)):
+        gaps = {}
+        for day, used in by_day.items():
+            span = [s for s in TEACHING_SLOTS if min(used) <= s <= max(used)] if used else []
+            gaps[day] = len(span) - len(used)
+        groups.append({'department': department, 'semester': semester, 'gap_hours': sum(gaps.values()),
+                       'days': {d: gaps[d] for d in DAY_ORDER if d in gaps}})
+
+    result = {'generation': generation, 'days': days, 'slots': slots,
+              'rooms': {'total': len(rooms), 'heatmap': heatmap, 'utilization': utilization},
+              'faculty': faculty, 'groups': groups}
+    with _analytics_cache_lock:
+        _analytics_cache[key] = result
+        while len(_analytics_cache) > ANALYTICS_CACHE_SIZE:
+            _analytics_cache.popitem(last=False)
+    return result
+
+@app.route('/analytics')
+def analytics():
     if 'user_id' not in session:
         flash('Please login to access this page.', 'warning')
         return redirect(url_for('auth'))
+    if session.get('user_role') != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+    data = timetable_analytics()
+    room_names = {r['id']: r['name'] for r in data['rooms']['utilization']}
+    return render_template('analytics.html', data=data, room_names=room_names)
 
-    user_role = session.get('user_role')
-    if user_role not in ['admin', 'faculty']:
+@app.route('/api/v1/analytics')
+def api_analytics():
+    """Utilization figures of the active generation (see timetable_analytics), with an ETag"""
+    if 'user_id' not in session:
+        return _api_error('Login required', 401)
+    if session.get('user_role') != 'admin':
+        return _api_error('Access denied', 403)
+    etag = timetable_etag('api/v1/analytics', catalog_version())
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(timetable_analytics())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/scoring', methods=['GET', 'POST'])
+def scoring_policy():
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+    if session.get('user_role') != 'admin':
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
 
-    # Detect conflicts across all timetables
+    if request.method == 'POST':
+        try:
+            weights = default_scoring_weights() if 'reset' in request.form else normalize_scoring_weights(request.form)
+        except ValueError as e:
+            flash(f'Invalid weights: {e}', 'danger')
+            return redirect(url_for('scoring_policy'))
+        name = app.config['SCORING_POLICY']
+        policy = db.session.get(ScoringPolicy, name) or ScoringPolicy(name=name)
+        policy.weights = json.dumps(weights, sort_keys=True)
+        db.session.add(policy)
+        db.session.commit()
+        flash('Scoring weights saved. They apply from the next generation.', 'success')
+        return redirect(url_for('scoring_policy'))
+
+    return render_template('scoring.html', terms=SCORING_TERMS, weights=scoring_weights(),
+                           defaults=default_scoring_weights(), days=DAY_ORDER)
+
+def find_timetable_conflicts(all_timetables):
+    """Faculty, classroom, group and shared-enrollment clashes among timetable entries"""
     conflicts = []
-    all_timetables = Timetable.query.options(
-        db.joinedload(Timetable.course),
-        db.joinedload(Timetable.faculty_obj),
-        db.joinedload(Timetable.classroom_obj)
-    ).all()
 
     # Group by day and time slot
     schedule = {}
@@ -1156,6 +4476,56 @@ def validate_timetables():
                 classrooms.add(tt.classroom_id)
                 dept_sems.add((tt.department, tt.semester))
 
+    conflicts.extend(_enrollment_conflicts(all_timetables))
+    return conflicts
+
+def _enrollment_conflicts(all_timetables):
+    """Overlapping entries of different groups whose courses share enrolled students"""
+    entries = [tt for tt in all_timetables if tt.day and tt.start_time and tt.end_time and tt.course_id]
+    course_ids = sorted({tt.course_id for tt in entries})
+    shared = {(a, b): n for a, b, n in course_pairs_sharing_students(course_ids, with_counts=True)}
+    if not shared:
+        return []
+    conflicts = []
+    by_day = {}
+    for tt in entries:
+        by_day.setdefault(tt.day, []).append(tt)
+    for day, tts in by_day.items():
+        tts.sort(key=lambda t: t.start_time)
+        for i, tt in enumerate(tts):
+            for other in tts[i + 1:]:
+                if other.start_time >= tt.end_time:
+                    break  # sorted by start, nothing later overlaps tt
+                if (tt.department, tt.semester) == (other.department, other.semester):
+                    continue  # reported as a Student Group Conflict
+                pair = (min(tt.course_id, other.course_id), max(tt.course_id, other.course_id))
+                students = shared.get(pair)
+                if not students:
+                    continue
+                conflicts.append({
+                    'type': 'Student Enrollment Conflict',
+                    'severity': 'high',
+                    'description': f"{students} student{' has' if students == 1 else 's have'} overlapping classes {tt.course.name} and {other.course.name} on {day} at {max(tt.start_time, other.start_time).strftime('%I:%M %p')}",
+                    'details': [f"{t.course.name} ({t.department.upper()} Semester {t.semester}, {t.start_time.strftime('%I:%M %p')} - {t.end_time.strftime('%I:%M %p')})" for t in (tt, other)],
+                    'timetable_ids': [tt.id, other.id],
+                    'students_affected': students
+                })
+    return conflicts
+
+@app.route('/validate_timetables')
+def validate_timetables():
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+
+    user_role = session.get('user_role')
+    if user_role not in ['admin', 'faculty']:
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+
+    all_timetables = served_timetable_entries()
+    conflicts = find_timetable_conflicts(all_timetables)
+
     return render_template('validate_timetables.html', conflicts=conflicts)
 
 @app.route('/fix_conflicts', methods=['POST'])
@@ -1170,16 +4540,25 @@ def fix_conflicts():
         return redirect(url_for('dashboard'))
 
     # Find departments and semesters with conflicts and regenerate
-    # For simplicity, regenerate all existing timetables
-    existing_dept_sem = db.session.query(Timetable.department, Timetable.semester).distinct().all()
-    for dept, sem in existing_dept_sem:
-        courses = Course.query.filter_by(department=dept, semester=sem).all()
-        schedulable = [c for c in courses if c.faculty_id and c.classroom_id]
-        if schedulable:
-            scheduler = ConflictFreeScheduler(schedulable)
-            success, message = scheduler.generate()
-            if not success:
-                flash(f"Failed to regenerate for {dept.upper()} Sem {sem}: {message}", 'warning')
+    # For simplicity, regenerate all groups of the active timetable in one new generation
+    def run():
+        # Read once the lock is held: a generation finishing meanwhile changes the active groups
+        existing_dept_sem = db.session.query(Timetable.department, Timetable.semester).filter(
+            Timetable.generation == (active_generation() or -1)).distinct() \
+            .order_by(Timetable.department, Timetable.semester).all()
+        schedulable = []
+        for dept, sem in existing_dept_sem:
+            courses = Course.query.filter_by(department=dept, semester=sem).order_by(Course.id).all()
+            schedulable.extend(c for c in courses if c.faculty_id and c.classroom_id)
+        if not schedulable:
+            return True, 'Nothing to regenerate.'
+        return ConflictFreeScheduler(schedulable).generate()
+
+    job = run_generation(generation_job_key('fix', catalog_version(), timetable_version(),
+                                            sorted(scoring_weights().items())), run)
+    success, message = describe_generation_run(job)
+    if not success:
+        flash(f"Failed to regenerate: {message}", 'warning')
 
     flash('Attempted to fix conflicts by regenerating affected timetables.', 'info')
     return redirect(url_for('validate_timetables'))
@@ -1195,7 +4574,114 @@ def clear_all_timetables():
         flash('Access denied.', 'danger')
         return redirect(url_for('dashboard'))
 
-    Timetable.query.delete()
+    # Only the pointer is cleared; the entries stay in history and can be restored
+    set_active_generation(None)
     db.session.commit()
-    flash('All timetables have been cleared.', 'success')
+    flash('All timetables have been cleared. Earlier generations can be restored from the history page.', 'success')
     return redirect(url_for('validate_timetables'))
+
+@app.route('/timetable_history')
+def timetable_history():
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+    if session.get('user_role') != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+
+    generations = TimetableGeneration.query.order_by(TimetableGeneration.generation.desc()).all()
+    active = active_generation()
+    changes = None
+    old, new = request.args.get('from', type=int), request.args.get('to', type=int)
+    if old and new:
+        changes = diff_generations(old, new)
+    names = {}
+    if changes:
+        names['classroom'] = dict(db.session.query(Classroom.id, Classroom.name).all())
+        names['faculty'] = dict(db.session.query(Faculty.id, Faculty.name).all())
+    return render_template('timetable_history.html', generations=generations, active=active,
+                           changes=changes, diff_from=old, diff_to=new, names=names)
+
+@app.route('/timetable_history/<int:generation>/activate', methods=['POST'])
+def activate_generation(generation):
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+    if session.get('user_role') != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+    if not db.session.get(TimetableGeneration, generation):
+        flash('Unknown generation.', 'danger')
+        return redirect(url_for('timetable_history'))
+    set_active_generation(generation)
+    db.session.commit()
+    flash(f'Generation {generation} is now active.', 'success')
+    return redirect(url_for('timetable_history'))
+
+@app.route('/timetable_history/<int:generation>/pin', methods=['POST'])
+def pin_generation(generation):
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+    if session.get('user_role') != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+    record = db.session.get(TimetableGeneration, generation)
+    if not record:
+        flash('Unknown generation.', 'danger')
+        return redirect(url_for('timetable_history'))
+    record.pinned = not record.pinned
+    db.session.commit()
+    flash(f"Generation {generation} {'pinned' if record.pinned else 'unpinned'}.", 'success')
+    return redirect(url_for('timetable_history'))
+
+@app.route('/sandbox', methods=['GET', 'POST'])
+def sandbox():
+    if 'user_id' not in session:
+        flash('Please login to access this page.', 'warning')
+        return redirect(url_for('auth'))
+    if session.get('user_role') != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+
+    faculties = Faculty.query.order_by(Faculty.name).all()
+    classrooms = Classroom.query.order_by(Classroom.name).all()
+    courses = Course.query.filter(Course.faculty_id.isnot(None), Course.classroom_id.isnot(None)) \
+                          .order_by(Course.name).all()
+    report = None
+    if request.method == 'POST':
+        faculty_days = {f.id: request.form[f'days_{f.id}'].strip() for f in faculties
+                        if request.form.get(f'days_{f.id}', '').strip()}
+        scenario = sandbox_scenario(request.form.getlist('close_room', type=int), faculty_days,
+                                    request.form.getlist('drop_course', type=int))
+        try:
+            report = run_sandboxes([scenario])[0]
+        except TimeoutError:
+            flash('The sandbox run timed out.', 'danger')
+    names = {'classroom': {c.id: c.name for c in classrooms}, 'faculty': {f.id: f.name for f in faculties},
+             'course': {c.id: c.name for c in courses}}
+    return render_template('sandbox.html', faculties=faculties, classrooms=classrooms, courses=courses,
+                           report=report, names=names)
+
+@app.cli.command('compact-generations')
+@click.option('--keep', type=int, default=None, help='Generations to keep (GENERATION_KEEP).')
+@_partition_options
+def compact_generations_command(keep):
+    """Delete timetable history beyond the retention limit."""
+    expired = apply_generation_retention(keep)
+    db.session.commit()
+    click.echo(f"Removed {len(expired)} generation(s): {', '.join(map(str, expired)) or 'none'}")
+
+@app.cli.command('snapshot-timetable')
+@click.option('--path', default=None, help='Snapshot file (TIMETABLE_SNAPSHOT).')
+@_partition_options
+def snapshot_timetable_command(path):
+    """Rewrite the memory-mapped snapshot of the served timetable."""
+    path = path or timetable_snapshot_path()
+    if not path:
+        raise click.UsageError('Set TIMETABLE_SNAPSHOT or pass --path.')
+    version = write_timetable_snapshot(path)
+    if version is None:
+        click.echo('No active generation pointer yet; nothing written.')
+    else:
+        click.echo(f"Wrote {path} (version {version}, {os.path.getsize(path)} bytes)")
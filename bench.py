@@ -0,0 +1,224 @@
+"""Benchmarks for the timetable app.
+
+Each benchmark runs against a throwaway SQLite database, never the configured DATABASE_URL.
+
+    python bench.py startup [--runs 5] [--path /export_pdf ...] [--importtime]
+    python bench.py writes [--courses 200] [--batch 50]
+    python bench.py pages [--courses 200] [--runs 5] [--path /dashboard ...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter so every measurement is a real cold start
+_STARTUP_CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+result = {'import_ms': (t1 - t0) * 1000, 'requests': {}}
+for path in sys.argv[1:]:
+    t = time.perf_counter()
+    status = client.get(path).status_code
+    result['requests'][path] = {'status': status, 'ms': (time.perf_counter() - t) * 1000}
+print(json.dumps(result))
+'''
+
+# Seeds a catalog of sys.argv[1] courses with an active timetable and logs a test client in as admin
+_SEED_CHILD = r'''
+import json, statistics, sys, time
+from sqlalchemy import event
+import app as A
+n_courses = int(sys.argv[1])
+A.app.config['WTF_CSRF_ENABLED'] = False
+with A.app.app_context():
+    admin = A.User(full_name='Bench Admin', email='admin@bench.local', role='admin')
+    admin.set_password('bench-pass')
+    faculties = [A.Faculty(name=f'F{i}', availability='Mon Tue Wed Thu Fri', max_load=40, department='cse', year=1, semester=1) for i in range(10)]
+    rooms = [A.Classroom(name=f'R{i}', capacity=40 + 10 * i, type='smart-classroom') for i in range(8)]
+    A.db.session.add_all([admin, *faculties, *rooms])
+    A.db.session.flush()
+    A.db.session.add_all(A.Course(name=f'C{i}', faculty_id=faculties[i % 10].id, classroom_id=rooms[i % 8].id, duration=1,
+                                  department=('cse', 'ece')[i % 2], year=1, semester=1 + i % 4) for i in range(n_courses))
+    A.db.session.commit()
+    A.ConflictFreeScheduler(A.Course.query.order_by(A.Course.id).all()).generate()
+    admin_id, room_ids = admin.id, [r.id for r in rooms]
+    faculty_ids = [f.id for f in faculties]
+    course_ids = [c.id for c in A.Course.query.order_by(A.Course.id)]
+client = A.app.test_client()
+with client.session_transaction() as s:
+    s['user_id'], s['user_name'], s['user_role'] = admin_id, 'Bench Admin', 'admin'
+'''
+
+# Times the admin write routes and counts the SQL statements each one issues
+_WRITES_CHILD = _SEED_CHILD + r'''
+batch = int(sys.argv[2])
+statements = []
+with A.app.app_context():
+    event.listen(A.db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+def timed(path, data=None):
+    statements.clear()
+    t = time.perf_counter()
+    status = client.post(path, data=data).status_code
+    return (time.perf_counter() - t) * 1000, len(statements), status
+
+def edit(course_id, room_id):
+    return timed(f'/edit_course/{course_id}', {'name': f'C{course_id}', 'faculty_id': faculty_ids[course_id % 10],
+                                               'classroom_id': room_id, 'duration': 1, 'department': 'cse',
+                                               'year': 1, 'semester': 1})
+
+def summary(samples):
+    return {'ms': round(statistics.median(s[0] for s in samples), 2),
+            'statements': round(statistics.median(s[1] for s in samples)), 'status': samples[-1][2]}
+
+selected = course_ids[:batch]
+singles = [edit(course_id, room_ids[1]) for course_id in selected]
+bulk = timed('/courses/bulk_edit', {'course_ids': selected, 'classroom_id': room_ids[2]})
+result = {
+    'edit_course': summary(singles),
+    'reassign': {'courses': len(selected),
+                 'single_edits_ms': round(sum(s[0] for s in singles), 1),
+                 'single_edits_statements': sum(s[1] for s in singles),
+                 'batch_ms': round(bulk[0], 1), 'batch_statements': bulk[1], 'batch_status': bulk[2]},
+    'delete_course': summary([timed(f'/delete_course/{course_id}') for course_id in course_ids[-5:]]),
+    'delete_classroom': summary([timed(f'/delete_classroom/{room_id}') for room_id in room_ids[-2:]]),
+    'delete_faculty': summary([timed(f'/delete_faculty/{faculty_id}') for faculty_id in faculty_ids[-3:]]),
+    'delete_account': summary([timed('/delete_account')]),
+}
+print(json.dumps(result))
+'''
+
+# Renders each page (sys.argv[3:]) uncompressed, compressed, and as a conditional request
+_PAGES_CHILD = _SEED_CHILD + r'''
+runs = int(sys.argv[2])
+
+def fetch(path, **headers):
+    samples = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        response = client.get(path, headers=headers)
+        samples.append(((time.perf_counter() - t) * 1000, len(response.get_data()), response.status_code))
+    return {'ms': round(statistics.median(s[0] for s in samples), 2), 'bytes': samples[-1][1], 'status': samples[-1][2]}
+
+result = {}
+for path in sys.argv[3:]:
+    client.get(path)  # warm caches shared by all variants
+    encoded = client.get(path, headers={'Accept-Encoding': 'br, gzip'})
+    result[path] = {
+        'identity': fetch(path),
+        encoded.headers.get('Content-Encoding') or 'identity': fetch(path, **{'Accept-Encoding': 'br, gzip'}),
+        'not_modified': fetch(path, **{'Accept-Encoding': 'br, gzip', 'If-None-Match': encoded.headers.get('ETag', '')}),
+    }
+print(json.dumps(result))
+'''
+
+
+def _bench_env(workdir):
+    env = dict(os.environ)
+    env['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    env['PROFILE_DIR'] = os.path.join(workdir, 'profiles')
+    env['AUTO_CREATE_TABLES'] = '0'
+    env.pop('FLASK_ENV', None)
+    env.pop('LOCAL_DEV', None)
+    return env
+
+
+def _init_db(env):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+
+
+def _top_imports(env, count=10):
+    """Slowest modules imported directly by app.py, by cumulative time, from -X importtime"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                          cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split(':', 1)[1].split('|')
+        depth = len(name) - len(name.lstrip())
+        if depth == 3:  # one level below the `app` root
+            modules.append((int(cumulative_us) / 1000, name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def bench_startup(args):
+    paths = args.path or ['/', '/api/v1/timetables', '/export_pdf']
+    with tempfile.TemporaryDirectory() as workdir:
+        env = _bench_env(workdir)
+        _init_db(env)
+        runs = []
+        for _ in range(args.runs):
+            proc = subprocess.run([sys.executable, '-c', _STARTUP_CHILD, *paths],
+                                  cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        top = _top_imports(env) if args.importtime else []
+
+    summary = {
+        'runs': args.runs,
+        'import_ms': round(statistics.median(r['import_ms'] for r in runs), 1),
+        'first_request_ms': {
+            path: round(statistics.median(r['requests'][path]['ms'] for r in runs), 1) for path in paths
+        },
+        'status': {path: runs[-1]['requests'][path]['status'] for path in paths},
+    }
+    if top:
+        summary['slowest_imports_ms'] = {name: round(ms, 1) for ms, name in top}
+    print(json.dumps(summary, indent=2))
+
+
+def bench_writes(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        env = _bench_env(workdir)
+        _init_db(env)
+        proc = subprocess.run([sys.executable, '-c', _WRITES_CHILD, str(args.courses), str(args.batch)],
+                              cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    print(json.dumps(json.loads(proc.stdout.strip().splitlines()[-1]), indent=2))
+
+
+def bench_pages(args):
+    paths = args.path or ['/dashboard', '/generate_timetable']
+    with tempfile.TemporaryDirectory() as workdir:
+        env = _bench_env(workdir)
+        _init_db(env)
+        proc = subprocess.run([sys.executable, '-c', _PAGES_CHILD, str(args.courses), str(args.runs), *paths],
+                              cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    print(json.dumps(json.loads(proc.stdout.strip().splitlines()[-1]), indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    startup = sub.add_parser('startup', help='cold import time and first-request latency')
+    startup.add_argument('--runs', type=int, default=5)
+    startup.add_argument('--path', action='append', help='request path to time (repeatable)')
+    startup.add_argument('--importtime', action='store_true', help='also list the slowest imports')
+    startup.set_defaults(func=bench_startup)
+
+    writes = sub.add_parser('writes', help='latency and SQL statements of the admin edit/delete routes')
+    writes.add_argument('--courses', type=int, default=200)
+    writes.add_argument('--batch', type=int, default=50, help='courses reassigned to one room, singly and as one batch')
+    writes.set_defaults(func=bench_writes)
+
+    pages = sub.add_parser('pages', help='bytes and render time of timetable pages, compressed and revalidated')
+    pages.add_argument('--courses', type=int, default=200)
+    pages.add_argument('--runs', type=int, default=5)
+    pages.add_argument('--path', action='append', help='page path to time (repeatable)')
+    pages.set_defaults(func=bench_pages)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py reads its configuration at import time, so point it at a throwaway database first
+_workdir = tempfile.mkdtemp(prefix='timetable-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_workdir, 'test.db')
+os.environ['PROFILE_DIR'] = os.path.join(_workdir, 'profiles')
+os.environ['AUTO_CREATE_TABLES'] = '0'
+os.environ.pop('TIMETABLE_SNAPSHOT', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as timetable  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app = timetable.app
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        timetable.db.drop_all()
+        timetable.upgrade_schema()
+    timetable._ics_cache.clear()
+    yield flask_app
+    with flask_app.app_context():
+        timetable.db.session.remove()
+
+
+def login(client, user_id):
+    with client.application.app_context():
+        user = timetable.db.session.get(timetable.User, user_id)
+        name, role = user.full_name, user.role
+    with client.session_transaction() as session:
+        session['user_id'], session['user_name'], session['user_role'] = user_id, name, role
+
+
+def clear_flashes(client):
+    with client.session_transaction() as session:
+        session.pop('_flashes', None)
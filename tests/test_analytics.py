@@ -0,0 +1,48 @@
+from datetime import time
+
+import pytest
+
+import app as timetable
+
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')
+
+
+@pytest.fixture
+def catalog(app):
+    """Two faculty members with max_load 5, a classroom and eleven cse courses"""
+    with app.app_context():
+        faculty = [timetable.Faculty(name=name, availability='Mon Tue Wed Thu Fri', max_load=5,
+                                     department='cse', year=1, semester=1) for name in ('Steady', 'Busy')]
+        room = timetable.Classroom(name='R0', capacity=60, type='smart-classroom')
+        timetable.db.session.add_all([*faculty, room])
+        timetable.db.session.flush()
+        courses = [timetable.Course(name=f'C{i}', faculty_id=faculty[0].id, classroom_id=room.id, duration=1,
+                                    department='cse', year=1, semester=1) for i in range(11)]
+        timetable.db.session.add_all(courses)
+        timetable.db.session.commit()
+        return {'faculty': [f.id for f in faculty], 'room': room.id, 'courses': [c.id for c in courses]}
+
+
+def place(course_id, faculty_id, room_id, day, hour, hours=1):
+    return timetable.Timetable(course_id=course_id, faculty_id=faculty_id, classroom_id=room_id, day=day,
+                               start_time=time(hour), end_time=time(hour + hours), department='cse', semester=1,
+                               generation=1)
+
+
+def test_over_max_load_counts_weekly_classes(app, catalog):
+    steady, busy = catalog['faculty']
+    room, courses = catalog['room'], catalog['courses']
+    with app.app_context():
+        timetable.db.session.add(timetable.TimetableGeneration(generation=1, entry_count=11))
+        # Five two-hour classes: ten hours a week, but within the five classes max_load allows
+        timetable.db.session.add_all([place(courses[i], steady, room, day, 10, hours=2) for i, day in enumerate(DAYS)])
+        # Six one-hour classes, one more than max_load, never more than two a day
+        timetable.db.session.add_all([place(courses[5 + i], busy, room, DAYS[i % 5], 14 + i // 5) for i in range(6)])
+        timetable.set_active_generation(1)
+        timetable.db.session.commit()
+
+        load = {f['id']: f for f in timetable.timetable_analytics()['faculty']}
+    assert (load[steady]['classes'], load[steady]['hours']) == (5, 10)
+    assert not load[steady]['over_max_load']
+    assert (load[busy]['classes'], load[busy]['peak_day_classes']) == (6, 2)
+    assert load[busy]['over_max_load']
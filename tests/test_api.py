@@ -0,0 +1,55 @@
+import pytest
+
+import app as timetable
+from conftest import login
+
+
+@pytest.fixture
+def generated(app):
+    """A student enrolled in C0-C1 of four scheduled cse courses spread over two rooms"""
+    with app.app_context():
+        student = timetable.User(full_name='Student', email='student@example.com', role='student',
+                                 department='cse', year=1, semester=1)
+        student.set_password('secret1')
+        faculty = timetable.Faculty(name='F0', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        rooms = [timetable.Classroom(name=f'R{i}', capacity=60, type='smart-classroom') for i in range(2)]
+        timetable.db.session.add_all([student, faculty, *rooms])
+        timetable.db.session.flush()
+        courses = [timetable.Course(name=f'C{i}', faculty_id=faculty.id, classroom_id=rooms[i % 2].id, duration=1,
+                                    department='cse', year=1, semester=1) for i in range(4)]
+        timetable.db.session.add_all(courses)
+        timetable.db.session.flush()
+        student.enrolled_courses = courses[:2]
+        timetable.db.session.commit()
+        success, message = timetable.ConflictFreeScheduler(courses).generate()
+        assert success, message
+        return {'student': student.id, 'rooms': [r.id for r in rooms], 'courses': [c.id for c in courses]}
+
+
+def test_etag_follows_catalog_renames(app, generated):
+    client = app.test_client()
+    response = client.get('/api/v1/timetables')
+    etag = response.headers['ETag']
+    assert client.get('/api/v1/timetables', headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        timetable.db.session.get(timetable.Classroom, generated['rooms'][0]).name = 'Great Hall'
+        timetable.db.session.commit()
+    response = client.get('/api/v1/timetables', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Great Hall' in {entry['classroom'] for entry in response.get_json()['entries']}
+
+
+def test_student_filter_follows_enrollments(app, generated):
+    client = app.test_client()
+    login(client, generated['student'])
+    path = f"/api/v1/timetables?student={generated['student']}"
+    response = client.get(path)
+    count = response.get_json()['count']
+    with app.app_context():
+        timetable.db.session.execute(timetable.enrollments.insert(), [
+            {'user_id': generated['student'], 'course_id': generated['courses'][3]}])
+        timetable.db.session.commit()
+    response = client.get(path, headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200
+    assert response.get_json()['count'] > count
@@ -0,0 +1,72 @@
+import pytest
+
+import app as timetable
+
+
+@pytest.fixture
+def generated(app):
+    """A student enrolled in C0-C1 of four scheduled cse courses spread over two rooms"""
+    with app.app_context():
+        student = timetable.User(full_name='Student', email='student@example.com', role='student',
+                                 department='cse', year=1, semester=1)
+        student.set_password('secret1')
+        faculty = timetable.Faculty(name='F0', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        rooms = [timetable.Classroom(name=f'R{i}', capacity=60, type='smart-classroom') for i in range(2)]
+        timetable.db.session.add_all([student, faculty, *rooms])
+        timetable.db.session.flush()
+        courses = [timetable.Course(name=f'C{i}', faculty_id=faculty.id, classroom_id=rooms[i % 2].id, duration=1,
+                                    department='cse', year=1, semester=1) for i in range(4)]
+        timetable.db.session.add_all(courses)
+        timetable.db.session.flush()
+        student.enrolled_courses = courses[:2]
+        timetable.db.session.commit()
+        success, message = timetable.ConflictFreeScheduler(courses).generate()
+        assert success, message
+        return {'student': student.id, 'rooms': [r.id for r in rooms], 'courses': [c.id for c in courses]}
+
+
+def feed_url(app, kind, object_id):
+    with app.test_request_context():
+        return timetable.calendar_feed_url(kind, object_id)
+
+
+def test_student_feed_follows_enrollments(app, generated):
+    client = app.test_client()
+    url = feed_url(app, 'student', generated['student'])
+    response = client.get(url)
+    events = response.data.count(b'BEGIN:VEVENT')
+    assert events > 0
+    with app.app_context():
+        timetable.db.session.execute(timetable.enrollments.insert(), [
+            {'user_id': generated['student'], 'course_id': generated['courses'][3]}])
+        timetable.db.session.commit()
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 200
+    assert client.get(url).data.count(b'BEGIN:VEVENT') > events
+
+
+def test_classroom_feed_follows_renames(app, generated):
+    client = app.test_client()
+    room_id = generated['rooms'][0]
+    url = feed_url(app, 'room', room_id)
+    response = client.get(url)
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    with app.app_context():
+        timetable.db.session.get(timetable.Classroom, room_id).name = 'Great Hall'
+        timetable.db.session.commit()
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 200
+    assert b'Great Hall' in client.get(url).data
+
+
+def test_zoned_feed_describes_its_zone_and_ends_in_utc(app, generated, monkeypatch):
+    monkeypatch.setitem(app.config, 'TERM_START', '2026-01-05')
+    monkeypatch.setitem(app.config, 'TERM_END', '2026-12-20')
+    monkeypatch.setitem(app.config, 'CALENDAR_TZID', 'Europe/Berlin')
+    body = app.test_client().get(feed_url(app, 'student', generated['student'])).data.decode()
+    zone = body[body.index('BEGIN:VTIMEZONE'):body.index('END:VTIMEZONE')]
+    assert 'TZID:Europe/Berlin' in zone
+    assert 'DTSTART:20260329T020000\r\nTZOFFSETFROM:+0100\r\nTZOFFSETTO:+0200' in zone
+    assert 'DTSTART:20261025T030000\r\nTZOFFSETFROM:+0200\r\nTZOFFSETTO:+0100' in zone
+    assert body.index('END:VTIMEZONE') < body.index('BEGIN:VEVENT')
+    assert 'DTSTART;TZID=Europe/Berlin:202601' in body
+    assert ';UNTIL=20261220T225959Z' in body
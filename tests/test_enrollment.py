@@ -0,0 +1,78 @@
+import pytest
+
+import app as timetable
+
+SPRING = timetable.Partition('2027-spring', 'north')
+
+
+@pytest.fixture
+def catalog(app):
+    """A cse student, faculty F0, classroom R0 and one course in their group"""
+    with app.app_context():
+        student = timetable.User(full_name='Student', email='student@example.com', role='student',
+                                 department='cse', year=1, semester=1)
+        student.set_password('secret1')
+        faculty = timetable.Faculty(name='F0', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        room = timetable.Classroom(name='R0', capacity=60, type='smart-classroom')
+        timetable.db.session.add_all([student, faculty, room])
+        timetable.db.session.flush()
+        course = timetable.Course(name='C0', faculty_id=faculty.id, classroom_id=room.id, duration=1,
+                                  department='cse', year=1, semester=1)
+        timetable.db.session.add(course)
+        timetable.db.session.commit()
+        return {'student': student.id, 'course': course.id}
+
+
+def test_import_refreshes_cached_enrollment_choices(app, catalog):
+    with app.app_context():
+        student = timetable.db.session.get(timetable.User, catalog['student'])
+        assert 'Imported' not in {label for _, label in timetable.enrollment_choices(student)}
+        version = timetable.catalog_version()
+        timetable.BulkImporter('courses').run([{'name': 'Imported', 'faculty': 'F0', 'classroom': 'R0',
+                                                'duration': 1, 'department': 'cse', 'year': 1, 'semester': 1}])
+        assert timetable.catalog_version() != version
+        assert 'Imported' in ' '.join(label for _, label in timetable.enrollment_choices(student))
+
+
+def test_renames_change_the_cached_labels(app, catalog):
+    with app.app_context():
+        student = timetable.db.session.get(timetable.User, catalog['student'])
+        assert 'F0' in dict(timetable.enrollment_choices(student))[catalog['course']]
+        timetable.Faculty.query.update({'name': 'Dr Renamed'}, synchronize_session=False)
+        timetable.db.session.commit()
+        assert 'Dr Renamed' in dict(timetable.enrollment_choices(student))[catalog['course']]
+
+
+def test_version_is_bumped_once_per_transaction(app, catalog):
+    with app.app_context():
+        before = timetable.catalog_version()
+        course = timetable.db.session.get(timetable.Course, catalog['course'])
+        course.duration = 2
+        timetable.db.session.flush()
+        bumped = timetable.catalog_version()
+        assert bumped != before
+        course.name = 'C0 (lab)'
+        timetable.db.session.flush()
+        timetable.Course.query.update({'duration': 3}, synchronize_session=False)
+        assert timetable.catalog_version() == bumped
+        timetable.db.session.commit()
+        assert timetable.catalog_version() == bumped
+
+        course.duration = 1
+        timetable.db.session.commit()
+        assert timetable.catalog_version() != bumped
+
+
+def test_versions_are_per_partition(app, catalog):
+    with app.app_context():
+        default_version = timetable.catalog_version()
+        assert SPRING not in timetable.known_partitions()
+        with timetable.partition_scope(SPRING):
+            timetable.db.session.add(timetable.Classroom(name='Spring R', capacity=60, type='smart-classroom'))
+            timetable.db.session.commit()
+            spring_version = timetable.catalog_version()
+        assert spring_version
+        assert timetable.catalog_version() == default_version
+        assert timetable.catalog_version(SPRING) == spring_version
+        assert SPRING in timetable.known_partitions()
@@ -0,0 +1,35 @@
+import threading
+
+import pytest
+
+import app as timetable
+from conftest import login
+
+
+@pytest.fixture
+def admin(app):
+    with app.app_context():
+        user = timetable.User(full_name='Admin', email='admin@example.com', role='admin')
+        user.set_password('secret1')
+        timetable.db.session.add(user)
+        timetable.db.session.commit()
+        return user.id
+
+
+def test_streams_beyond_the_limit_are_refused(app, admin, monkeypatch):
+    monkeypatch.setitem(app.config, 'SSE_ENABLED', True)
+    monkeypatch.setattr(timetable, '_sse_slots', threading.BoundedSemaphore(1))
+    client = app.test_client()
+    login(client, admin)
+
+    first = client.get('/events/timetable')
+    assert first.status_code == 200
+    refused = client.get('/events/timetable')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == '30'
+    assert refused.data.startswith(b'retry:')
+
+    first.close()
+    second = client.get('/events/timetable')
+    assert second.status_code == 200
+    second.close()
@@ -0,0 +1,63 @@
+import pytest
+
+import app as timetable
+from conftest import clear_flashes, login
+
+
+@pytest.fixture
+def generated(app):
+    """An admin and an active generation of three cse courses in one room"""
+    with app.app_context():
+        admin = timetable.User(full_name='Admin', email='admin@example.com', role='admin')
+        admin.set_password('secret1')
+        faculty = timetable.Faculty(name='F0', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        room = timetable.Classroom(name='R0', capacity=60, type='smart-classroom')
+        timetable.db.session.add_all([admin, faculty, room])
+        timetable.db.session.flush()
+        timetable.db.session.add_all([timetable.Course(name=f'C{i}', faculty_id=faculty.id, classroom_id=room.id,
+                                                       duration=1, department='cse', year=1, semester=1)
+                                      for i in range(3)])
+        timetable.db.session.commit()
+        success, message = generate()
+        assert success, message
+        return {'admin': admin.id, 'room': room.id}
+
+
+def generate():
+    courses = timetable.Course.query.order_by(timetable.Course.id).all()
+    return timetable.ConflictFreeScheduler(courses).generate()
+
+
+def test_rolling_back_to_an_earlier_generation(app, generated):
+    with app.app_context():
+        first = timetable.active_generation()
+        timetable.db.session.get(timetable.Classroom, generated['room']).capacity += 1
+        timetable.db.session.commit()
+        generate()
+        second = timetable.active_generation()
+    client = app.test_client()
+    login(client, generated['admin'])
+    response = client.get('/api/v1/timetables')
+    assert response.get_json()['generation'] == second
+
+    client.post(f'/timetable_history/{first}/activate')
+    clear_flashes(client)
+    response = client.get('/api/v1/timetables', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200
+    assert response.get_json()['generation'] == first
+    with app.app_context():
+        # Rolling back only moves the pointer; both generations stay in history
+        assert {g.generation for g in timetable.TimetableGeneration.query} == {first, second}
+
+
+def test_version_follows_the_pointer_and_revision(app, generated):
+    with app.app_context():
+        timetable.db.session.add(timetable.AppState(key='unrelated', value='not a number'))
+        timetable.db.session.commit()
+        generation = timetable.active_generation()
+        assert timetable.timetable_version() == f'{generation}.0'
+        timetable.touch_generation(generation)
+        timetable.db.session.commit()
+        assert timetable.timetable_version() == f'{generation}.1'
+        assert timetable.next_generation_number() == generation + 1
@@ -0,0 +1,99 @@
+import threading
+from time import sleep
+
+import pytest
+
+import app as timetable
+from conftest import clear_flashes, login
+
+
+@pytest.fixture
+def catalog(app):
+    """An admin and two cse courses sharing one faculty member and one room"""
+    with app.app_context():
+        admin = timetable.User(full_name='Admin', email='admin@example.com', role='admin')
+        admin.set_password('secret1')
+        faculty = timetable.Faculty(name='F0', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        room = timetable.Classroom(name='R0', capacity=60, type='smart-classroom')
+        timetable.db.session.add_all([admin, faculty, room])
+        timetable.db.session.flush()
+        timetable.db.session.add_all([timetable.Course(name=f'C{i}', faculty_id=faculty.id, classroom_id=room.id,
+                                                       duration=1, department='cse', year=1, semester=1)
+                                      for i in range(2)])
+        timetable.db.session.commit()
+        return {'admin': admin.id, 'faculty': faculty.id, 'room': room.id}
+
+
+def test_identical_concurrent_requests_share_one_run(app, catalog):
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def run():
+        calls.append(1)
+        started.set()
+        release.wait(10)
+        return True, 'done'
+
+    def request():
+        with app.app_context():
+            results.append(timetable.run_generation('same-request', run))
+
+    before = timetable.generation_stats.snapshot()['deduplicated']
+    leader = threading.Thread(target=request)
+    leader.start()
+    assert started.wait(10)
+    follower = threading.Thread(target=request)
+    follower.start()
+    for _ in range(500):
+        if timetable.generation_stats.snapshot()['deduplicated'] > before:
+            break
+        sleep(0.01)
+    release.set()
+    leader.join(10)
+    follower.join(10)
+
+    assert len(calls) == 1
+    assert sorted(r.deduplicated for r in results) == [False, True]
+    assert {r.result for r in results} == {(True, 'done')}
+
+
+def test_courses_added_while_waiting_for_the_lock_are_scheduled(app, catalog, monkeypatch):
+    waiting = threading.Event()
+    real_lock = timetable.generation_lock
+
+    def observed_lock():
+        lock = real_lock()
+        try_acquire = lock.try_acquire
+
+        def attempt():
+            acquired = try_acquire()
+            if not acquired:
+                waiting.set()
+            return acquired
+        lock.try_acquire = attempt
+        return lock
+
+    monkeypatch.setattr(timetable, 'generation_lock', observed_lock)
+    client = app.test_client()
+    login(client, catalog['admin'])
+    with app.app_context():
+        held = real_lock()
+        assert held.try_acquire()
+    request = threading.Thread(target=client.post, args=('/generate_timetable',))
+    request.start()
+    try:
+        assert waiting.wait(10)
+        with app.app_context():
+            timetable.db.session.add(timetable.Course(name='Late', faculty_id=catalog['faculty'],
+                                                      classroom_id=catalog['room'], duration=1,
+                                                      department='cse', year=1, semester=1))
+            timetable.db.session.commit()
+    finally:
+        with app.app_context():
+            held.release()
+        request.join(10)
+    clear_flashes(client)
+    with app.app_context():
+        names = {e.course.name for e in timetable.active_timetables()}
+        assert names == {'C0', 'C1', 'Late'}
@@ -0,0 +1,68 @@
+import pytest
+
+import app as timetable
+
+
+@pytest.fixture
+def generated(app):
+    """Four cse courses over two faculty and two rooms, with an active generation"""
+    with app.app_context():
+        faculty = [timetable.Faculty(name=f'F{i}', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                     department='cse', year=1, semester=1) for i in range(2)]
+        rooms = [timetable.Classroom(name=f'R{i}', capacity=60, type='smart-classroom') for i in range(2)]
+        timetable.db.session.add_all([*faculty, *rooms])
+        timetable.db.session.flush()
+        timetable.db.session.add_all([timetable.Course(name=f'C{i}', faculty_id=faculty[i % 2].id,
+                                                       classroom_id=rooms[i % 2].id, duration=1,
+                                                       department='cse', year=1, semester=1) for i in range(4)])
+        timetable.db.session.commit()
+        success, message = generate()
+        assert success, message
+        return {'faculty': [f.id for f in faculty], 'rooms': [r.id for r in rooms]}
+
+
+def generate():
+    courses = timetable.Course.query.order_by(timetable.Course.id).all()
+    return timetable.ConflictFreeScheduler(courses).generate()
+
+
+def test_identical_inputs_reuse_the_generation(app, generated):
+    with app.app_context():
+        first = timetable.active_generation()
+        success, message = generate()
+        assert success and 'reused' in message
+        assert timetable.active_generation() == first
+
+        room = timetable.db.session.get(timetable.Classroom, generated['rooms'][0])
+        room.capacity += 1
+        timetable.db.session.commit()
+        generate()
+        assert timetable.active_generation() != first
+
+        room.capacity -= 1
+        timetable.db.session.commit()
+        success, message = generate()
+        assert f'generation {first}' in message
+        assert timetable.active_generation() == first
+
+
+def test_edited_generation_is_not_reused(app, generated):
+    with app.app_context():
+        first = timetable.active_generation()
+        timetable.touch_generation(first)
+        timetable.db.session.commit()
+        success, message = generate()
+        assert success and 'reused' not in message
+        assert timetable.active_generation() != first
+
+
+def test_inputs_fingerprint_is_stable(app, generated):
+    with app.app_context():
+        def fingerprint():
+            courses = timetable.Course.query.order_by(timetable.Course.id).all()
+            return timetable.ConflictFreeScheduler(courses).input_fingerprint()
+        first = fingerprint()
+        assert fingerprint() == first
+        timetable.db.session.get(timetable.Faculty, generated['faculty'][0]).availability = 'Mon Tue'
+        timetable.db.session.commit()
+        assert fingerprint() != first
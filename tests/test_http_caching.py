@@ -0,0 +1,121 @@
+import io
+import json
+
+import pytest
+
+import app as timetable
+from conftest import clear_flashes, login
+
+
+@pytest.fixture
+def generated(app):
+    """An admin, a student enrolled in C0-C1 and an active generation of four cse courses"""
+    with app.app_context():
+        admin = timetable.User(full_name='Admin', email='admin@example.com', role='admin')
+        student = timetable.User(full_name='Student', email='student@example.com', role='student',
+                                 department='cse', year=1, semester=1)
+        for user in (admin, student):
+            user.set_password('secret1')
+        faculty = timetable.Faculty(name='F0', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        room = timetable.Classroom(name='R0', capacity=60, type='smart-classroom')
+        timetable.db.session.add_all([admin, student, faculty, room])
+        timetable.db.session.flush()
+        courses = [timetable.Course(name=f'C{i}', faculty_id=faculty.id, classroom_id=room.id, duration=1,
+                                    department='cse', year=1, semester=1) for i in range(4)]
+        timetable.db.session.add_all(courses)
+        timetable.db.session.flush()
+        student.enrolled_courses = courses[:2]
+        timetable.db.session.commit()
+        success, message = timetable.ConflictFreeScheduler(courses).generate()
+        assert success, message
+        return {'admin': admin.id, 'student': student.id, 'faculty': faculty.id, 'room': room.id,
+                'courses': [c.id for c in courses]}
+
+
+@pytest.fixture
+def admin_client(app, generated):
+    client = app.test_client()
+    login(client, generated['admin'])
+    return client
+
+
+def revalidate(client, path, etag):
+    """A conditional GET with no flashed messages pending"""
+    clear_flashes(client)
+    return client.get(path, headers={'If-None-Match': etag})
+
+
+@pytest.mark.parametrize('path', ['/dashboard', '/generate_timetable'])
+def test_unchanged_page_is_not_modified(admin_client, path):
+    response = admin_client.get(path)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert revalidate(admin_client, path, etag).status_code == 304
+
+
+def test_page_changes_after_bulk_import(admin_client):
+    etag = admin_client.get('/dashboard').headers['ETag']
+    rows = json.dumps([{'name': 'NEWCOURSE', 'faculty': 'F0', 'classroom': 'R0', 'duration': 1,
+                        'department': 'cse', 'year': 1, 'semester': 1}])
+    response = admin_client.post('/bulk_import', data={'kind': 'courses', 'file': (io.BytesIO(rows.encode()), 'courses.json')},
+                                 content_type='multipart/form-data')
+    assert response.status_code == 200
+    response = revalidate(admin_client, '/dashboard', etag)
+    assert response.status_code == 200
+    assert b'NEWCOURSE' in response.data
+    assert response.headers['ETag'] != etag
+
+
+def test_page_changes_after_edit(admin_client, generated):
+    etag = admin_client.get('/dashboard').headers['ETag']
+    admin_client.post(f"/edit_course/{generated['courses'][0]}", data={
+        'name': 'RENAMED', 'faculty_id': generated['faculty'], 'classroom_id': generated['room'],
+        'duration': 1, 'department': 'cse', 'year': 1, 'semester': 1})
+    response = revalidate(admin_client, '/dashboard', etag)
+    assert response.status_code == 200
+    assert b'RENAMED' in response.data
+
+
+def test_page_changes_after_delete(admin_client, generated):
+    etag = admin_client.get('/generate_timetable').headers['ETag']
+    admin_client.post(f"/delete_course/{generated['courses'][0]}")
+    response = revalidate(admin_client, '/generate_timetable', etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_student_page_changes_after_enrollment(app, generated):
+    client = app.test_client()
+    login(client, generated['student'])
+    etag = client.get('/dashboard').headers['ETag']
+    with app.app_context():
+        timetable.db.session.execute(timetable.enrollments.insert(), [
+            {'user_id': generated['student'], 'course_id': generated['courses'][2]}])
+        timetable.db.session.commit()
+    assert revalidate(client, '/dashboard', etag).status_code == 200
+
+
+def test_pending_flashes_skip_the_etag(admin_client):
+    etag = admin_client.get('/dashboard').headers['ETag']
+    with admin_client.session_transaction() as session:
+        session['_flashes'] = [('success', 'Saved')]
+    response = admin_client.get('/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+
+def test_compressed_page_keeps_a_weak_validator(admin_client):
+    response = admin_client.get('/dashboard', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].startswith('W/')
+    assert revalidate(admin_client, '/dashboard', response.headers['ETag']).status_code == 304
+
+
+def test_fingerprinted_static_urls_are_immutable(app):
+    client = app.test_client()
+    with app.test_request_context():
+        url = timetable.url_for('static', filename='images/favicon.ico')
+    assert '?v=' in url
+    assert 'immutable' in client.get(url).headers['Cache-Control']
+    assert 'immutable' not in client.get('/static/images/favicon.ico?v=stale').headers.get('Cache-Control', '')
@@ -0,0 +1,77 @@
+import io
+
+import pytest
+
+import app as timetable
+
+
+@pytest.fixture
+def catalog(app):
+    """Faculty F0, classroom R0, courses C0-C3, an admin and a student enrolled in C0"""
+    with app.app_context():
+        admin = timetable.User(full_name='Admin', email='admin@example.com', role='admin')
+        student = timetable.User(full_name='Student', email='student@example.com', role='student',
+                                 department='cse', year=1, semester=1)
+        for user in (admin, student):
+            user.set_password('secret1')
+        faculty = timetable.Faculty(name='F0', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        room = timetable.Classroom(name='R0', capacity=60, type='smart-classroom')
+        timetable.db.session.add_all([admin, student, faculty, room])
+        timetable.db.session.flush()
+        courses = [timetable.Course(name=f'C{i}', faculty_id=faculty.id, classroom_id=room.id, duration=1,
+                                    department='cse', year=1, semester=1) for i in range(4)]
+        timetable.db.session.add_all(courses)
+        timetable.db.session.flush()
+        student.enrolled_courses = courses[:1]
+        timetable.db.session.commit()
+        return {'student': student.id, 'courses': [c.id for c in courses]}
+
+
+def course_row(**overrides):
+    row = {'name': 'Imported', 'faculty': 'F0', 'classroom': 'R0', 'duration': 1,
+           'department': 'cse', 'year': 1, 'semester': 1}
+    row.update(overrides)
+    return row
+
+
+def test_invalid_rows_are_rejected_with_their_numbers(app, catalog):
+    with app.app_context():
+        importer = timetable.BulkImporter('courses')
+        importer.run([course_row(), course_row(faculty='Nobody'), course_row(duration=0), course_row(name='Second')])
+        assert (importer.rows, importer.valid, importer.inserted) == (4, 2, 2)
+        assert [number for number, _ in importer.errors] == [2, 3]
+        assert "Unknown faculty 'Nobody'" in importer.errors[0][1]
+        assert timetable.Course.query.filter(timetable.Course.name.in_(['Imported', 'Second'])).count() == 2
+
+
+def test_dry_run_inserts_nothing(app, catalog):
+    with app.app_context():
+        importer = timetable.BulkImporter('courses', dry_run=True)
+        importer.run([course_row()])
+        assert (importer.valid, importer.inserted) == (1, 0)
+        assert timetable.Course.query.filter_by(name='Imported').count() == 0
+
+
+def test_enrollment_import_skips_existing_and_rejects_staff(app, catalog):
+    with app.app_context():
+        importer = timetable.BulkImporter('enrollments')
+        importer.run([{'email': 'student@example.com', 'course': 'C0'},
+                      {'email': 'student@example.com', 'course': 'C3'},
+                      {'email': 'admin@example.com', 'course': 'C3'}])
+        assert (importer.valid, importer.inserted) == (1, 1)
+        assert importer.errors == [(3, ['Only students can be enrolled in courses'])]
+        assert timetable.enrolled_course_ids(catalog['student']) == tuple(catalog['courses'][i] for i in (0, 3))
+
+
+@pytest.mark.parametrize('payload', ['[,{"name": "A"}]', '[{"name": "A"},,{"name": "B"}]', '[{"name": "A"},]',
+                                     '[{"name": "A"} {"name": "B"}]'])
+def test_json_array_rejects_stray_separators(payload):
+    with pytest.raises(ValueError):
+        list(timetable.iter_import_rows(io.BytesIO(payload.encode()), 'json'))
+
+
+def test_json_array_is_read_across_chunks():
+    payload = '[ {"name": "A"} ,\n {"name": "B"} ]'
+    rows = timetable._iter_json_array(io.StringIO(payload), chunk_size=4)
+    assert [row['name'] for row in rows] == ['A', 'B']
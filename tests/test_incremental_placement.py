@@ -0,0 +1,57 @@
+import pytest
+
+import app as timetable
+
+
+@pytest.fixture
+def generated(app):
+    """An active generation of three cse courses sharing one faculty member and one room"""
+    with app.app_context():
+        faculty = timetable.Faculty(name='F0', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        room = timetable.Classroom(name='R0', capacity=60, type='smart-classroom')
+        timetable.db.session.add_all([faculty, room])
+        timetable.db.session.flush()
+        courses = [timetable.Course(name=f'C{i}', faculty_id=faculty.id, classroom_id=room.id, duration=1,
+                                    department='cse', year=1, semester=1) for i in range(3)]
+        timetable.db.session.add_all(courses)
+        timetable.db.session.commit()
+        success, message = timetable.ConflictFreeScheduler(courses).generate()
+        assert success, message
+        return [c.id for c in courses]
+
+
+def entries(course_id):
+    return [(e.day, e.start_time, e.end_time) for e in
+            timetable.active_timetables().filter(timetable.Timetable.course_id == course_id)]
+
+
+def test_edited_course_is_moved_to_a_free_slot(app, generated):
+    with app.app_context():
+        course = timetable.db.session.get(timetable.Course, generated[0])
+        course.duration = 2
+        success, message = timetable.place_course_incrementally(course)
+        timetable.db.session.commit()
+        assert success, message
+        (day, start, end), = entries(course.id)
+        assert (end.hour - start.hour) == 2
+        assert timetable.active_timetables().count() == 3
+
+
+def test_course_keeps_its_slot_when_nothing_fits(app, generated):
+    with app.app_context():
+        generation = timetable.active_generation()
+        before = entries(generated[0])
+        record = timetable.TimetableGeneration.query.filter_by(generation=generation).one()
+        count, revision = record.entry_count, record.revision
+
+        course = timetable.db.session.get(timetable.Course, generated[0])
+        course.duration = len(timetable.TEACHING_SLOTS) + 1
+        success, message = timetable.place_course_incrementally(course)
+        timetable.db.session.commit()
+
+        assert not success
+        assert 'current slot is kept' in message
+        assert entries(generated[0]) == before
+        timetable.db.session.refresh(record)
+        assert (record.entry_count, record.revision) == (count, revision)
@@ -0,0 +1,108 @@
+import pytest
+
+import app as timetable
+from conftest import clear_flashes, login
+
+SPRING = timetable.Partition('2027-spring', 'north')
+
+
+@pytest.fixture
+def catalog(app):
+    """An admin, a cse student and three courses in the default partition"""
+    with app.app_context():
+        admin = timetable.User(full_name='Admin', email='admin@example.com', role='admin')
+        student = timetable.User(full_name='Student', email='student@example.com', role='student',
+                                 department='cse', year=1, semester=1)
+        for user in (admin, student):
+            user.set_password('secret1')
+        faculty = timetable.Faculty(name='F0', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        room = timetable.Classroom(name='R0', capacity=60, type='smart-classroom')
+        timetable.db.session.add_all([admin, student, faculty, room])
+        timetable.db.session.flush()
+        courses = [timetable.Course(name=f'C{i}', faculty_id=faculty.id, classroom_id=room.id, duration=1,
+                                    department='cse', year=1, semester=1) for i in range(3)]
+        timetable.db.session.add_all(courses)
+        timetable.db.session.commit()
+        return {'admin': admin.id, 'student': student.id, 'courses': [c.id for c in courses]}
+
+
+@pytest.fixture
+def generated(app, catalog):
+    """The catalog with an active generation in the default partition"""
+    with app.app_context():
+        success, message = timetable.ConflictFreeScheduler(timetable.Course.query.all()).generate()
+        assert success, message
+    return catalog
+
+
+def add_spring_catalog():
+    """A faculty member, a classroom and a course in SPRING; returns the course id"""
+    with timetable.partition_scope(SPRING):
+        faculty = timetable.Faculty(name='Spring F', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                    department='cse', year=1, semester=1)
+        room = timetable.Classroom(name='Spring R', capacity=60, type='smart-classroom')
+        timetable.db.session.add_all([faculty, room])
+        timetable.db.session.flush()
+        course = timetable.Course(name='Spring only', faculty_id=faculty.id, classroom_id=room.id, duration=1,
+                                  department='cse', year=1, semester=1)
+        timetable.db.session.add(course)
+        timetable.db.session.commit()
+        return course.id
+
+
+def test_queries_only_see_the_current_partition(app, catalog):
+    with app.app_context():
+        spring_course = add_spring_catalog()
+        with timetable.partition_scope(SPRING):
+            assert [c.id for c in timetable.Course.query] == [spring_course]
+            assert timetable.db.session.get(timetable.Course, spring_course).term == SPRING.term
+        assert sorted(c.id for c in timetable.Course.query) == catalog['courses']
+        assert SPRING in timetable.known_partitions()
+
+
+def test_bulk_writes_stay_in_their_partition(app, catalog):
+    with app.app_context():
+        spring_course = add_spring_catalog()
+        with timetable.partition_scope(SPRING):
+            assert timetable.Course.query.update({'duration': 2}, synchronize_session=False) == 1
+            timetable.db.session.commit()
+        assert {c.duration for c in timetable.Course.query} == {1}
+        with timetable.partition_scope(SPRING):
+            assert timetable.db.session.get(timetable.Course, spring_course, populate_existing=True).duration == 2
+
+
+def test_generations_are_per_partition(app, generated):
+    with app.app_context():
+        default_generation = timetable.active_generation()
+        spring_course = add_spring_catalog()
+        with timetable.partition_scope(SPRING):
+            success, _ = timetable.ConflictFreeScheduler(timetable.Course.query.all()).generate()
+            assert success
+            spring_generation = timetable.active_generation()
+            assert {tt.course_id for tt in timetable.active_timetables()} == {spring_course}
+        assert spring_generation != default_generation
+        assert timetable.active_generation() == default_generation
+        assert {tt.course_id for tt in timetable.active_timetables()} <= set(generated['courses'])
+
+
+def test_switching_partition_changes_the_page(app, generated):
+    with app.app_context():
+        add_spring_catalog()
+    client = app.test_client()
+    login(client, generated['admin'])
+    default_page = client.get('/dashboard')
+    client.post('/partition', data={'term': SPRING.term, 'campus': SPRING.campus})
+    clear_flashes(client)
+    spring_page = client.get('/dashboard', headers={'If-None-Match': default_page.headers['ETag']})
+    assert spring_page.status_code == 200
+    assert b'Spring only' in spring_page.data
+    assert b'Spring only' not in default_page.data
+
+
+def test_students_cannot_open_unknown_partitions(app, catalog):
+    client = app.test_client()
+    login(client, catalog['student'])
+    client.post('/partition', data={'partition': 'nowhere/none'})
+    with client.session_transaction() as session:
+        assert 'partition' not in session
@@ -0,0 +1,56 @@
+import pytest
+
+import app as timetable
+
+
+@pytest.fixture
+def catalog(app):
+    """Six cse courses over two faculty and two rooms, with a student enrolled in C0-C1"""
+    with app.app_context():
+        student = timetable.User(full_name='Student', email='student@example.com', role='student',
+                                 department='cse', year=1, semester=1)
+        student.set_password('secret1')
+        faculty = [timetable.Faculty(name=f'F{i}', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                     department='cse', year=1, semester=1) for i in range(2)]
+        rooms = [timetable.Classroom(name=f'R{i}', capacity=60, type='smart-classroom') for i in range(2)]
+        timetable.db.session.add_all([student, *faculty, *rooms])
+        timetable.db.session.flush()
+        courses = [timetable.Course(name=f'C{i}', faculty_id=faculty[i % 2].id, classroom_id=rooms[i % 2].id,
+                                    duration=1, department='cse', year=1, semester=1) for i in range(6)]
+        timetable.db.session.add_all(courses)
+        timetable.db.session.flush()
+        student.enrolled_courses = courses[:2]
+        timetable.db.session.commit()
+        return {'rooms': [r.id for r in rooms], 'courses': [c.id for c in courses]}
+
+
+@pytest.mark.parametrize('room_mode', timetable.ROOM_MODES)
+def test_generated_timetable_is_conflict_free(app, catalog, room_mode):
+    with app.app_context():
+        courses = timetable.Course.query.order_by(timetable.Course.id).all()
+        success, message = timetable.ConflictFreeScheduler(courses, room_mode=room_mode).generate()
+        assert success, message
+        entries = timetable.active_timetables().all()
+        assert {tt.course_id for tt in entries} == set(catalog['courses'])
+        assert timetable.find_timetable_conflicts(entries) == []
+
+
+def test_matching_fits_rooms_to_enrollment(app, catalog):
+    with app.app_context():
+        small = timetable.db.session.get(timetable.Classroom, catalog['rooms'][0])
+        small.capacity = 1
+        # Both enrolled courses list the small room; matching has to move the crowded one out
+        crowded = timetable.db.session.get(timetable.Course, catalog['courses'][0])
+        crowded.classroom_id = small.id
+        extra = timetable.User(full_name='Second', email='second@example.com', role='student',
+                               department='cse', year=1, semester=1)
+        extra.set_password('secret1')
+        extra.enrolled_courses = [crowded]
+        timetable.db.session.add(extra)
+        timetable.db.session.commit()
+
+        courses = timetable.Course.query.order_by(timetable.Course.id).all()
+        success, message = timetable.ConflictFreeScheduler(courses, room_mode='matching').generate()
+        assert success, message
+        rooms = {tt.classroom_id for tt in timetable.active_timetables().filter_by(course_id=crowded.id)}
+        assert small.id not in rooms
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+import app as timetable
+
+
+@pytest.fixture
+def snapshot_path(app, tmp_path, monkeypatch):
+    path = str(tmp_path / 'timetable.snap')
+    monkeypatch.setitem(app.config, 'TIMETABLE_SNAPSHOT', path)
+    monkeypatch.setattr(timetable, '_snapshots', {})
+    return path
+
+
+@pytest.fixture
+def generated(app):
+    """Two departments' courses over two faculty and rooms, with a student enrolled in C0-C1"""
+    with app.app_context():
+        student = timetable.User(full_name='Student', email='student@example.com', role='student',
+                                 department='cse', year=1, semester=1)
+        student.set_password('secret1')
+        faculty = [timetable.Faculty(name=f'F{i}', availability='Mon Tue Wed Thu Fri', max_load=10,
+                                     department='cse', year=1, semester=1) for i in range(2)]
+        rooms = [timetable.Classroom(name=f'R{i}', capacity=60, type='smart-classroom') for i in range(2)]
+        timetable.db.session.add_all([student, *faculty, *rooms])
+        timetable.db.session.flush()
+        courses = [timetable.Course(name=f'C{i}', faculty_id=faculty[i % 2].id, classroom_id=rooms[i // 3].id,
+                                    duration=1, department=('cse', 'ece')[i // 3], year=1, semester=1)
+                   for i in range(6)]
+        timetable.db.session.add_all(courses)
+        timetable.db.session.flush()
+        student.enrolled_courses = courses[:2]
+        timetable.db.session.commit()
+        success, message = timetable.ConflictFreeScheduler(courses).generate()
+        assert success, message
+        return {'student': student.id, 'faculty': [f.id for f in faculty], 'rooms': [r.id for r in rooms]}
+
+
+def count_writes(monkeypatch):
+    writes = []
+    write = timetable.write_timetable_snapshot
+
+    def counted(path=None):
+        writes.append(path)
+        return write(path)
+    monkeypatch.setattr(timetable, 'write_timetable_snapshot', counted)
+    return writes
+
+
+def test_filtered_reads_match_the_database(app, generated, tmp_path, monkeypatch):
+    filters = [{}, {'department': 'ece'}, {'department': 'nope'}, {'semester': 1},
+               {'faculty_id': generated['faculty'][1]}, {'classroom_id': generated['rooms'][0]},
+               {'student_id': generated['student']}]
+    with app.app_context():
+        from_db = [timetable.served_timetable_rows(**f) for f in filters]
+        monkeypatch.setitem(app.config, 'TIMETABLE_SNAPSHOT', str(tmp_path / 'timetable.snap'))
+        monkeypatch.setattr(timetable, '_snapshots', {})
+        assert timetable.timetable_snapshot() is not None
+        assert [timetable.served_timetable_rows(**f) for f in filters] == from_db
+        assert timetable.served_timetable_version() == timetable.timetable_version()
+
+
+def test_missing_pointer_is_remembered(app, snapshot_path, monkeypatch):
+    writes = count_writes(monkeypatch)
+    with app.app_context():
+        assert timetable.timetable_snapshot() is None
+        assert timetable.timetable_snapshot() is None
+        assert timetable.served_timetable_rows() == (None, [])
+    assert len(writes) == 1
+
+
+def test_rebuilt_only_when_the_served_timetable_changes(app, generated, snapshot_path, monkeypatch):
+    with app.app_context():
+        version = timetable.timetable_snapshot().version
+        inode = os.stat(snapshot_path).st_ino
+
+        # Enrollments are read from the database, so the snapshot is kept
+        timetable.db.session.execute(timetable.enrollments.delete())
+        timetable.db.session.commit()
+        assert os.stat(snapshot_path).st_ino == inode
+
+        timetable.touch_generation(timetable.active_generation())
+        timetable.db.session.commit()
+        assert os.stat(snapshot_path).st_ino != inode
+        assert timetable.timetable_snapshot().version != version
+
+        # Names are stored in the file, so a rename rebuilds it too
+        inode = os.stat(snapshot_path).st_ino
+        timetable.Classroom.query.update({'name': 'Great Hall'}, synchronize_session=False)
+        timetable.db.session.commit()
+        assert os.stat(snapshot_path).st_ino != inode
+        assert 'Great Hall' in {e.classroom_obj.name for e in timetable.timetable_snapshot().entries()}